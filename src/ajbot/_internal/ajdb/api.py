@@ -1,8 +1,17 @@
 ''' manage AJ database
 '''
+import asyncio
+import contextvars
+import gzip
+import hashlib
+import pickle
+import zlib
+import time
+from contextlib import asynccontextmanager
 from functools import wraps
-from typing import Optional
+from typing import AsyncIterator, Awaitable, Callable, Iterator, Optional
 from datetime import date, datetime,timedelta
+from pathlib import Path
 
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_pdf import PdfPages
@@ -18,58 +27,256 @@ from discord.ext.commands import MemberNotFound
 from ajbot._internal.exceptions import OtherException, AjDbException
 from ajbot._internal.config import AjConfig, FormatTypes
 from ajbot._internal.ajdb import tables as db_t
+from ajbot._internal.ajdb.loader import BatchLoader
+from ajbot._internal.ajdb.presence import PresenceMatrix
+from ajbot._internal.ajdb.segment import MemberSegments
 
 cache_data = {}
 cache_time = {}
+# increased each time cache is cleared, so that queries started before are not cached afterwards
+_cache_generation = 0
 
-def _async_cached(func):
+# connection level failures: db is considered unavailable, cached data is served instead
+_DB_UNAVAILABLE_ERRORS = (sa.exc.OperationalError, sa.exc.InterfaceError, OSError, TimeoutError)
+
+
+class _CircuitBreaker():
+    """ Stop querying db for reset_sec once failure_threshold consecutive connection failures occurred,
+        then let requests try again (one new failure opens it again)
+    """
+    def __init__(self, failure_threshold:int=3, reset_sec:float=30):
+        self._failure_threshold = failure_threshold
+        self._reset_sec = reset_sec
+        self._failures = 0
+        self._open_until = 0.
+
+    @property
+    def is_open(self) -> bool:
+        """ True if db shall not be queried
+        """
+        return self._failures >= self._failure_threshold and time.monotonic() < self._open_until
+
+    def success(self):
+        """ record a successful db query
+        """
+        self._failures = 0
+
+    def failure(self):
+        """ record a db connection failure
+        """
+        self._failures += 1
+        if self._failures >= self._failure_threshold:
+            self._open_until = time.monotonic() + self._reset_sec
+
+_breaker = _CircuitBreaker()
+_refresh_tasks:dict[tuple, asyncio.Task] = {}
+
+
+async def _merge_cached(session:aio_sa.AsyncSession, value):
+    """ merge cached data (db object, or list / tuple of them) with session to avoid DetachedInstanceError
+    """
+    if isinstance(value, db_t.BaseWithId):
+        return await session.merge(value, load=False)
+    if isinstance(value, (list, tuple)):
+        return type(value)([await _merge_cached(session, v) for v in value])
+    return value
+
+
+def _async_cached(func=None, *, fallback_only:bool=False, uncached_args:tuple[str, ...]=()):
     """ Decorator to handle cached AjDb data
+        - expired data is served immediately while a single background task refreshes it (stale-while-revalidate)
+        - if db is unavailable (or has been failing recently, see _CircuitBreaker), last known data is served
+          and session is flagged as stale
+        fallback_only: data is always queried, cache is only used if db is unavailable
+        uncached_args: calls setting one of these keyword arguments are not cached (e.g. pagination cursor,
+                       which would add a cache entry per page)
     @arg:
         refresh_cache: if True, refresh cache even if not expired
         keep_detached: if False, merge cached data with current session to avoid DetachedInstanceError
     @return:
         cached data if available and not expired
     """
+    if func is None:
+        return lambda f: _async_cached(f, fallback_only=fallback_only, uncached_args=uncached_args)
+
+    async def refresh(aj_config:AjConfig, key, args, kwargs, generation:int):
+        """ refresh cached data in its own session, the requesting one being possibly closed meanwhile
+            result is dropped if cache has been cleared since the refresh was requested (see _cache_generation)
+        """
+        try:
+            async with AjDb(aj_config=aj_config, read_only=True) as aj_db:
+                result = await func(aj_db, *args, **kwargs)
+            _breaker.success()
+            if generation == _cache_generation:
+                cache_data[key] = result
+                cache_time[key] = datetime.now()
+        except _DB_UNAVAILABLE_ERRORS:
+            _breaker.failure()
+        except Exception as e:     #pylint: disable=broad-exception-caught   #nobody awaits this task, cached data is kept
+            print(f"Rafraîchissement du cache '{func.__name__}' en échec: {e!r}")
+        finally:
+            del _refresh_tasks[key]
 
     @wraps(func)
     async def wrapper(self, *args, refresh_cache:bool=False, keep_detached:bool=False, **kwargs):
-        global cache_data   #pylint: disable=global-variable-not-assigned   #on purpose, to handle cache
-        global cache_time   #pylint: disable=global-variable-not-assigned   #on purpose, to handle cache
-
         key = (func.__name__, args, tuple(kwargs.items()))
         now = datetime.now()
-        if not refresh_cache:
-            if key in cache_data and now - cache_time[key] < timedelta(seconds=self._aj_config.db_cache_time_sec): #pylint: disable=protected-access    #this decorator is for this class
-                if not keep_detached:
-                    # merge cached data with current session to avoid DetachedInstanceError
-                    if isinstance(cache_data[key], list):
-                        for i, v in enumerate(cache_data[key]):
-                            cache_data[key][i] = await self._aio_session.merge(v, load=False)            #pylint: disable=protected-access    #this decorator is for this class
-                    else:
-                        cache_data[key] = await self._aio_session.merge(cache_data[key], load=False)     #pylint: disable=protected-access    #this decorator is for this class
-                return cache_data[key]
-
-        result = await func(self, *args, **kwargs)
+        cacheable = all(kwargs.get(arg) is None for arg in uncached_args)
+        cached = cacheable and key in cache_data
 
-        cache_data[key] = result
-        cache_time[key] = now
+        async def from_cache():
+            if keep_detached:
+                return cache_data[key]
+            return await _merge_cached(self._aio_session, cache_data[key])     #pylint: disable=protected-access    #this decorator is for this class
+
+        if cached and not refresh_cache and not fallback_only:
+            expired = now - cache_time[key] >= timedelta(seconds=self._aj_config.db_cache_time_sec)    #pylint: disable=protected-access    #this decorator is for this class
+            if expired and _breaker.is_open:
+                # no refresh can run
+                self.stale = True
+            elif expired and key not in _refresh_tasks:
+                # refresh runs outside the context of the requesting interaction
+                _refresh_tasks[key] = asyncio.create_task(refresh(self._aj_config, key, args, kwargs, _cache_generation),   #pylint: disable=protected-access    #this decorator is for this class
+                                                          context=contextvars.Context())
+            return await from_cache()
+
+        if _breaker.is_open:
+            if not cached:
+                raise AjDbException("La base de données est indisponible, réessaie plus tard.")
+            self.stale = True
+            return await from_cache()
+
+        generation = _cache_generation
+        try:
+            result = await func(self, *args, **kwargs)
+        except _DB_UNAVAILABLE_ERRORS as e:
+            _breaker.failure()
+            if not cached:
+                raise AjDbException("La base de données est indisponible, réessaie plus tard.") from e
+            self.stale = True
+            return await from_cache()
+        _breaker.success()
+
+        if cacheable and generation == _cache_generation:
+            cache_data[key] = result
+            cache_time[key] = now
         return result
     return wrapper
 
+# concurrent lookups of members by id / discord name are batched in one query
+_member_by_id_loader = BatchLoader(db_t.Member, db_t.Member.id, key_getter=lambda m: int(m.id))
+_member_by_discord_loader = BatchLoader(db_t.Member, db_t.Member.discord, key_getter=lambda m: m.discord, case_insensitive=True)
+
+# attendance matrix, built on first use and kept up to date by event edits (see AjDb.query_presence_matrix)
+_presence_matrix:Optional[PresenceMatrix] = None
+# member ids per segment predicate, with the cached members they are computed from (see AjDb._query_member_segments),
+# dropped with cached members by member & event edits (see _clear_member_cache)
+_member_segments:Optional[tuple[list[db_t.Member], dict[int, db_t.Member], MemberSegments]] = None
+
+def _clear_derived_cache():
+    """ drop data computed from db rather than cached from a query, so that it is built again on next use
+        (e.g. to include changes made outside of the bot)
+    """
+    global _presence_matrix   #pylint: disable=global-statement   #on purpose, to handle cache
+    global _member_segments   #pylint: disable=global-statement   #on purpose, to handle cache
+
+    _presence_matrix = None
+    _member_segments = None
+
+def _clear_member_cache():
+    """ drop cached members and segments computed from them, after a change of member data or attendance statistics,
+        so that segments (e.g. mailing lists) are built again from up to date members on next use
+    """
+    global _member_segments   #pylint: disable=global-statement   #on purpose, to handle cache
+
+    for key in [key for key in cache_data if key[:2] == ('query_table_content', (db_t.Member,))]:
+        del cache_data[key]
+        cache_time.pop(key, None)
+    _member_segments = None
+
 def _clear_cache():
     global cache_data   #pylint: disable=global-statement   #on purpose, to handle cache
     global cache_time   #pylint: disable=global-statement   #on purpose, to handle cache
+    global _cache_generation   #pylint: disable=global-statement   #on purpose, to handle cache
 
     cache_data = {}
     cache_time = {}
+    _cache_generation += 1
+    _clear_derived_cache()
+
+# snapshot of cache saved at shutdown and periodically, restored at startup
+_SNAPSHOT_FORMAT = 1
+
+def _schema_digest() -> str:
+    """ digest of db tables definition: a snapshot is only restored by a bot having same table definitions
+    """
+    digest = hashlib.sha256()
+    for table in sorted(db_t.BaseWithId.metadata.tables.values(), key=lambda t: t.name):
+        digest.update(table.name.encode())
+        for column in table.columns:
+            digest.update(f"{column.name}:{type(column.type).__name__}:{column.nullable}".encode())
+    return digest.hexdigest()
+
+
+# logical dump of db (see AjDb.dump)
+_DUMP_FORMAT = 1
+_DUMP_CHUNK_ROWS = 5000
+
+def _tables_in_dependency_order() -> list[sa.Table]:
+    """ all db tables, referenced ones first
+        log authors are existing members, so they are not a dependency (this also breaks members / credentials cycle)
+    """
+    return [table for table, _ in sa.schema.sort_tables_and_constraints(db_t.BaseWithId.metadata.tables.values(),
+                                                                        filter_fn=lambda fkc: True if fkc.name and fkc.name.endswith('_log_author_id') else None)
+            if table is not None]
+
+
+def _read_dump(file_path:Path) -> Iterator[tuple[str, tuple[str, ...], tuple]]:
+    """ yield (table name, column names, values per column) chunks of a file saved by AjDb.dump, up to its end marker
+        raise AjDbException if file is not a dump of current table definitions, is truncated or corrupted
+    """
+    tables = db_t.BaseWithId.metadata.tables
+    try:
+        with gzip.open(file_path, 'rb') as f:
+            header = pickle.load(f)
+            if not isinstance(header, dict) or header.get('format') != _DUMP_FORMAT:
+                raise AjDbException(f"{file_path} n'est pas une sauvegarde de la base de données.")
+            if header.get('schema') != _schema_digest():
+                raise AjDbException(f"{file_path} a été sauvegardé avec une autre définition des tables.")
+            while (chunk := pickle.load(f)) is not None:
+                table_name, columns, values = chunk
+                if (table_name not in tables
+                    or not set(columns) <= set(tables[table_name].columns.keys())
+                    or len(values) != len(columns)
+                    or len({len(column_values) for column_values in values}) > 1):
+                    raise AjDbException(f"{file_path} contient des données invalides pour la table {table_name}.")
+                yield table_name, columns, values
+    except (EOFError, OSError, ValueError, pickle.UnpicklingError, zlib.error) as e:
+        raise AjDbException(f"{file_path} est tronqué ou corrompu: {e}") from e
+
+
+# caches pre-loaded at startup (see AjDb.init_cache)
+_WARM_UP_PLAN:dict[str, Callable[['AjDb'], Awaitable]] = {
+    'rôles asso': lambda aj_db: aj_db.query_asso_roles(lazyload=False, refresh_cache=True),
+    # same call as season lookups & autocompletion, so that they share this cache entry
+    'saisons': lambda aj_db: aj_db.query_seasons(refresh_cache=True),
+    # members, so that they can still be looked up if db becomes unavailable
+    'annuaire des membres': lambda aj_db: aj_db.query_table_content(db_t.Member, refresh_cache=True),
+    'autocomplétion évènements': lambda aj_db: aj_db.query_events(refresh_cache=True),
+}
 
 
 class AjDb():
     """ Context manager which manage AJ database
         Create DB engine and async session maker on enter, and dispose engine on exit
         Configuration file can be provided at init, otherwise default config info will be internally loaded
+        In read only mode, queries run in autocommit (no transaction is opened, nothing is committed on exit)
+        and any write attempt raises an exception
     """
-    def __init__(self, aj_config:AjConfig=None, modifier_discord:Optional[str]=None):
+    def __init__(self, aj_config:AjConfig=None, modifier_discord:Optional[str]=None, read_only:bool=False):
+        if read_only and modifier_discord:
+            raise AjDbException("Une session en lecture seule n'a pas d'auteur de modification.")
+        self._read_only = read_only
         self._modifier_discord = modifier_discord
         self._modifier_id = None
         self._internal_config:bool = aj_config is None
@@ -77,6 +284,9 @@ class AjDb():
         self._db_engine:aio_sa.AsyncEngine = None
         self._AsyncSessionMaker:aio_sa.async_sessionmaker = None   #pylint: disable=invalid-name   #variable is a class factory
         self._aio_session:aio_sa.async_sessionmaker[aio_sa.AsyncSession] = None
+        self.stale:bool = False     # True once data served by this session comes from cache because db is unavailable
+        self._next_ids:dict[sa.Table, int] = {}     # last primary key assigned per table (see assign_ids)
+        self._snapshot:aio_sa.AsyncConnection = None   # connection used by stream_columns within consistent_snapshot
 
     async def __aenter__(self):
         if self._internal_config:
@@ -84,12 +294,15 @@ class AjDb():
 
         # Connect to MariaDB Platform
         self._db_engine = aio_sa.create_async_engine("mysql+aiomysql://" + self._aj_config.db_connection_string,
-                                                    echo=self._aj_config.db_echo)
+                                                    echo=self._aj_config.db_echo,
+                                                    connect_args={'connect_timeout': self._aj_config.db_connect_timeout_sec},
+                                                    **({'isolation_level': 'AUTOCOMMIT'} if self._read_only else {}))
 
         # aio_sa.async_sessionmaker: a factory for new AsyncSession objects
         # expire_on_commit - don't expire objects after transaction commit
-        self._AsyncSessionMaker = aio_sa.async_sessionmaker(bind = self._db_engine, expire_on_commit=False)
-        self._aio_session = self._AsyncSessionMaker()
+        # autoflush - nothing to flush in read only mode
+        self._AsyncSessionMaker = aio_sa.async_sessionmaker(bind = self._db_engine, expire_on_commit=False, autoflush=not self._read_only)
+        self._open_session()
 
         # If modifier discord name is provided, retrieve user id from it
         if self._modifier_discord:
@@ -102,9 +315,10 @@ class AjDb():
         return self
 
     async def __aexit__(self, exc_type, exc_value, traceback):
-        # Commit & close session, flushing all pending changes
+        # Commit & close session, flushing all pending changes (nothing to commit in read only mode)
         try:
-            await self._aio_session.commit()
+            if not self._read_only:
+                await self._aio_session.commit()
         except Exception:
             await self._aio_session.rollback()
             raise
@@ -117,14 +331,64 @@ class AjDb():
         if self._internal_config:
             self._aj_config.__exit__(exc_type, exc_value, traceback)
 
+    def _open_session(self):
+        """ open session from session maker, forbidding writes in read only mode
+        """
+        self._aio_session = self._AsyncSessionMaker()
+        if self._read_only:
+            sa.event.listen(self._aio_session.sync_session, 'before_flush', self._forbid_flush)
+            sa.event.listen(self._aio_session.sync_session, 'do_orm_execute', self._forbid_write_statement)
+
+    @asynccontextmanager
+    async def _sibling(self):
+        """ read only AjDb sharing the engine of this one, with its own session (so its own pooled connection)
+        """
+        sibling = AjDb(aj_config=self._aj_config, read_only=True)
+        sibling._db_engine = self._db_engine                    #pylint: disable=protected-access   #same class
+        sibling._AsyncSessionMaker = self._AsyncSessionMaker    #pylint: disable=protected-access   #same class
+        sibling._open_session()                                 #pylint: disable=protected-access   #same class
+        try:
+            yield sibling
+        finally:
+            await sibling._aio_session.close()                  #pylint: disable=protected-access   #same class
+
+    @asynccontextmanager
+    async def named_lock(self, name:str):
+        """ db wide lock (MariaDB GET_LOCK), so that a task only runs in one process at a time
+            Lock is held by the session connection, and released on exit
+            @return
+                (yield) True if lock is acquired, False if it is held by another connection
+        """
+        acquired = (await self._aio_session.execute(sa.text("SELECT GET_LOCK(:name, 0)"), {'name': name})).scalar()
+        try:
+            yield bool(acquired)
+        finally:
+            if acquired:
+                await self._aio_session.execute(sa.text("SELECT RELEASE_LOCK(:name)"), {'name': name})
+
     # session operation overrides
     # ===========================
+    @staticmethod
+    def _forbid_flush(_session, _flush_context, _instances):
+        """ before_flush listener of read only sessions
+        """
+        raise AjDbException("Modification impossible: la session est en lecture seule.")
+
+    @staticmethod
+    def _forbid_write_statement(orm_execute_state:orm.ORMExecuteState):
+        """ do_orm_execute listener of read only sessions
+        """
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            raise AjDbException("Modification impossible: la session est en lecture seule.")
+
     #TODO see how we can detect when update when commiting an update query
     #TODO see how we can detect when a child item is added during an item update (eg adding new address to an existing member), so we can update self._modifier_id
     def add(self, arg):
         """
             replace _aio.session.add
         """
+        if self._read_only:
+            raise AjDbException("Modification impossible: la session est en lecture seule.")
         if not self._modifier_id:
             raise AjDbException("Cannot add without a modifier ID")
 
@@ -137,6 +401,8 @@ class AjDb():
         """
             replace _aio.session.add
         """
+        if self._read_only:
+            raise AjDbException("Modification impossible: la session est en lecture seule.")
         if not self._modifier_id:
             raise AjDbException("Cannot add without a modifier ID")
 
@@ -158,17 +424,327 @@ class AjDb():
             await conn.run_sync(db_t.BaseWithId.metadata.drop_all)
             await conn.run_sync(db_t.BaseWithId.metadata.create_all)
 
+    @staticmethod
+    def _object_graph(objects:list) -> list:
+        """ return objects and all objects reachable from them (save-update cascade), each one once
+        """
+        seen = set()
+        graph = []
+        for obj in objects:
+            mapper = orm.object_mapper(obj)
+            for related in [obj] + [r for r, *_ in mapper.cascade_iterator('save-update', orm.attributes.instance_state(obj))]:
+                if id(related) not in seen:
+                    seen.add(id(related))
+                    graph.append(related)
+        return graph
+
+    @staticmethod
+    def _sync_foreign_keys(obj):
+        """ set foreign key columns of an object not added to a session from its relationships
+        """
+        mapper = orm.object_mapper(obj)
+        for rel in mapper.relationships:
+            if rel.viewonly:
+                continue
+            value = getattr(obj, rel.key)
+            if rel.direction is orm.MANYTOONE and value is not None:
+                for local, remote in rel.local_remote_pairs:
+                    setattr(obj, mapper.get_property_by_column(local).key,
+                            getattr(value, orm.object_mapper(value).get_property_by_column(remote).key))
+            elif rel.direction is orm.ONETOMANY and value:
+                for child in (value if rel.uselist else [value]):
+                    for local, remote in rel.local_remote_pairs:
+                        setattr(child, orm.object_mapper(child).get_property_by_column(remote).key,
+                                getattr(obj, mapper.get_property_by_column(local).key))
+            elif rel.direction is orm.MANYTOMANY and value:
+                raise AjDbException(f"Insertion en masse impossible: relation {mapper.class_.__name__}.{rel.key} à travers une table d'association")
+
+    async def assign_ids(self, objects:list) -> list:
+        """ assign primary keys up front to objects (and objects reachable from them) not having one yet,
+            following the max id of their table, so that they can be referenced before being inserted
+            @return
+                [objects and objects reachable from them]
+        """
+        graph = self._object_graph(objects)
+        for obj in graph:
+            table = orm.object_mapper(obj).local_table
+            if table not in self._next_ids:
+                self._next_ids[table] = (await self._aio_session.scalar(sa.select(sa.func.max(table.c.id)))) or 0
+            if obj.id is None:
+                self._next_ids[table] += 1
+                obj.id = self._next_ids[table]
+            else:
+                self._next_ids[table] = max(self._next_ids[table], int(obj.id))
+        return graph
+
+    async def bulk_insert(self, objects:list):
+        """ insert objects (and objects reachable from them) not yet in db, bypassing the unit of work:
+            primary keys are assigned up front, foreign keys are set from relationships, and each table
+            is inserted with one multi-row insert, in dependency order.
+            All rows get the same log timestamp, and log authors shall already be in db. Objects are not added to the session.
+            Intended for large loads (e.g. migration), changes being committed with the session.
+        """
+        graph = await self.assign_ids(objects)
+        for obj in graph:
+            self._sync_foreign_keys(obj)
+
+        log_timestamp = datetime.now()
+        rows:dict[sa.Table, list[dict]] = {}
+        for obj in graph:
+            mapper = orm.object_mapper(obj)
+            row = {}
+            for prop in mapper.column_attrs:
+                column = prop.columns[0]
+                if not isinstance(column, sa.Column) or column.table is not mapper.local_table:
+                    continue        # computed attribute
+                value = getattr(obj, prop.key)
+                if value is None and column.default is not None and column.default.is_scalar:
+                    value = column.default.arg
+                if value is None and isinstance(obj, db_t.LogMixin) and prop.key == 'log_timestamp':
+                    value = log_timestamp
+                row[column.key] = value
+            rows.setdefault(mapper.local_table, []).append(row)
+
+        for table in _tables_in_dependency_order():
+            if table in rows:
+                await self._aio_session.execute(sa.insert(table), rows[table])
+
+    @asynccontextmanager
+    async def consistent_snapshot(self):
+        """ within this context, stream_columns reads all tables as they were when entering it, whatever is written
+            meanwhile: queries run on one dedicated connection, in a read only repeatable read transaction started with
+            a consistent snapshot (also in read only mode, whose other connections are in autocommit)
+        """
+        async with self._db_engine.connect() as connection:
+            connection = await connection.execution_options(isolation_level='REPEATABLE READ')
+            await connection.exec_driver_sql("START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY")
+            self._snapshot = connection
+            try:
+                yield
+            finally:
+                self._snapshot = None
+                await connection.rollback()
+
+    async def stream_columns(self, query:sa.Select, chunk_rows:int=_DUMP_CHUNK_ROWS) -> AsyncIterator[list[list]]:
+        """ run query with a server side cursor, yielding its rows by chunks of chunk_rows, column per column
+        """
+        result = await (self._snapshot or self._aio_session).stream(query.execution_options(yield_per=chunk_rows))
+        async for chunk in result.partitions():
+            yield [list(values) for values in zip(*chunk)]
+
+    async def dump(self, file_path:Path) -> dict[str, int]:
+        """ save content of all tables in a compressed file, to be restored with restore
+            Tables are streamed in primary key order with a server side cursor, by chunks of _DUMP_CHUNK_ROWS rows
+            stored column per column, so that memory does not depend on db size.
+            All tables are read from one consistent snapshot, so that rows never refer to rows missing from the dump,
+            foreign keys being unchecked on restore.
+            @return
+                number of rows per table
+        """
+        counts = {}
+        # write in a temporary file first, so that an interrupted dump does not corrupt previous one
+        tmp_path = file_path.with_name(file_path.name + '.tmp')
+        async with self.consistent_snapshot():
+            with gzip.open(tmp_path, 'wb') as f:
+                pickle.dump({'format': _DUMP_FORMAT, 'schema': _schema_digest()}, f, protocol=pickle.HIGHEST_PROTOCOL)
+                for table in _tables_in_dependency_order():
+                    counts[table.name] = 0
+                    columns = tuple(column.name for column in table.columns)
+                    async for chunk in self.stream_columns(sa.select(table).order_by(*table.primary_key.columns)):
+                        pickle.dump((table.name, columns, chunk), f, protocol=pickle.HIGHEST_PROTOCOL)
+                        counts[table.name] += len(chunk[0])
+                pickle.dump(None, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path.replace(file_path)
+        return counts
+
+    async def restore(self, file_path:Path) -> dict[str, int]:
+        """ recreate db schema and fill it with content of a file saved by dump, in one transaction
+            Schema changes are committed immediately by MariaDB, so whole file is read and checked before dropping
+            anything: a truncated or corrupted file leaves db untouched.
+            Tables are inserted with multi-row inserts in dependency order. Foreign key checks are disabled meanwhile,
+            as rows refer to their log author, which may be inserted later.
+            As dump is pickled, only restore files written by AjDb.dump.
+            @return
+                number of rows per table
+        """
+        counts = {}
+        for table_name, _, values in _read_dump(file_path):
+            counts[table_name] = counts.get(table_name, 0) + len(values[0] if values else ())
+
+        await self.drop_create_schema()
+        tables = db_t.BaseWithId.metadata.tables
+        # dedicated connection, so that foreign key checks are restored on the connection they were disabled on
+        async with self._db_engine.connect() as conn, conn.begin():
+            await conn.execute(sa.text("SET FOREIGN_KEY_CHECKS=0"))
+            try:
+                for table_name, columns, values in _read_dump(file_path):
+                    await conn.execute(sa.insert(tables[table_name]), [dict(zip(columns, row_values)) for row_values in zip(*values)])
+            finally:
+                await conn.execute(sa.text("SET FOREIGN_KEY_CHECKS=1"))
+        _clear_cache()
+        return counts
+
+    async def upgrade_schema(self) -> list[str]:
+        """ create tables added since db was created, and backfill attendance statistics if they are empty,
+            so that a bot upgraded on an existing db can query members (which load their statistics)
+            @return
+                names of created tables
+        """
+        async with self._db_engine.begin() as conn:
+            existing = await conn.run_sync(lambda sync_conn: set(sa.inspect(sync_conn).get_table_names()))
+            missing = [table for table in _tables_in_dependency_order() if table.name not in existing]
+            await conn.run_sync(db_t.BaseWithId.metadata.create_all, tables=missing, checkfirst=True)
+        stats_query = sa.select(sa.exists(sa.select(1).select_from(db_t.MemberSeasonStat)))
+        if not (await self._aio_session.scalars(stats_query)).one():
+            await self._refresh_member_season_stats()
+            await self._aio_session.commit()
+        return [table.name for table in missing]
+
+    async def rebuild_member_season_stats(self):
+        """ create attendance statistics table if missing, and backfill it from events & memberships
+        """
+        async with self._db_engine.begin() as conn:
+            await conn.run_sync(db_t.MemberSeasonStat.__table__.create, checkfirst=True)
+        await self._refresh_member_season_stats()
+        await self._aio_session.commit()
+
+    async def _refresh_member_season_stats(self, member_ids:Optional[set[int]]=None, season_ids:Optional[list[int]]=None):
+        """ recompute attendance statistics of given members & seasons (all if None) from events & memberships,
+            within current transaction
+        """
+        def restrict(query, member_col, season_col):
+            if member_ids is not None:
+                query = query.where(member_col.in_(member_ids))
+            if season_ids is not None:
+                query = query.where(season_col.in_(season_ids))
+            return query
+
+        presences = restrict(sa.select(db_t.MemberEvent.member_id,
+                                       db_t.Event.season_id,
+                                       sa.func.count(db_t.MemberEvent.id),
+                                       sa.func.max(sa.case((db_t.MemberEvent.presence == True, db_t.Event.date))))   #pylint: disable=singleton-comparison   #this is SQL syntax
+                               .join(db_t.MemberEvent.event)
+                               .where(db_t.MemberEvent.member_id != None)                                           #pylint: disable=singleton-comparison   #this is SQL syntax
+                               .group_by(db_t.MemberEvent.member_id, db_t.Event.season_id),
+                             db_t.MemberEvent.member_id, db_t.Event.season_id)
+        subscriptions = restrict(sa.select(db_t.Membership.member_id, db_t.Membership.season_id),
+                                 db_t.Membership.member_id, db_t.Membership.season_id)
+
+        stats = {}
+        for member_id, season_id, presence_count, last_presence in (await self._aio_session.execute(presences)).all():
+            stats[(member_id, season_id)] = {'member_id': member_id, 'season_id': season_id,
+                                             'presence_count': presence_count, 'last_presence': last_presence, 'is_subscriber': False}
+        for member_id, season_id in (await self._aio_session.execute(subscriptions)).all():
+            stats.setdefault((member_id, season_id), {'member_id': member_id, 'season_id': season_id,
+                                                      'presence_count': 0, 'last_presence': None})['is_subscriber'] = True
+
+        await self._aio_session.execute(restrict(sa.delete(db_t.MemberSeasonStat),
+                                                 db_t.MemberSeasonStat.member_id, db_t.MemberSeasonStat.season_id))
+        if stats:
+            await self._aio_session.execute(sa.insert(db_t.MemberSeasonStat), list(stats.values()))
+
     async def clear_cache(self):
         """ clear db cache
         """
         _clear_cache()
 
-    async def init_cache(self):
-        """ pre-load some semi-permanent db table in cache
+    @staticmethod
+    def save_cache_snapshot(file_path:Path):
+        """ save cache content in a compressed snapshot file, entries that cannot be pickled being skipped
+        """
+        entries = {}
+        for key, value in list(cache_data.items()):
+            try:
+                entries[key] = pickle.dumps((value, cache_time[key]), protocol=pickle.HIGHEST_PROTOCOL)
+            except (pickle.PicklingError, TypeError, AttributeError):
+                continue
+        snapshot = {'format': _SNAPSHOT_FORMAT, 'schema': _schema_digest(), 'entries': entries}
+
+        # write in a temporary file first, so that an interrupted save does not corrupt previous snapshot
+        tmp_path = file_path.with_name(file_path.name + '.tmp')
+        with gzip.open(tmp_path, 'wb') as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path.replace(file_path)
+
+    @staticmethod
+    def load_cache_snapshot(file_path:Path) -> bool:
+        """ restore cache content from a snapshot file saved by save_cache_snapshot
+            Snapshot is ignored if missing, unreadable or created with other table definitions.
+            Restored entries keep their cache time, so expired ones are refreshed on first use.
+            As snapshot is pickled, only load files written by the bot itself.
+            @return
+                True if snapshot has been restored
         """
-        await self.clear_cache()
-        await self.query_asso_roles(lazyload=False)
-        await self.query_seasons(lazyload=True)
+        try:
+            with gzip.open(file_path, 'rb') as f:
+                snapshot = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return False
+        if not isinstance(snapshot, dict) or snapshot.get('format') != _SNAPSHOT_FORMAT or snapshot.get('schema') != _schema_digest():
+            return False
+
+        for key, entry in snapshot['entries'].items():
+            try:
+                value, cached_time = pickle.loads(entry)
+            except (pickle.UnpicklingError, EOFError, AttributeError, ImportError, TypeError):
+                continue
+            cache_data[key] = value
+            cache_time[key] = cached_time
+        return True
+
+    @staticmethod
+    def schema_digest() -> str:
+        """ digest of db tables definition, to detect files saved with other table definitions
+        """
+        return _schema_digest()
+
+    @staticmethod
+    def db_unavailable() -> bool:
+        """ True if db has been failing recently, cached data being served instead
+        """
+        return _breaker.is_open
+
+    async def init_cache(self, clear:bool=True, budget_sec:Optional[float]=None) -> dict[str, Optional[float]]:
+        """ pre-load some semi-permanent db table in cache (see _WARM_UP_PLAN)
+            @args
+                clear: if False, cached data (e.g. restored from snapshot) is kept and served until refreshed.
+                       Data computed from db (e.g. attendance matrix) is built again anyway.
+                budget_sec: [Optional] max warm-up duration, configured one if not set
+            @return
+                warm-up duration per cache (see warm_up)
+        """
+        if clear:
+            await self.clear_cache()
+        else:
+            _clear_derived_cache()
+        return await self.warm_up(_WARM_UP_PLAN,
+                                  budget_sec=budget_sec if budget_sec is not None else self._aj_config.db_warm_up_budget_sec)
+
+    async def warm_up(self, items:dict[str, Callable[['AjDb'], Awaitable]], budget_sec:float) -> dict[str, Optional[float]]:
+        """ run items concurrently, each one in its own session (so on its own pooled connection)
+            @args
+                items: name -> async function to run, called with the AjDb of its session
+                budget_sec: items not done once budget is elapsed are cancelled
+            @return
+                name -> duration in seconds, None if not done within budget or failed
+        """
+        timings:dict[str, Optional[float]] = dict.fromkeys(items)
+
+        async def run(name, item):
+            start = time.monotonic()
+            try:
+                async with self._sibling() as aj_db:
+                    await item(aj_db)
+            except Exception as e:     #pylint: disable=broad-exception-caught   #a failing item shall not stop the others nor the bot start
+                print(f"Préchargement '{name}' en échec: {e!r}")
+                return
+            timings[name] = time.monotonic() - start
+
+        try:
+            await asyncio.wait_for(asyncio.gather(*(run(name, item) for name, item in items.items())), timeout=budget_sec)
+        except TimeoutError:
+            print(f"Préchargement interrompu après {budget_sec}s: {', '.join(k for k, v in timings.items() if v is None)}")
+        return timings
 
 
     # DB Queries
@@ -255,13 +831,13 @@ class AjDb():
         # Check if lookup_val is a discord.db_t.Member object
         if isinstance(lookup_val, discord.Member):
             try:
-                query = sa.select(db_t.Member).where(db_t.Member.discord == lookup_val.name)
+                return await self._load_member(_member_by_discord_loader, lookup_val.name)
             except MemberNotFound as e:
                 raise AjDbException(f"Le champ de recherche {lookup_val} n'est pas reconnu comme de type discord") from e
 
         # check if lookup_val is an integer (member ID)
         elif isinstance(lookup_val, int):
-            query = sa.select(db_t.Member).where(db_t.Member.id == lookup_val)
+            return await self._load_member(_member_by_id_loader, int(lookup_val))
 
         elif isinstance(lookup_val, str):
             query = sa.select(db_t.Member).where(db_t.Member.credential)
@@ -270,7 +846,9 @@ class AjDb():
             raise AjDbException(f"Le champ de recherche doit être de type 'discord', 'int' or 'str', pas '{type(lookup_val)}'")
 
 
-        matched_members = (await self._aio_session.scalars(query)).all()
+        async def fetch():
+            return (await self._aio_session.scalars(query)).all()
+        matched_members = await self._members_or_cached(fetch, lambda m: m.credential)
 
         if len(matched_members) <= 1:
             return matched_members
@@ -290,6 +868,40 @@ class AjDb():
         return matched_members
 
 
+    async def _load_member(self, loader:BatchLoader, key) -> list[db_t.Member]:
+        ''' retrieve member by key using a batch loader, so that concurrent lookups share one query
+            @return
+                [member] if found, [] otherwise
+        '''
+        async def fetch():
+            member = await loader.load(self._AsyncSessionMaker, key)
+            if member is None:
+                return []
+            return [await self._aio_session.merge(member, load=False)]
+        return await self._members_or_cached(fetch, lambda m: loader.matches(m, key))
+
+    async def _members_or_cached(self, fetch:Callable[[], Awaitable[list[db_t.Member]]], cached_filter:Callable[[db_t.Member], bool]) -> list[db_t.Member]:
+        ''' retrieve members with fetch(), or if db is unavailable, filter members kept in cache (see init_cache)
+            session is then flagged as stale
+            @return
+                [found members]
+        '''
+        error = None
+        if not _breaker.is_open:
+            try:
+                members = await fetch()
+                _breaker.success()
+                return members
+            except _DB_UNAVAILABLE_ERRORS as e:
+                _breaker.failure()
+                error = e
+
+        cached_members = cache_data.get(('query_table_content', (db_t.Member,), ()))
+        if cached_members is None:
+            raise AjDbException("La base de données est indisponible, réessaie plus tard.") from error
+        self.stale = True
+        return [await self._aio_session.merge(m, load=False) for m in cached_members if cached_filter(m)]
+
     async def query_members_per_season_presence(self, season_name:str = None, subscriber_only:bool = False) -> list[db_t.Member]:
         ''' retrieve list of members having participated in season
             @args
@@ -300,23 +912,113 @@ class AjDb():
                 [all found members with number of presence]
         '''
 
-        query = sa.select(db_t.Member)
+        query = sa.select(db_t.Member)\
+                  .join(db_t.Member.season_stats)\
+                  .join(db_t.MemberSeasonStat.season)\
+                  .where(self._season_where(season_name))
         if subscriber_only:
-            query = query.join(db_t.Member.memberships)
+            query = query.where(db_t.MemberSeasonStat.is_subscriber == True)      #pylint: disable=singleton-comparison   #this is SQL syntax
         else:
-            query = query.join(db_t.Member.event_member_associations).join(db_t.MemberEvent.event)
+            query = query.where(db_t.MemberSeasonStat.presence_count > 0)
 
+        members = (await self._aio_session.scalars(query)).all()
+        return members
+
+    @staticmethod
+    def _season_where(season_name:Optional[str] = None):
+        """ return filter on season: given season name, or current season if empty
+        """
         if season_name:
-            where = db_t.Season.name == season_name
-        else:
-            where = db_t.Season.is_current_season
+            return db_t.Season.name == season_name
+        return db_t.Season.is_current_season
 
-        query = query.join(db_t.Season)\
-                     .where(where)\
-                     .group_by(db_t.Member)
+    @staticmethod
+    def member_page_key(member:db_t.Member) -> tuple:
+        """ return the keyset pagination cursor of a member, matching ordering of query_members_page
+        """
+        return (member.credential.last_name or '' if member.credential else '',
+                member.credential.first_name or '' if member.credential else '',
+                int(member.id))
+
+    # only first page is kept as fallback, next pages being reached from it
+    @_async_cached(fallback_only=True, uncached_args=('after', 'before'))
+    async def query_members_page(self,
+                                 season_name:Optional[str] = None,
+                                 after:Optional[tuple] = None,
+                                 before:Optional[tuple] = None,
+                                 limit:int = 20) -> tuple[list[db_t.Member], bool]:
+        ''' retrieve one page of members having participated or subscribed in season,
+            ordered by (last name, first name, id) using keyset pagination
+            @args
+                season_name     [Optional] If empty, use current season
+                after           [Optional] cursor (see member_page_key) after which the page starts
+                before          [Optional] cursor (see member_page_key) before which the page ends
+                limit           max number of members in the page
 
-        members = (await self._aio_session.scalars(query)).all()
-        return members
+            @return
+                [members of the page], True if there are more members beyond the page (in the fetching direction)
+        '''
+        season_where = self._season_where(season_name)
+        page_key = (sa.func.coalesce(db_t.Credential.last_name, ''),
+                    sa.func.coalesce(db_t.Credential.first_name, ''),
+                    db_t.Member.id)
+
+        query = sa.select(db_t.Member)\
+                  .outerjoin(db_t.Member.credential)\
+                  .where(db_t.Member.season_stats.any(db_t.MemberSeasonStat.season.has(season_where)))
+        if before is not None:
+            query = query.where(sa.tuple_(*page_key) < sa.tuple_(*before))\
+                         .order_by(*(k.desc() for k in page_key))
+        else:
+            if after is not None:
+                query = query.where(sa.tuple_(*page_key) > sa.tuple_(*after))
+            query = query.order_by(*page_key)
+
+        members = list((await self._aio_session.scalars(query.limit(limit + 1))).all())
+        has_more = len(members) > limit
+        members = members[:limit]
+        if before is not None:
+            members.reverse()
+        return members, has_more
+
+    @_async_cached(fallback_only=True)
+    async def query_season_headcount(self, season_name:Optional[str] = None) -> tuple[int, int, int]:
+        ''' count participants, subscribers and events of a season
+            @args
+                season_name     [Optional] If empty, use current season
+
+            @return
+                number of participants, number of subscribers, number of events
+        '''
+        season_where = self._season_where(season_name)
+        participants = sa.select(sa.func.count(db_t.MemberSeasonStat.id))\
+                         .join(db_t.MemberSeasonStat.season)\
+                         .where(season_where, db_t.MemberSeasonStat.presence_count > 0)
+        subscribers = sa.select(sa.func.count(db_t.MemberSeasonStat.id))\
+                        .join(db_t.MemberSeasonStat.season)\
+                        .where(season_where, db_t.MemberSeasonStat.is_subscriber == True)   #pylint: disable=singleton-comparison   #this is SQL syntax
+        events = sa.select(sa.func.count(db_t.Event.id))\
+                   .join(db_t.Event.season)\
+                   .where(season_where)
+
+        return ((await self._aio_session.scalars(participants)).one(),
+                (await self._aio_session.scalars(subscribers)).one(),
+                (await self._aio_session.scalars(events)).one())
+
+    async def query_presence_matrix(self) -> PresenceMatrix:
+        ''' retrieve members x events attendance matrix, built with one query on first use,
+            then updated by add_update_event and rebuilt once cache is cleared or reloaded (see init_cache)
+            @return
+                shared matrix, not to be modified
+        '''
+        global _presence_matrix   #pylint: disable=global-statement   #on purpose, to handle cache
+        if _presence_matrix is None:
+            query = sa.select(db_t.Event.id, db_t.Event.date, db_t.Event.season_id, db_t.Season.name, db_t.MemberEvent.member_id)\
+                      .join(db_t.Event.season)\
+                      .outerjoin(db_t.MemberEvent, sa.and_(db_t.MemberEvent.event_id == db_t.Event.id,
+                                                           db_t.MemberEvent.presence == True))   #pylint: disable=singleton-comparison   #this is SQL syntax
+            _presence_matrix = PresenceMatrix.from_rows((await self._aio_session.execute(query)).all())
+        return _presence_matrix
 
     async def query_members_per_event_presence(self, event_id) -> list[db_t.Member]:
         ''' retrieve list of members having participated to an event
@@ -349,9 +1051,9 @@ class AjDb():
 
         return members[0]
 
-    async def query_member_sign_sheet(self, sign_sheet_file):
-        """ Create a sign sheet PDF file for all members with presence in current season
-            sign_sheet_file: file-like object
+    async def query_member_sign_sheet_rows(self) -> list[list[str]]:
+        """ Return rows of the sign sheet: all members with presence in current season, sorted by name
+            Rows are the only input of the sign sheet, so they identify it (see query_member_sign_sheet)
         """
         members = await self.query_members_per_season_presence()
         free_venues = self._aj_config.asso_free_presence
@@ -359,19 +1061,27 @@ class AjDb():
         # sort alphabetically per last name / first name
         members.sort(key=lambda x: x.credential)
 
+        return [[f"{member.id:{FormatTypes.FULL}}",
+                 f"{member.credential:{FormatTypes.FULL}}",
+                 "" if member.is_subscriber else f"{'!' if member.season_presence_count() >= free_venues else ''}{member.season_presence_count()}",
+                 '',
+                ] for member in members]
+
+    async def query_member_sign_sheet(self, sign_sheet_file, rows:Optional[list[list[str]]]=None):
+        """ Create a sign sheet PDF file for all members with presence in current season
+            sign_sheet_file: file-like object
+            rows: [Optional] sign sheet rows if already retrieved (see query_member_sign_sheet_rows)
+        """
+        if rows is None:
+            rows = await self.query_member_sign_sheet_rows()
+
         # use Matplotlib to write to a PDF, creating a figure with only the data table showing up
         inch_to_cm = 2.54
         fig, ax = plt.subplots(figsize=(21/inch_to_cm, 29.7/inch_to_cm))  # A4 size in inches
 
         ax.axis('off')
-        input_dic = [{'ID': f"{member.id:{FormatTypes.FULL}}",
-                      'Nom': f"{member.credential:{FormatTypes.FULL}}",
-                      '#': "" if member.is_subscriber else f"{'!' if member.season_presence_count() >= free_venues else ''}{member.season_presence_count()}",
-                      'Signature': '',
-                     } for member in members]
-
-        input_list = [list(d.values()) for d in input_dic]
-        input_columns = list(input_dic[0].keys())
+        input_list = [list(row) for row in rows]
+        input_columns = ['ID', 'Nom', '#', 'Signature']
         input_columns_width = [0.1, 0.3, 0.1, 0.5] # Need adjust if changing list of columns, total should always be 1
 
         row_per_page = 20
@@ -395,6 +1105,7 @@ class AjDb():
                 _the_table.scale(1, table_height_scale)
 
                 signsheet_file.savefig(fig)
+        plt.close(fig)
 
     async def query_member_emails(self, last_participation_duration:Optional[timedelta]=None) -> list[db_t.Email]:
         """ return list of member emails
@@ -402,15 +1113,54 @@ class AjDb():
             last_participation_duration: if None, emails of current season subscribers
                                          if not none: emails of any people present in the last last_presence_delta
         """
-        members:list[db_t.Member] = await self.query_table_content(db_t.Member, refresh_cache=True)   #pylint: disable=unexpected-keyword-arg # decorator argument
+        members_by_id, segments = await self._query_member_segments()
+        member_ids = segments.predicate('cotisant')
+        if last_participation_duration is not None:
+            member_ids |= segments.present_since(datetime.now().date() - last_participation_duration)
+
+        return [m.email_principal.email for m in await self._segment_members(members_by_id, member_ids & segments.predicate('email'))]
+
+    async def _query_member_segments(self, refresh_cache:bool=False) -> tuple[dict[int, db_t.Member], MemberSegments]:
+        """ return cached members per id & member ids per segment predicate, computed again once members cache changes
+            (member & event edits drop it, see _clear_member_cache)
+        """
+        global _member_segments   #pylint: disable=global-statement   #on purpose, to handle cache
+        members:list[db_t.Member] = await self.query_table_content(db_t.Member, refresh_cache=refresh_cache, keep_detached=True)   #pylint: disable=unexpected-keyword-arg # decorator argument
+        if _member_segments is None or _member_segments[0] is not members:
+            season_subscribers:dict[str, set[int]] = {season.name: set() for season in await self.query_seasons(keep_detached=True)}   #pylint: disable=unexpected-keyword-arg # decorator argument
+            roles:dict[str, set[int]] = {}
+            for m in members:
+                for stat in m.season_stats:
+                    if stat.is_subscriber:
+                        season_subscribers.setdefault(stat.season.name, set()).add(int(m.id))
+                if m.current_asso_role:
+                    roles.setdefault(m.current_asso_role.name, set()).add(int(m.id))
+            flags = {'cotisant': [int(m.id) for m in members if m.is_subscriber],
+                     'ancien_cotisant': [int(m.id) for m in members if m.is_past_subscriber],
+                     'email': [int(m.id) for m in members if m.email_principal],
+                     'telephone': [int(m.id) for m in members if m.phone_principal],
+                    }
+            segments = MemberSegments(member_ids=[int(m.id) for m in members],
+                                      flags=flags,
+                                      season_subscribers=season_subscribers,
+                                      roles=roles,
+                                      matrix=await self.query_presence_matrix())
+            _member_segments = (members, {int(m.id): m for m in members}, segments)
+        _, members_by_id, segments = _member_segments
+        return members_by_id, segments
+
+    async def query_segment_members(self, expression:str, refresh_cache:bool=False) -> list[db_t.Member]:
+        """ return members of a segment, sorted by id
+            expression: predicates combined with set operators, see segment.MemberSegments.evaluate
+            refresh_cache: if True, members are queried again
+        """
+        members_by_id, segments = await self._query_member_segments(refresh_cache=refresh_cache)
+        return await self._segment_members(members_by_id, segments.evaluate(expression))
 
-        return [m.email_principal.email for m in members if     m.email_principal
-                                                            and (   m.is_subscriber
-                                                                or (    last_participation_duration is not None
-                                                                    and m.last_presence
-                                                                    and m.last_presence >= (datetime.now().date() - last_participation_duration)
-                                                                    )
-                                                                )]
+    async def _segment_members(self, members_by_id:dict[int, db_t.Member], member_ids:frozenset[int]) -> list[db_t.Member]:
+        """ return cached members of given ids, sorted by id, merged with current session
+        """
+        return await _merge_cached(self._aio_session, [members_by_id[member_id] for member_id in sorted(member_ids)])
 
 
     async def add_update_member(self,
@@ -439,11 +1189,26 @@ class AjDb():
 
         await self._aio_session.commit()
         await self._aio_session.refresh(db_member)
+        _clear_member_cache()
 
         return db_member
 
     # Events
     # -------
+    async def query_event(self, event_id:int) -> Optional[db_t.Event]:
+        ''' retrieve one event, with its participants
+            @args
+                event_id
+
+            @return
+                found event, None if it does not exist
+        '''
+        query = sa.select(db_t.Event)\
+                  .where(db_t.Event.id == event_id)\
+                  .options(orm.selectinload(db_t.Event.member_event_associations).selectinload(db_t.MemberEvent.member))
+
+        return (await self._aio_session.scalars(query)).one_or_none()
+
     @_async_cached
     async def query_events(self, event_str:Optional[str] = None, lazyload:bool=True) -> list[db_t.Event]:
         ''' retrieve all events or with a given name
@@ -490,6 +1255,42 @@ class AjDb():
         return events
 
 
+    # only first page is kept as fallback, next pages being reached from it
+    @_async_cached(fallback_only=True, uncached_args=('after', 'before'))
+    async def query_events_page(self,
+                                season_name:Optional[str] = None,
+                                after:Optional[date] = None,
+                                before:Optional[date] = None,
+                                limit:int = 20) -> tuple[list[db_t.Event], bool]:
+        ''' retrieve one page of events of a season, ordered by date using keyset pagination
+            Participants are not loaded, only their associations (enough to count them)
+            @args
+                season_name     [Optional] If empty, use current season
+                after           [Optional] date after which the page starts
+                before          [Optional] date before which the page ends
+                limit           max number of events in the page
+
+            @return
+                [events of the page], True if there are more events beyond the page (in the fetching direction)
+        '''
+        query = sa.select(db_t.Event)\
+                  .where(db_t.Event.season.has(self._season_where(season_name)))\
+                  .options(orm.selectinload(db_t.Event.member_event_associations).lazyload(db_t.MemberEvent.member))
+        if before is not None:
+            query = query.where(db_t.Event.date < before).order_by(db_t.Event.date.desc())
+        else:
+            if after is not None:
+                query = query.where(db_t.Event.date > after)
+            query = query.order_by(db_t.Event.date)
+
+        events = list((await self._aio_session.scalars(query.limit(limit + 1))).all())
+        has_more = len(events) > limit
+        events = events[:limit]
+        if before is not None:
+            events.reverse()
+        return events, has_more
+
+
     async def add_update_event(self,
                                event_id = None,
                                event_date:Optional[date]=None,
@@ -497,13 +1298,12 @@ class AjDb():
                                participant_ids:Optional[list[int]]=None,) -> db_t.Event:
         """ add or update an event
         """
-        participant_ids = list(set(participant_ids)) if participant_ids is not None else []    # remove any duplicate & force to list
-        query = sa.select(sa.func.max(db_t.Member.id))
-        last_valid_member_id = (await self._aio_session.scalars(query)).one_or_none()
-        unkown_participant_ids = [i for i in participant_ids if i > last_valid_member_id]
-
-        if unkown_participant_ids:
-            raise AjDbException(f"ID asso inconnu(s): {', '.join(str(i) for i in unkown_participant_ids)}")
+        participant_ids = set(participant_ids) if participant_ids is not None else set()    # remove any duplicate
+        if participant_ids:
+            query = sa.select(db_t.Member.id).where(db_t.Member.id.in_(participant_ids))
+            unkown_participant_ids = participant_ids - {int(i) for i in (await self._aio_session.scalars(query)).all()}
+            if unkown_participant_ids:
+                raise AjDbException(f"ID asso inconnu(s): {', '.join(str(i) for i in sorted(unkown_participant_ids))}")
 
         # create or get event
         if not event_id:
@@ -516,8 +1316,9 @@ class AjDb():
 
             # Need to create event first to have its id, before being able to add participants
             # This will also raise an error if event at same date already exists
-            await self._aio_session.commit()
-            await self._aio_session.refresh(db_event)
+            await self._aio_session.flush()
+            associations = {}
+            delegated_ids = set()
         else:
             if event_date:
                 raise AjDbException("Evènement existe et date fournie. Ce n'est pas permis.")
@@ -525,25 +1326,42 @@ class AjDb():
             db_event = (await self._aio_session.scalars(query)).one_or_none()
             if not db_event:
                 raise AjDbException(f"Evènement inconnu: {event_id}")
+            associations = {mbr_evt.id: mbr_evt.member_id for mbr_evt in db_event.member_event_associations}
+            delegated_ids = {mbr_evt.member_id for mbr_evt in db_event.member_event_associations if not mbr_evt.presence}
 
         # set name
         db_event.name = event_name
 
         db_event.log_author_id = self._modifier_id
 
-        # delete / add participants
-        for mbr_evt in db_event.member_event_associations:
-            if mbr_evt.member_id not in participant_ids:
-                await self._aio_session.delete(mbr_evt)
-
-        existing_participant_ids = [mbr.id for mbr in db_event.members]
-        self.add_all([db_t.MemberEvent(member_id = mbr_id, event_id=db_event.id, presence = True)
-                      for mbr_id in participant_ids
-                      if mbr_id not in existing_participant_ids])
+        # delete / add participants, with one statement each
+        existing_participant_ids = {mbr_id for mbr_id in associations.values() if mbr_id is not None}
+        removed_association_ids = [assoc_id for assoc_id, mbr_id in associations.items() if mbr_id not in participant_ids]
+        added_participant_ids = participant_ids - existing_participant_ids
+
+        if removed_association_ids:
+            await self._aio_session.execute(sa.delete(db_t.MemberEvent)
+                                            .where(db_t.MemberEvent.id.in_(removed_association_ids)))
+        if added_participant_ids:
+            await self._aio_session.execute(sa.insert(db_t.MemberEvent)
+                                            .values([{'member_id': mbr_id,
+                                                      'event_id': db_event.id,
+                                                      'presence': True,
+                                                      'log_author_id': self._modifier_id}
+                                                     for mbr_id in sorted(added_participant_ids)]))
+
+        # keep attendance statistics in the same transaction
+        await self._refresh_member_season_stats(member_ids=existing_participant_ids | participant_ids, season_ids=[db_event.season_id])
 
         await self._aio_session.commit()
         await self._aio_session.refresh(db_event)
 
+        # attendance statistics of participants have changed
+        _clear_member_cache()
+        # participants kept with a delegated vote are not present
+        if _presence_matrix is not None:
+            _presence_matrix.set_event(db_event.id, db_event.date, db_event.season_id, db_event.season.name, participant_ids - delegated_ids)
+
         return db_event
 
 
@@ -0,0 +1,87 @@
+''' Batch loading of db rows by key, shared between concurrent sessions
+'''
+import asyncio
+from typing import Any, Callable, Hashable
+
+import sqlalchemy as sa
+from sqlalchemy.ext import asyncio as aio_sa
+
+from ajbot._internal.exceptions import OtherException
+
+
+class BatchLoader():
+    """ Collects the lookups of rows by key issued by concurrent coroutines during a short window,
+        resolves them with a single "WHERE column IN (...)" query, and dispatches results back.
+
+        Query runs in its own session, so returned rows are detached: callers merge them in their session.
+
+        table: ORM class of the rows
+        key_getter: function returning the key of a row, key_column: column to filter on
+        case_insensitive: string keys are compared with casefold(), as the column collation compares them,
+                          so that a row stored with another case than the lookup is still dispatched
+        window_sec: time during which lookups are collected before running the query
+    """
+    def __init__(self, table, key_column, key_getter:Callable[[Any], Hashable], case_insensitive:bool=False, window_sec:float=0.005):
+        self._table = table
+        self._key_column = key_column
+        self._key_getter = key_getter
+        self._case_insensitive = case_insensitive
+        self._window_sec = window_sec
+        self._pending:dict[Hashable, list[asyncio.Future]] = {}
+        self._session_maker:aio_sa.async_sessionmaker = None
+        self.batches = 0
+        self.lookups = 0
+
+    def _normalize(self, key:Hashable) -> Hashable:
+        """ return key as compared by the db
+        """
+        return key.casefold() if self._case_insensitive and isinstance(key, str) else key
+
+    def key_of(self, row) -> Hashable:
+        """ return the key of a row, as compared by the db
+        """
+        return self._normalize(self._key_getter(row))
+
+    def matches(self, row, key:Hashable) -> bool:
+        """ True if row is the one a lookup of key returns
+        """
+        return self.key_of(row) == self._normalize(key)
+
+    async def load(self, session_maker:aio_sa.async_sessionmaker, key:Hashable):
+        """ return row matching key (None if not found), detached
+            session_maker: used to run the query if this lookup starts a new batch
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if not self._pending:
+            self._session_maker = session_maker
+            loop.call_later(self._window_sec, lambda: loop.create_task(self._dispatch()))
+        self._pending.setdefault(key, []).append(future)
+        self.lookups += 1
+        return await future
+
+    async def _dispatch(self):
+        """ run one query for all pending lookups and resolve them
+        """
+        pending, self._pending = self._pending, {}
+        session_maker, self._session_maker = self._session_maker, None
+        self.batches += 1
+        try:
+            async with session_maker() as session:
+                query = sa.select(self._table).where(self._key_column.in_(list(pending.keys())))
+                rows = {self.key_of(row): row for row in (await session.scalars(query)).all()}
+        except Exception as e:     #pylint: disable=broad-exception-caught   #exception is forwarded to all callers
+            for futures in pending.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+
+        for key, futures in pending.items():
+            for future in futures:
+                if not future.done():
+                    future.set_result(rows.get(self._normalize(key)))
+
+
+if __name__ == '__main__':
+    raise OtherException('This module is not meant to be executed directly.')
@@ -0,0 +1,152 @@
+''' In memory members x events attendance matrix, for attendance analytics
+'''
+from datetime import date
+from typing import Iterable, Optional
+
+import numpy as np
+
+from ajbot._internal.exceptions import OtherException
+
+
+class PresenceMatrix():
+    """ Attendance of members (rows, sorted by id) to events (columns, sorted by date).
+        Only actual presences are counted, not delegated votes. Events sorted by date, seasons span consecutive columns.
+    """
+    def __init__(self):
+        self.member_ids = np.empty(0, dtype=np.int64)
+        self.event_ids = np.empty(0, dtype=np.int64)
+        self.event_dates = np.empty(0, dtype='datetime64[D]')
+        self.event_seasons = np.empty(0, dtype=np.int64)
+        self.season_names:dict[int, str] = {}
+        self.presences = np.zeros((0, 0), dtype=bool)
+
+    @classmethod
+    def from_rows(cls, rows:Iterable[tuple[int, date, int, str, Optional[int]]]) -> 'PresenceMatrix':
+        """ build matrix from (event id, event date, season id, season name, member id) rows,
+            one per presence, events without presence having one row with None member id
+        """
+        matrix = cls()
+        events:dict[int, tuple[date, int]] = {}
+        presences:list[tuple[int, int]] = []
+        for event_id, event_date, season_id, season_name, member_id in rows:
+            events.setdefault(event_id, (event_date, season_id))
+            matrix.season_names[season_id] = season_name
+            if member_id is not None:
+                presences.append((member_id, event_id))
+
+        ordered = sorted(events, key=lambda e: (events[e][0], e))
+        matrix.event_ids = np.array(ordered, dtype=np.int64)
+        matrix.event_dates = np.array([events[e][0] for e in ordered], dtype='datetime64[D]')
+        matrix.event_seasons = np.array([events[e][1] for e in ordered], dtype=np.int64)
+        matrix.member_ids = np.unique(np.array([m for m, _ in presences], dtype=np.int64))
+        matrix.presences = np.zeros((len(matrix.member_ids), len(matrix.event_ids)), dtype=bool)
+        if presences:
+            member_ids, event_ids = np.array(presences, dtype=np.int64).T
+            matrix.presences[np.searchsorted(matrix.member_ids, member_ids), matrix._columns(event_ids)] = True
+        return matrix
+
+    def _columns(self, event_ids:np.ndarray) -> np.ndarray:
+        """ return columns of given events
+        """
+        sorter = np.argsort(self.event_ids)
+        return sorter[np.searchsorted(self.event_ids, event_ids, sorter=sorter)]
+
+    def set_event(self, event_id:int, event_date:date, season_id:int, season_name:str, member_ids:Iterable[int]):
+        """ add or update the attendance of an event
+        """
+        member_ids = np.array(sorted(set(member_ids)), dtype=np.int64)
+        self.season_names[season_id] = season_name
+
+        new_member_ids = np.setdiff1d(member_ids, self.member_ids)
+        if len(new_member_ids):
+            rows = np.searchsorted(self.member_ids, new_member_ids)
+            self.member_ids = np.insert(self.member_ids, rows, new_member_ids)
+            self.presences = np.insert(self.presences, rows, False, axis=0)
+
+        [columns] = np.nonzero(self.event_ids == event_id)
+        if len(columns):
+            column = columns[0]
+        else:
+            column = np.searchsorted(self.event_dates, np.datetime64(event_date, 'D'), side='right')
+            self.event_ids = np.insert(self.event_ids, column, event_id)
+            self.event_dates = np.insert(self.event_dates, column, np.datetime64(event_date, 'D'))
+            self.event_seasons = np.insert(self.event_seasons, column, season_id)
+            self.presences = np.insert(self.presences, column, False, axis=1)
+        self.presences[:, column] = np.isin(self.member_ids, member_ids)
+
+    def season_bounds(self) -> list[tuple[int, int, int]]:
+        """ return (season id, first column, last column + 1) of seasons having events, by date
+        """
+        if not len(self.event_ids):
+            return []
+        starts = np.flatnonzero(np.r_[True, self.event_seasons[1:] != self.event_seasons[:-1]])
+        ends = np.r_[starts[1:], len(self.event_ids)]
+        return [(int(self.event_seasons[start]), int(start), int(end)) for start, end in zip(starts, ends)]
+
+    def counts_per_season(self) -> np.ndarray:
+        """ return number of presences of each member (rows) per season (columns, see season_bounds)
+        """
+        bounds = self.season_bounds()
+        if not bounds:
+            return np.zeros((len(self.member_ids), 0), dtype=np.int32)
+        return np.add.reduceat(self.presences, [start for _, start, _ in bounds], axis=1, dtype=np.int32)
+
+    def presences_per_event(self, season_id:int) -> tuple[np.ndarray, np.ndarray]:
+        """ return dates & number of presences of the events of a season, by date
+        """
+        columns = self.event_seasons == season_id
+        return self.event_dates[columns], self.presences[:, columns].sum(axis=0)
+
+    def participants_per_season(self, subscriptions:Iterable[tuple[int, int]]) -> list[tuple[int, int, int]]:
+        """ return (season id, participants having a membership of the season, other participants) of seasons having events
+            subscriptions: (member id, season id) of memberships
+        """
+        bounds = self.season_bounds()
+        attended = self.counts_per_season() > 0
+        subscribed = np.zeros_like(attended)
+        subscriptions = np.array(list(subscriptions), dtype=np.int64).reshape(-1, 2)
+        season_ids = np.array([season_id for season_id, _, _ in bounds], dtype=np.int64)
+        if len(self.member_ids) and len(season_ids):
+            rows = np.searchsorted(self.member_ids, subscriptions[:, 0]).clip(max=len(self.member_ids) - 1)
+            sorter = np.argsort(season_ids)
+            columns = sorter[np.searchsorted(season_ids, subscriptions[:, 1], sorter=sorter).clip(max=len(season_ids) - 1)]
+            known = (self.member_ids[rows] == subscriptions[:, 0]) & (season_ids[columns] == subscriptions[:, 1])
+            subscribed[rows[known], columns[known]] = True
+        subscribers = (attended & subscribed).sum(axis=0)
+        return [(season_id, int(nb_subscribers), int(nb_participants - nb_subscribers))
+                for (season_id, _, _), nb_subscribers, nb_participants in zip(bounds, subscribers, attended.sum(axis=0))]
+
+    def active_members(self, last_events:int, min_presences:int) -> tuple[np.ndarray, np.ndarray]:
+        """ return ids & presence counts of members who came to at least min_presences of the last last_events events
+        """
+        counts = self.presences[:, -last_events:].sum(axis=1) if last_events > 0 else np.zeros(len(self.member_ids), dtype=int)
+        active = counts >= min_presences
+        return self.member_ids[active], counts[active]
+
+    def longest_streaks(self) -> np.ndarray:
+        """ return, for each member, the longest number of consecutive events attended
+        """
+        padded = np.zeros((len(self.member_ids), len(self.event_ids) + 2), dtype=np.int8)
+        padded[:, 1:-1] = self.presences
+        edges = np.diff(padded, axis=1)
+        # starts & ends of streaks are both sorted by member then column, so they pair up
+        start_rows, start_columns = np.nonzero(edges == 1)
+        _, end_columns = np.nonzero(edges == -1)
+        streaks = np.zeros(len(self.member_ids), dtype=np.int32)
+        np.maximum.at(streaks, start_rows, end_columns - start_columns)
+        return streaks
+
+    def retention(self) -> list[tuple[int, int, int, int]]:
+        """ return (season id, next season id, participants of season, participants also coming to next season)
+            for consecutive seasons having events
+        """
+        bounds = self.season_bounds()
+        attended = self.counts_per_season() > 0
+        retained = (attended[:, :-1] & attended[:, 1:]).sum(axis=0)
+        return [(season_id, next_season_id, int(participants), int(kept))
+                for (season_id, _, _), (next_season_id, _, _), participants, kept
+                in zip(bounds, bounds[1:], attended[:, :-1].sum(axis=0), retained)]
+
+
+if __name__ == '__main__':
+    raise OtherException('This module is not meant to be executed directly.')
@@ -0,0 +1,164 @@
+''' Member segments: audiences composed from predicates, evaluated as set operations on member ids
+    e.g. "(cotisant ou present:52) et email sauf role:bureau"
+'''
+import re
+from datetime import date, datetime, timedelta
+from typing import Iterable, Optional
+
+import numpy as np
+
+from ajbot._internal.ajdb.presence import PresenceMatrix
+from ajbot._internal.exceptions import OtherException, AjDbException
+
+
+# predicates of a segment expression, with their description
+PREDICATES = {
+    'tous': "tous les membres",
+    'cotisant': "cotisant de la saison en cours (cotisant:<saison> pour une autre saison)",
+    'ancien_cotisant': "cotisant d'une saison passée",
+    'present:<n>': "présent à un évènement dans les n dernières semaines",
+    'role:<nom>': "rôle asso actuel (entre guillemets si le nom contient des espaces)",
+    'email': "a un email principal",
+    'telephone': "a un téléphone principal",
+    'evenement:<id>': "présent à l'évènement",
+}
+# operators, by increasing precedence: union & difference, intersection, complement
+_OR, _EXCEPT, _AND, _NOT = 'ou', 'sauf', 'et', 'non'
+
+_TOKENS = re.compile(r'\s*(?:([()])|([^\s()"]+(?:"[^"]*")?))')
+
+
+class MemberSegments():
+    """ Member ids per predicate, computed once, so that any segment is evaluated with set operations only.
+        Predicates depending on attendance use the attendance matrix, so they follow event edits.
+    """
+    def __init__(self,
+                 member_ids:Iterable[int],
+                 flags:dict[str, Iterable[int]],
+                 season_subscribers:dict[str, Iterable[int]],
+                 roles:dict[str, Iterable[int]],
+                 matrix:PresenceMatrix):
+        ''' @args
+                member_ids:         all members
+                flags:              members per predicate without argument ('cotisant', 'email', ...)
+                season_subscribers: subscribers per season name
+                roles:              members per current asso role name
+                matrix:             attendance matrix
+        '''
+        self._all = frozenset(member_ids)
+        self._flags = {name: frozenset(ids) for name, ids in flags.items()}
+        self._season_subscribers = {name: frozenset(ids) for name, ids in season_subscribers.items()}
+        self._roles = {name.lower(): frozenset(ids) for name, ids in roles.items()}
+        self._matrix = matrix
+
+    def present_since(self, since:date) -> frozenset[int]:
+        ''' return members having attended an event since a date (included)
+        '''
+        columns = self._matrix.event_dates >= np.datetime64(since, 'D')
+        return frozenset(self._matrix.member_ids[self._matrix.presences[:, columns].any(axis=1)].tolist())
+
+    def predicate(self, name:str, arg:Optional[str]=None) -> frozenset[int]:
+        ''' return members matching a predicate (see PREDICATES)
+        '''
+        match name, arg:
+            case ('tous', None):
+                return self._all
+            case ('cotisant', str()):
+                if arg not in self._season_subscribers:
+                    raise AjDbException(f"Saison inconnue: {arg}")
+                return self._season_subscribers[arg]
+            case (_, None) if name in self._flags:
+                return self._flags[name]
+            case ('present', str()) if arg.isdecimal():
+                return self.present_since(datetime.now().date() - timedelta(weeks=int(arg)))
+            case ('role', str()):
+                if arg.lower() not in self._roles:
+                    raise AjDbException(f"Rôle asso inconnu: {arg}")
+                return self._roles[arg.lower()]
+            case ('evenement', str()) if arg.isdecimal():
+                [columns] = np.nonzero(self._matrix.event_ids == int(arg))
+                if not len(columns):
+                    raise AjDbException(f"Évènement inconnu: {arg}")
+                return frozenset(self._matrix.member_ids[self._matrix.presences[:, columns[0]]].tolist())
+        raise AjDbException(f"Critère invalide: {name}{':' + arg if arg is not None else ''}\n"
+                            + _help())
+
+    def evaluate(self, expression:str) -> frozenset[int]:
+        ''' return members of a segment expression:
+            predicates (see PREDICATES) combined with 'et', 'ou', 'sauf', 'non' and parentheses
+        '''
+        tokens = _tokenize(expression)
+        if not tokens:
+            raise AjDbException("Segment vide\n" + _help())
+        position = 0
+
+        def peek() -> Optional[str]:
+            return tokens[position] if position < len(tokens) else None
+
+        def take() -> str:
+            nonlocal position
+            if position >= len(tokens):
+                raise AjDbException(f"Segment incomplet: {expression}")
+            position += 1
+            return tokens[position - 1]
+
+        def union() -> frozenset[int]:
+            result = intersection()
+            while peek() in (_OR, _EXCEPT):
+                operator = take()
+                operand = intersection()
+                result = result | operand if operator == _OR else result - operand
+            return result
+
+        def intersection() -> frozenset[int]:
+            result = complement()
+            while peek() == _AND:
+                take()
+                result = result & complement()
+            return result
+
+        def complement() -> frozenset[int]:
+            token = take()
+            if token == _NOT:
+                return self._all - complement()
+            if token == '(':
+                result = union()
+                if take() != ')':
+                    raise AjDbException(f"Parenthèse non fermée: {expression}")
+                return result
+            if token in (')', _OR, _EXCEPT, _AND):
+                raise AjDbException(f"'{token}' inattendu: {expression}")
+            name, _, arg = token.partition(':')
+            return self.predicate(name.lower(), arg.strip('"') if arg else None)
+
+        result = union()
+        if position < len(tokens):
+            raise AjDbException(f"'{tokens[position]}' inattendu: {expression}")
+        return result
+
+
+def _tokenize(expression:str) -> list[str]:
+    """ split a segment expression in parentheses, operators (lower cased) & predicates
+    """
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = _TOKENS.match(expression, position)
+        if match is None:
+            raise AjDbException(f"Guillemet non fermé: {expression}")
+        token = match.group(1) or match.group(2)
+        tokens.append(token.lower() if token.lower() in (_OR, _EXCEPT, _AND, _NOT) else token)
+        position = match.end()
+    return tokens
+
+
+def _help() -> str:
+    """ return the syntax of segment expressions
+    """
+    return (f"Critères: {', '.join(PREDICATES)} - combinés avec {_AND}, {_OR}, {_EXCEPT}, {_NOT} et des parenthèses.\n"
+            "Exemple: (cotisant ou present:52) et email")
+
+
+if __name__ == '__main__':
+    raise OtherException('This module is not meant to be executed directly.')
@@ -15,6 +15,7 @@ from .lookup import *
 from .role import *
 from .event import *
 from .finance import *
+from .stats import *
 
 
 if __name__ == '__main__':
@@ -17,6 +17,7 @@ from .season import Season
 from .role import AssoRole, MemberAssoRole
 from .membership import Membership
 from .event import Event, MemberEvent
+from .stats import MemberSeasonStat
 if TYPE_CHECKING:
     from .member_private import Credential, MemberEmail, MemberPhone, MemberAddress
 
@@ -58,6 +59,8 @@ class Member(BaseWithId, LogMixin):
     events: ap.AssociationProxy[list['Event']] = ap.association_proxy('event_member_associations','event',
                                                                        creator=lambda member_obj: MemberEvent(member=member_obj),)
 
+    season_stats: orm.Mapped[list['MemberSeasonStat']] = orm.relationship(back_populates='member', foreign_keys='MemberSeasonStat.member_id', lazy='selectin')
+
     is_subscriber:orm.Mapped[Optional[bool]] = orm.column_property(sa.exists(
         sa.select(1)
         .select_from(Membership.__table__.join(Season, Season.id == Membership.season_id))
@@ -81,31 +84,32 @@ class Member(BaseWithId, LogMixin):
         )
     ))
 
-    last_presence:orm.Mapped[Optional[datetime.date]] = orm.column_property(
-        sa.select(sa.func.max(Event.date))
-        .select_from(
-            Event.__table__.join(
-                MemberEvent,
-                MemberEvent.event_id == Event.id,
-            )
-        )
-        .where(
-            sa.and_(
-                MemberEvent.member_id == id,
-                MemberEvent.presence == True,             #pylint: disable=singleton-comparison
-            )
-        )
-        .scalar_subquery()
-    )
-
     current_asso_role = None  # Will be set later using a selectable mapping
 
+    def _season_stats(self, season_name = None) -> list['MemberSeasonStat']:
+        """ return attendance statistics of provided season. Current if empty
+        """
+        return [stat for stat in self.season_stats
+                if ((not season_name and stat.season.is_current_season)
+                     or stat.season.name == season_name)]
+
+    @property
+    def last_presence(self) -> Optional[datetime.date]:
+        """ return date of last event attended in person, None if never
+        """
+        return max((stat.last_presence for stat in self.season_stats if stat.last_presence), default=None)
+
     def season_presence_count(self, season_name = None):
         """ return number of related events in provided season. Current if empty
         """
-        return len([mbr_evt for mbr_evt in self.events
-                    if ((not season_name and mbr_evt.is_in_current_season)
-                         or mbr_evt.season.name == season_name)])
+        return sum(stat.presence_count for stat in self._season_stats(season_name))
+
+    def is_season_subscriber(self, season_name = None):
+        """ return whether member has subscribed for provided season. Current if empty
+        """
+        if not season_name:
+            return bool(self.is_subscriber)
+        return any(stat.is_subscriber for stat in self._season_stats(season_name))
 
     def __hash__(self):
         return hash(self.id)
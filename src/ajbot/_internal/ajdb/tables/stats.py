@@ -0,0 +1,56 @@
+''' Statistics db tables, derived from other tables
+'''
+from typing import Optional, TYPE_CHECKING
+
+import sqlalchemy as sa
+from sqlalchemy import orm
+
+from ajbot._internal.exceptions import AjDbException
+from ajbot._internal.config import FormatTypes
+from ajbot._internal.types import AjDate
+from .base import SaAjDate, BaseWithId
+if TYPE_CHECKING:
+    from .member import Member
+    from .season import Season
+
+
+class MemberSeasonStat(BaseWithId):
+    """ Attendance statistics of a member over a season
+        Derived from events & memberships, maintained on write (see AjDb), rows only exist if member
+        participated or subscribed during the season
+    """
+    __tablename__ = 'member_season_stats'
+    __table_args__ = (
+        sa.UniqueConstraint('member_id', 'season_id',
+                            comment='one statistic per member & season'),
+    )
+
+    member_id: orm.Mapped[int] = orm.mapped_column(sa.ForeignKey('members.id'), index=True, nullable=False)
+    member: orm.Mapped['Member'] = orm.relationship(back_populates='season_stats', foreign_keys=member_id, lazy='select')
+    season_id: orm.Mapped[int] = orm.mapped_column(sa.ForeignKey('seasons.id'), index=True, nullable=False)
+    season: orm.Mapped['Season'] = orm.relationship(foreign_keys=season_id, lazy='selectin')
+
+    presence_count: orm.Mapped[int] = orm.mapped_column(sa.Integer, nullable=False, default=0, comment='number of events of the season attended')
+    last_presence: orm.Mapped[Optional[AjDate]] = orm.mapped_column(SaAjDate, nullable=True, comment='date of last event of the season attended in person')
+    is_subscriber: orm.Mapped[bool] = orm.mapped_column(sa.Boolean, nullable=False, default=False, comment='member has subscribed for the season')
+
+    def __format__(self, format_spec):
+        """ override format
+        """
+        member_season = f"membre {self.member_id}, saison {self.season_id}"
+        stats = f"{self.presence_count} participation(s)" + (f", dernière le {self.last_presence}" if self.last_presence else '')
+        subscriber = 'cotisant(e)' if self.is_subscriber else ''
+        match format_spec:
+            case FormatTypes.RESTRICTED:
+                name_list = ['#####']
+
+            case FormatTypes.FULL:
+                name_list = [member_season, stats, subscriber]
+
+            case FormatTypes.DEBUG:
+                name_list = [self.id, member_season, stats, subscriber]
+
+            case _:
+                raise AjDbException(f"Le format {format_spec} n'est pas supporté")
+
+        return ' - '.join([f"{x}" for x in name_list if x])
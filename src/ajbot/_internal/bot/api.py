@@ -1,24 +1,79 @@
 """ Discord bot
 """
+import asyncio
+import time
 from typing import Optional
 
 import discord
 from discord import app_commands, Interaction
 
+from ajbot._internal import charts
 from ajbot._internal.config import AjConfig, AjInfo
 from ajbot._internal.ajdb import AjDb
-from ajbot._internal.bot import asso_mgmt, checks, event, member, season, responses
+from ajbot._internal.bot import asso_mgmt, checks, context, deadline, event, member, policy, scheduler, season, stats, responses
 from ajbot._internal.exceptions import OtherException
 
 
-async def _init_bot_env():
+_warm_up_timings:dict[str, Optional[float]] = {}
+_schema_upgraded = False
+
+async def _upgrade_schema():
+    """
+    create tables added by this version of the bot, once per run: tried again at next cache warm-up if db is unavailable
+    """
+    global _schema_upgraded     #pylint: disable=global-statement   #on purpose, upgrade is only done once
+    if _schema_upgraded:
+        return
+    try:
+        async with AjDb() as aj_db:
+            created = await aj_db.upgrade_schema()
+    except Exception as e:     #pylint: disable=broad-exception-caught   #bot shall start on cached data even if db is unavailable
+        print(f"Mise à jour du schéma impossible, nouvel essai au prochain préchargement: {e!r}")
+        return
+    _schema_upgraded = True
+    if created:
+        print(f"Tables créées: {', '.join(created)}")
+
+async def _init_bot_env(clear_cache:bool=True):
     """
     preload in config & cache some semi-permanent data from DB
+    clear_cache: if False, cached data (restored from snapshot) is served while being revalidated
     """
+    await _upgrade_schema()
     with AjConfig(save_on_exit=True) as aj_config:
-        async with AjDb(aj_config=aj_config) as aj_db:
-            await aj_db.init_cache()
+        async with AjDb(aj_config=aj_config, read_only=True) as aj_db:
+            timings = await aj_db.init_cache(clear=clear_cache)
+            # config role sets are built from cached asso roles, so once they are loaded
+            start = time.monotonic()
             await aj_config.udpate_roles(aj_db=aj_db)
+            timings['rôles discord (config)'] = time.monotonic() - start
+
+    _warm_up_timings.clear()
+    _warm_up_timings.update(timings)
+    print('Préchargement: ' + ', '.join(f"{k} {'-' if v is None else f'{v:.2f}s'}" for k, v in timings.items()))
+
+async def _rebuild_season_env():
+    """
+    rebuild attendance statistics (e.g. after season rollover) and reload cache accordingly
+    """
+    async with AjDb() as aj_db:
+        await aj_db.rebuild_member_season_stats()
+    await _init_bot_env()
+
+def _warm_up_report() -> dict[str, list[str]]:
+    """ return duration of last cache warm-up as table columns
+    """
+    return {'Cache': list(_warm_up_timings.keys()),
+            'Durée': ['non terminé' if v is None else f"{v:.2f}s" for v in _warm_up_timings.values()],
+           }
+
+class AjCommandTree(app_commands.CommandTree):
+    """ Command tree opening the interaction context before checks, so that checks & command share it
+    """
+    async def interaction_check(self, interaction: Interaction, /) -> bool:
+        context.enter(interaction)
+        return True
+
 
 class MyDiscordClient(discord.Client):
     """
@@ -43,13 +98,74 @@ class MyDiscordClient(discord.Client):
         # to store and work with them.
         # Note: When using commands.Bot instead of discord.Client, the bot will
         # maintain its own tree instead.
-        self.tree = app_commands.CommandTree(self)
+        self.tree = AjCommandTree(self)
         self._guild = guild
+        self.cache_restored = False
+        self._snapshot_task:Optional[asyncio.Task] = None
+        self._warm_up_task:Optional[asyncio.Task] = None
+
+    async def _save_cache_snapshot_periodically(self):
+        """ save db cache snapshot at configured period
+        """
+        while True:
+            with AjConfig() as aj_config:
+                period = aj_config.db_cache_snapshot_period_sec
+                snapshot_file = aj_config.db_cache_snapshot_file
+            await asyncio.sleep(period)
+            self._save_cache_snapshot(snapshot_file)
+
+    @staticmethod
+    def _save_cache_snapshot(snapshot_file):
+        """ save db cache snapshot, a failure only being reported
+        """
+        try:
+            AjDb.save_cache_snapshot(snapshot_file)
+        except OSError as e:
+            print(f"Impossible de sauvegarder le cache dans {snapshot_file}: {e}")
+
+    def warm_up_cache(self):
+        """ preload db cache in background, so that commands are handled meanwhile
+            cache restored from snapshot is kept and served while being refreshed
+        """
+        if self._warm_up_task is None or self._warm_up_task.done():
+            self._warm_up_task = asyncio.create_task(_init_bot_env(clear_cache=not self.cache_restored))
+
+    async def _check_roles_job(self):
+        """ background job: check discord roles of guild members, once guild is available
+        """
+        await self.wait_until_ready()
+        await asso_mgmt.check_roles_job(self.get_guild(self._guild.id))
+
+    async def close(self):
+        """ save db cache snapshot before closing, so that it is restored at next startup
+        """
+        scheduler.stop()
+        stats.stop_chart_renderer()
+        if self._snapshot_task is not None:
+            self._snapshot_task.cancel()
+        with AjConfig() as aj_config:
+            self._save_cache_snapshot(aj_config.db_cache_snapshot_file)
+        await super().close()
 
     # We synchronize the app commands to one single guild.
     # By doing so, we don't have to wait up to an hour until they are shown to the end-user.
     async def setup_hook(self):
         """This copies the global commands over to your guild."""
+        # persistent buttons, dispatched from their custom_id even after a restart
+        self.add_dynamic_items(member.EditMemberButton, event.EventButton)
+        # tables added by this version, before any command queries them
+        await _upgrade_schema()
+        # db cache of previous run, so that first commands are served from memory
+        with AjConfig() as aj_config:
+            self.cache_restored = AjDb.load_cache_snapshot(aj_config.db_cache_snapshot_file)
+        self._snapshot_task = asyncio.create_task(self._save_cache_snapshot_periodically())
+        # background jobs, scheduled as configured
+        scheduler.register('cache', lambda: _init_bot_env(clear_cache=False))
+        scheduler.register('roles', self._check_roles_job)
+        scheduler.register('saison', _rebuild_season_env)
+        scheduler.register('emargement', asso_mgmt.prerender_sign_sheet)
+        with AjConfig() as aj_config:
+            scheduler.start(aj_config.scheduler_jobs, aj_config.scheduler_state_file)
         self.tree.copy_global_to(guild=self._guild)
         await self.tree.sync(guild=self._guild)
         print("commands synced to guild")
@@ -76,7 +192,7 @@ class AjBot():
         @self.client.event
         async def on_ready():
             # preload in config & cache some semi-permanent data from DB
-            await _init_bot_env()
+            self.client.warm_up_cache()
 
             print(f"Logged in as {self.client.user} (ID: {self.client.user.id})")
             print('------')
@@ -91,6 +207,7 @@ class AjBot():
         @self.client.tree.command(name="version")
         @app_commands.check(checks.is_manager)
         @app_commands.checks.cooldown(1, 5)
+        @deadline.with_deadline
         async def cmd_version(interaction: Interaction):
             """ Affiche la version du bot
             """
@@ -102,11 +219,11 @@ class AjBot():
         @self.client.tree.command(name="maintenance")
         @app_commands.check(checks.is_owner)
         @app_commands.checks.cooldown(1, 5)
+        @deadline.with_deadline
         async def cmd_maintenance(interaction: Interaction):
             """ reset ajdb cache
             """
-            if not interaction.response.type:
-                await interaction.response.defer(ephemeral=True,)
+            await responses.defer(interaction, ephemeral=True)
 
             await _init_bot_env()
 
@@ -114,9 +231,75 @@ class AjBot():
                                                   content="👷‍♂️ C'est tout propre !",
                                                   ephemeral=True)
 
+        @self.client.tree.command(name="recalcul_presences")
+        @app_commands.check(checks.is_owner)
+        @app_commands.checks.cooldown(1, 60)
+        @deadline.with_deadline
+        async def cmd_rebuild_stats(interaction: Interaction):
+            """ recalcule les statistiques de présence à partir des évènements & cotisations
+            """
+            await responses.defer(interaction, ephemeral=True)
+
+            await _rebuild_season_env()
+
+            await responses.send_response_as_text(interaction=interaction,
+                                                  content="📊 Statistiques de présence recalculées !",
+                                                  ephemeral=True)
+
+        @self.client.tree.command(name="delais")
+        @app_commands.check(checks.is_owner)
+        @app_commands.checks.cooldown(1, 5)
+        @deadline.with_deadline
+        async def cmd_delays(interaction: Interaction):
+            """ Affiche les délais de réponse des commandes et l'occupation des commandes lourdes
+            """
+            await responses.send_response_as_text(interaction=interaction,
+                                                  content="⏱️ Délais de prise en compte depuis le démarrage (auto = différées automatiquement)",
+                                                  embeds=responses.build_table_embeds(deadline.report(), color=discord.Color.dark_grey()),
+                                                  ephemeral=True)
+            await responses.send_response_as_text(interaction=interaction,
+                                                  content="🏋️ Commandes lourdes (groupées = résultat partagé avec une demande identique en cours)",
+                                                  embeds=responses.build_table_embeds(policy.report(), color=discord.Color.dark_grey()),
+                                                  ephemeral=True)
+            await responses.send_response_as_text(interaction=interaction,
+                                                  content="🔥 Dernier préchargement du cache",
+                                                  embeds=responses.build_table_embeds(_warm_up_report(), color=discord.Color.dark_grey()),
+                                                  ephemeral=True)
+
+        @self.client.tree.command(name="taches")
+        @app_commands.check(checks.is_owner)
+        @app_commands.checks.cooldown(1, 5)
+        @app_commands.rename(job_name='tâche')
+        @app_commands.describe(job_name='la tâche à lancer maintenant (aucune = liste des tâches)')
+        @app_commands.autocomplete(job_name=scheduler.autocomplete)
+        @deadline.with_deadline
+        async def cmd_jobs(interaction: Interaction,
+                           job_name:Optional[str]=None):
+            """ Liste les tâches de fond, ou en lance une immédiatement
+            """
+            if job_name is None:
+                await responses.send_response_as_text(interaction=interaction,
+                                                      content="⏰ Tâches de fond (ignorées = déjà en cours)",
+                                                      embeds=responses.build_table_embeds(scheduler.report(), color=discord.Color.dark_grey()),
+                                                      ephemeral=True)
+                return
+
+            if job_name not in scheduler.jobs():
+                await responses.send_response_as_text(interaction=interaction,
+                                                      content=f"Tâche '{job_name}' inconnue.",
+                                                      ephemeral=True)
+                return
+
+            await responses.defer(interaction, ephemeral=True)
+            status = await scheduler.run(job_name)
+            await responses.send_response_as_text(interaction=interaction,
+                                                  content=f"⏰ Tâche '{job_name}': {status}",
+                                                  ephemeral=True)
+
         @self.client.tree.command(name="bonjour")
         @app_commands.check(checks.is_member)
         @app_commands.checks.cooldown(1, 5)
+        @deadline.with_deadline
         async def cmd_hello(interaction: Interaction):
             """C'est toujours bien d'être poli avec moi"""
             message_list=[f"Bonjour {interaction.user.mention} !",
@@ -137,6 +320,7 @@ class AjBot():
         @self.client.tree.command(name="infos")
         @app_commands.check(checks.is_member)
         @app_commands.checks.cooldown(1, 5)
+        @deadline.with_deadline(ephemeral=False)
         async def cmd_infos(interaction: Interaction):
             """Donne les infos pratiques sur l'association"""
             info_message  = """# __Quand ?__
@@ -180,6 +364,7 @@ A la **Maison de quartier de la Marinière**
         @app_commands.describe(int_member='numéro de membre de l\'asso')
         @app_commands.rename(str_member='nom')
         @app_commands.describe(str_member='prénom et/ou nom (complet, partiel ou approximatif)')
+        @deadline.with_deadline
         async def cmd_member(interaction: Interaction,
                              disc_member:Optional[discord.Member]=None,
                              int_member:Optional[int]=None,
@@ -194,6 +379,7 @@ A la **Maison de quartier de la Marinière**
         @self.client.tree.command(name="roles")
         @app_commands.check(checks.is_manager)
         @app_commands.checks.cooldown(1, 5)
+        @deadline.with_deadline
         async def cmd_roles(interaction: Interaction,):
             """ Affiche les membres qui n'ont pas le bon role
             """
@@ -204,22 +390,31 @@ A la **Maison de quartier de la Marinière**
         @self.client.tree.command(name="emails")
         @app_commands.check(checks.is_manager)
         @app_commands.checks.cooldown(1, 5)
-        @app_commands.rename(last_participation_delay='option')
-        @app_commands.choices(last_participation_delay=[app_commands.Choice(name='cotisants seuls', value=0),
-                                               app_commands.Choice(name=f'participants {delta_weeks} dernières semaines', value=delta_weeks),
-                                              ])
-        @app_commands.describe(last_participation_delay='Liste de diffusion')
+        @app_commands.rename(mailing_list='option', as_file='fichier')
+        @app_commands.choices(mailing_list=[app_commands.Choice(name='cotisants seuls', value='cotisant'),
+                                            app_commands.Choice(name=f'participants {delta_weeks} dernières semaines', value=f'cotisant ou present:{delta_weeks}'),
+                                           ])
+        @app_commands.describe(mailing_list='Liste de diffusion',
+                               segment='critères, ex: (cotisant ou present:52) et non role:bureau (remplace option)',
+                               as_file='envoie les membres du segment dans un fichier')
+        @deadline.with_deadline
         async def cmd_emails(interaction: Interaction,
-                             last_participation_delay:app_commands.Choice[int]):
-            """ Affiche la liste de diffusion
+                             mailing_list:Optional[app_commands.Choice[str]]=None,
+                             segment:Optional[str]=None,
+                             as_file:bool=False):
+            """ Affiche la liste de diffusion, ou les membres d'un segment
             """
-            await asso_mgmt.email_display(last_participation_delay_weeks=last_participation_delay.value,
-                                          last_participation_delay_text=last_participation_delay.name,
-                                          interaction=interaction)
+            if segment is None and mailing_list is None:
+                mailing_list = app_commands.Choice(name='cotisants seuls', value='cotisant')
+            await asso_mgmt.email_display(interaction=interaction,
+                                          segment=segment if segment is not None else mailing_list.value,
+                                          segment_text=mailing_list.name if segment is None else None,
+                                          as_file=as_file)
 
         @self.client.tree.command(name="feuille_presence")
         @app_commands.check(checks.is_manager)
         @app_commands.checks.cooldown(1, 5)
+        @deadline.with_deadline
         async def cmd_presence_sheet(interaction: Interaction):
             """ Crée la feuille de présence
             """
@@ -239,6 +434,7 @@ A la **Maison de quartier de la Marinière**
         @app_commands.describe(season_name='la saison à afficher (aucune = saison en cours)')
         @app_commands.autocomplete(season_name=checks.AutocompleteFactory(method="query_seasons",
                                                                           attr_name='name').ac)
+        @deadline.with_deadline
         async def cmd_events(interaction: Interaction,
                              event_str:Optional[str]=None,
                              season_name:Optional[str]=None,
@@ -256,6 +452,7 @@ A la **Maison de quartier de la Marinière**
         @app_commands.describe(season_name='la saison à afficher (aucune = saison en cours)')
         @app_commands.autocomplete(season_name=checks.AutocompleteFactory(method="query_seasons",
                                                                           attr_name='name').ac)
+        @deadline.with_deadline
         async def cmd_seasons(interaction: Interaction,
                               season_name:Optional[str]=None):
             """ Affiche la liste des présences & cotisants d'une saison donnée
@@ -263,6 +460,43 @@ A la **Maison de quartier de la Marinière**
             await season.display(interaction=interaction,
                                  season_name=season_name)
 
+        @self.client.tree.command(name="stats")
+        @app_commands.check(checks.is_manager)
+        @app_commands.checks.cooldown(1, 5)
+        @app_commands.rename(last_events='derniers', min_presences='minimum')
+        @app_commands.describe(last_events="nombre d'évènements récents pris en compte pour les membres actifs",
+                               min_presences='nombre minimum de présences à ces évènements')
+        @deadline.with_deadline
+        async def cmd_stats(interaction: Interaction,
+                            last_events:app_commands.Range[int, 1]=10,
+                            min_presences:app_commands.Range[int, 1]=3):
+            """ Affiche les statistiques de présence: par saison, membres actifs & plus longues séries
+            """
+            await stats.display(interaction=interaction,
+                                last_events=last_events,
+                                min_presences=min_presences)
+
+        @self.client.tree.command(name="graphique")
+        @app_commands.check(checks.is_manager)
+        @app_commands.checks.cooldown(1, 5)
+        @app_commands.rename(chart_type='type', season_name='saison')
+        @app_commands.choices(chart_type=[app_commands.Choice(name='présences par évènement', value=charts.PRESENCES),
+                                          app_commands.Choice(name='cotisants / visiteurs par saison', value=charts.SUBSCRIBERS),
+                                         ])
+        @app_commands.describe(chart_type='le graphique à afficher',
+                               season_name='la saison des présences par évènement (aucune = dernière saison)')
+        @app_commands.autocomplete(season_name=checks.AutocompleteFactory(method="query_seasons",
+                                                                          attr_name='name').ac)
+        @deadline.with_deadline
+        async def cmd_chart(interaction: Interaction,
+                            chart_type:app_commands.Choice[str],
+                            season_name:Optional[str]=None):
+            """ Affiche un graphique de présence
+            """
+            await stats.chart_display(interaction=interaction,
+                                      chart_type=chart_type.value,
+                                      season_name=season_name)
+
 
         # ========================================================
         # List of context menu commands for the bot
@@ -270,6 +504,7 @@ A la **Maison de quartier de la Marinière**
 
         @self.client.tree.context_menu(name='Info membre')
         @app_commands.check(checks.is_member)
+        @deadline.with_deadline
         async def ctxt_member(interaction: Interaction, discord_member: discord.Member):
             await member.display(interaction=interaction,
                                  disc_member=discord_member,)
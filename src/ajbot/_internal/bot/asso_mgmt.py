@@ -1,25 +1,59 @@
 """ Function for asso management outputs (Views, buttons, message, ...)
 """
 from datetime import datetime, timedelta
-import tempfile
+from typing import Optional
+import io
 
-from discord import Interaction, File as Dfile
+from discord import Interaction, Guild, File as Dfile
 
 from ajbot._internal.config import AjConfig, FormatTypes, AJ_SIGNSHEET_FILENAME
 from ajbot._internal.ajdb import AjDb, tables as db_t
-from ajbot._internal.bot import responses
+from ajbot._internal.bot import file_cache, responses
+from ajbot._internal.bot.policy import ExecutionPolicy
 from ajbot._internal.exceptions import OtherException
 
 
+_roles_policy = ExecutionPolicy('roles')
+_emails_policy = ExecutionPolicy('emails')
+_sign_sheet_policy = ExecutionPolicy('feuille_presence')
+
+_SIGN_SHEET_VERSION = 1     # to be increased when sign sheet layout changes, so that cached ones are not used anymore
+_sign_sheets:Optional[file_cache.FileCache] = None
+
 
 async def role_display(interaction: Interaction):
     """ Affiche les infos des roles
     """
-    if not interaction.response.type:
-        await interaction.response.defer(ephemeral=True,)
+    await responses.defer(interaction, ephemeral=True)
+
+    summary, reply = await _roles_policy.run(key=interaction.guild.id,
+                                             compute=lambda: _check_roles(interaction.guild))
+
+    await responses.send_response_as_view(interaction=interaction, title="Rôles", summary=summary, content=reply, ephemeral=True)
+
+
+async def check_roles_job(guild:Guild):
+    """ background job: post members not having the right discord roles in the report channel, so that managers see them
+        Report is only printed if no report channel is configured (or found)
+    """
+    summary, reply = await _roles_policy.run(key=guild.id, compute=lambda: _check_roles(guild))
+    report = f"**Rôles**: {summary}" + (f"\n{reply}" if reply else '')
 
     with AjConfig() as aj_config:
-        async with AjDb(aj_config=aj_config) as aj_db:
+        channel_id = aj_config.discord_report_channel
+    channel = guild.get_channel(channel_id) if channel_id else None
+    if channel is None:
+        print(report + ("" if not channel_id else f"\n(salon {channel_id} introuvable)"))
+        return
+    for chunk in responses.split_text(report):
+        await channel.send(content=chunk)
+
+
+async def _check_roles(guild:Guild) -> tuple[str, str]:
+    """ return summary & detail of members not having the right discord roles
+    """
+    with AjConfig() as aj_config:
+        async with AjDb(aj_config=aj_config, read_only=True) as aj_db:
 
             discord_role_mismatches = {}
             aj_members:list[db_t.Member] = await aj_db.query_table_content(db_t.Member, refresh_cache=True)
@@ -27,7 +61,7 @@ async def role_display(interaction: Interaction):
             default_asso_role_id = aj_config.asso_member_default
             default_discord_role_ids = [dr.id for dr in aj_discord_roles if default_asso_role_id in [ar.id for ar in dr.asso_roles]]
 
-            for discord_member in interaction.guild.members:
+            for discord_member in guild.members:
                 actual_role_ids = [r.id for r in discord_member.roles if r.name != "@everyone"]
 
                 matched_members = [d for d in aj_members if d.discord == discord_member.name]
@@ -52,10 +86,10 @@ async def role_display(interaction: Interaction):
                 expected_role_ids = set(expected_role_ids)
                 actual_role_ids = set(actual_role_ids)
                 if expected_role_ids != actual_role_ids:
-                    expected_role_key = '; '.join(f"{interaction.guild.get_role(id) or id}" for id in expected_role_ids)
+                    expected_role_key = '; '.join(f"{guild.get_role(id) or id}" for id in expected_role_ids)
                     discord_role_mismatches.setdefault(expected_role_key, [])
                     discord_role_mismatches[expected_role_key].append(  f"{member if member else discord_member.name} - "
-                                                                        + '; '.join(f"{interaction.guild.get_role(id) or id}" for id in actual_role_ids))
+                                                                        + '; '.join(f"{guild.get_role(id) or id}" for id in actual_role_ids))
 
             if discord_role_mismatches:
                 summary = "Des roles ne sont pas correctements attribués :"
@@ -66,42 +100,97 @@ async def role_display(interaction: Interaction):
                 summary = "Parfait ! Tout le monde a le bon rôle !"
                 reply = None
 
-    await responses.send_response_as_view(interaction=interaction, title="Rôles", summary=summary, content=reply, ephemeral=True)
+    return summary, reply
 
 
-async def email_display(last_participation_delay_weeks:int,
-                        last_participation_delay_text:str,
-                        interaction: Interaction):
-    """ Envoie la liste d'emails
+async def email_display(interaction: Interaction,
+                        segment:str,
+                        segment_text:Optional[str]=None,
+                        as_file:bool=False):
+    """ Envoie la liste d'emails des membres d'un segment, ou le fichier des membres du segment
     """
-    if not interaction.response.type:
-        await interaction.response.defer(ephemeral=True,)
+    await responses.defer(interaction, ephemeral=True)
 
-    async with AjDb() as aj_db:
-        emails = await aj_db.query_member_emails(last_participation_duration=timedelta(weeks=last_participation_delay_weeks))
-        summary = last_participation_delay_text + f" - {len(emails)} email(s)"
-        reply = ';'.join(f"{email:{FormatTypes.DEBUG}}" for email in emails)
+    members = await _emails_policy.run(key=segment,
+                                       compute=lambda: _query_segment(segment))
+    emails = [f"{m.email_principal.email:{FormatTypes.DEBUG}}" for m in members if m.email_principal]
+    summary = (segment_text or segment) + f" - {len(members)} membre(s), {len(emails)} email(s)"
 
-    await responses.send_response_as_view(interaction=interaction, title="Emails", summary=summary, content=reply, ephemeral=True)
+    if as_file:
+        await responses.send_response_as_text(interaction=interaction,
+                                              content=summary,
+                                              file=Dfile(fp=io.BytesIO(_segment_csv(members).encode('utf-8-sig')), filename="segment.csv"),
+                                              ephemeral=True)
+        return
+
+    await responses.send_response_as_view(interaction=interaction, title="Emails", summary=summary, content=';'.join(emails), ephemeral=True,
+                                          attachment_name="emails.csv")
+
+
+async def _query_segment(segment:str) -> list[db_t.Member]:
+    """ return members of a segment, from cached members (member & event edits drop them, so mailing lists are up to date)
+    """
+    async with AjDb(read_only=True) as aj_db:
+        return await aj_db.query_segment_members(segment)
+
+
+def _segment_csv(members:list[db_t.Member]) -> str:
+    """ return members as csv, one row per member
+    """
+    rows = [['ID', 'Nom', 'Email', 'Téléphone']]
+    rows += [[f"{m.id:{FormatTypes.FULL}}",
+              f"{m.credential:{FormatTypes.FULL}}" if m.credential else '',
+              f"{m.email_principal.email:{FormatTypes.FULL}}" if m.email_principal else '',
+              f"{m.phone_principal.phone:{FormatTypes.FULL}}" if m.phone_principal else '',
+             ] for m in members]
+    return '\n'.join(';'.join(row) for row in rows)
 
 
 async def sign_sheet_display(interaction: Interaction):
     """ Crée et envoie la feuille de présence
     """
-    if not interaction.response.type:
-        await interaction.response.defer(ephemeral=True,)
-
-    async with AjDb() as aj_db:
-        # Store it in a spooled file (max 1MB in memory, then on disk)
-        with tempfile.SpooledTemporaryFile(max_size=1024*1024, mode='w+b') as temp_file:
-            await aj_db.query_member_sign_sheet(temp_file)
-
-            # Set stream position back to file start to pass it to discord
-            temp_file.seek(0)
-            await responses.send_response_as_text(interaction=interaction,
-                                                  content="Feuille de présence:",
-                                                  file=Dfile(fp=temp_file, filename=AJ_SIGNSHEET_FILENAME),
-                                                  ephemeral=True)
+    await responses.defer(interaction, ephemeral=True)
+
+    sign_sheet = await _sign_sheet_policy.run(key=None, compute=_create_sign_sheet)
+
+    await responses.send_response_as_text(interaction=interaction,
+                                          content="Feuille de présence:",
+                                          file=Dfile(fp=io.BytesIO(sign_sheet), filename=AJ_SIGNSHEET_FILENAME),
+                                          ephemeral=True)
+
+
+async def prerender_sign_sheet():
+    """ background job: generate sign sheet ahead of event, so that it is served from cache
+    """
+    await _sign_sheet_policy.run(key=None, compute=_create_sign_sheet)
+
+
+def _sign_sheet_cache(aj_config:AjConfig) -> file_cache.FileCache:
+    """ return cache of generated sign sheets, created on first use
+    """
+    global _sign_sheets     #pylint: disable=global-statement   #on purpose, cache is created once config is available
+    if _sign_sheets is None:
+        _sign_sheets = file_cache.FileCache(aj_config.sign_sheet_cache_dir, max_bytes=aj_config.sign_sheet_cache_max_mb * 1024 * 1024, suffix='.pdf')
+    return _sign_sheets
+
+
+async def _create_sign_sheet() -> bytes:
+    """ return the content of the sign sheet PDF
+        PDF is kept in memory so that it can be sent to all requests sharing it,
+        and cached per digest of its rows so that it is only generated again if they change
+    """
+    with AjConfig() as aj_config:
+        async with AjDb(aj_config=aj_config, read_only=True) as aj_db:
+            rows = await aj_db.query_member_sign_sheet_rows()
+            key = file_cache.digest({'version': _SIGN_SHEET_VERSION, 'free_presence': aj_config.asso_free_presence, 'rows': rows})
+            sign_sheet = _sign_sheet_cache(aj_config).get(key)
+            if sign_sheet is None:
+                with io.BytesIO() as sign_sheet_file:
+                    await aj_db.query_member_sign_sheet(sign_sheet_file, rows=rows)
+                    sign_sheet = sign_sheet_file.getvalue()
+                _sign_sheet_cache(aj_config).put(key, sign_sheet)
+            return sign_sheet
+
 
 if __name__ == '__main__':
     raise OtherException('This module is not meant to be executed directly.')
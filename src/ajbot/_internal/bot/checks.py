@@ -3,9 +3,8 @@
 
 from discord import Interaction, app_commands
 
-from ajbot._internal.config import AjConfig
 from ajbot._internal.ajdb import AjDb
-from ajbot._internal.bot import params
+from ajbot._internal.bot import context, params
 from ajbot._internal.exceptions import OtherException
 
 
@@ -31,7 +30,7 @@ class AutocompleteFactory():
                 ) -> list[app_commands.Choice[str]]:
         """ AutoComplete function
         """
-        async with AjDb() as aj_db:
+        async with AjDb(read_only=True) as aj_db:
             db_content = await getattr(aj_db, self._method)(keep_detached=True)
             db_content.sort(reverse=True)
             values = [str(row) if not self._attr else str(getattr(row, self._attr)) for row in db_content]
@@ -46,19 +45,19 @@ class AutocompleteFactory():
 # ========================================================
 def is_owner(interaction: Interaction) -> bool:
     """A check which only allows the bot owner to use the command."""
-    with AjConfig() as aj_config:
+    with context.aj_config() as aj_config:
         owner_roles = aj_config.discord_owners
     return any(role.id in owner_roles for role in interaction.user.roles)
 
 def is_member(interaction: Interaction) -> bool:
     """A check which only allows members to use the command."""
-    with AjConfig() as aj_config:
+    with context.aj_config() as aj_config:
         member_roles = aj_config.discord_members
     return any(role.id in member_roles for role in interaction.user.roles)
 
 def is_manager(interaction: Interaction) -> bool:
     """A check which only allows managers to use the command."""
-    with AjConfig() as aj_config:
+    with context.aj_config() as aj_config:
         manager_roles = aj_config.discord_managers
     return any(role.id in manager_roles for role in interaction.user.roles)
 
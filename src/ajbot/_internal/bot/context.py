@@ -0,0 +1,121 @@
+""" Per interaction unit of work: config snapshot & db session shared by all nested calls of an interaction
+"""
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from discord import Interaction
+
+from ajbot._internal.config import AjConfig
+from ajbot._internal.ajdb import AjDb
+from ajbot._internal.exceptions import OtherException
+
+
+class InteractionContext():
+    """ Unit of work of an interaction, created lazily:
+        - one config snapshot
+        - one db session, read only unless a write session is requested first.
+          A write session resolves the modifier identity (interaction user) once.
+
+        Session is only shared once context is managed, i.e. when a handler wrapper takes care
+        of closing it when the interaction completes (see deadline.with_deadline)
+    """
+    def __init__(self, interaction: Interaction):
+        self.interaction_id = interaction.id
+        self.modifier_discord = interaction.user.name
+        self.managed = False
+        self._aj_config:Optional[AjConfig] = None
+        self._aj_db:Optional[AjDb] = None
+        self._read_only = True
+
+    @property
+    def aj_config(self) -> AjConfig:
+        """ config snapshot, loaded on first use
+        """
+        if self._aj_config is None:
+            self._aj_config = AjConfig().open()
+        return self._aj_config
+
+    @property
+    def stale(self) -> bool:
+        """ True if data served to the interaction may be stale, because db is (or was) unavailable
+        """
+        return AjDb.db_unavailable() or (self._aj_db is not None and self._aj_db.stale)
+
+    async def aj_db(self, read_only:bool=True) -> AjDb:
+        """ db session of the interaction, opened on first use
+            A write session can serve reads, but a read only session cannot be upgraded: a write session
+            requested after a read only one is a programming error.
+        """
+        if self._aj_db is None:
+            self._read_only = read_only
+            self._aj_db = AjDb(aj_config=self.aj_config,
+                               modifier_discord=None if read_only else self.modifier_discord,
+                               read_only=read_only)
+            await self._aj_db.__aenter__()      #pylint: disable=unnecessary-dunder-call   #session lifetime is the interaction one
+        elif self._read_only and not read_only:
+            raise OtherException("Une session en écriture a été demandée après une session en lecture seule.")
+        return self._aj_db
+
+    async def close(self, exc_type=None, exc_value=None, traceback=None):
+        """ close db session (committing it if not read only) & config snapshot
+            Context is no more managed afterwards, so any later use gets standalone sessions
+        """
+        self.managed = False
+        aj_db, self._aj_db = self._aj_db, None
+        try:
+            if aj_db is not None:
+                await aj_db.__aexit__(exc_type, exc_value, traceback)
+        finally:
+            if self._aj_config is not None:
+                self._aj_config.close()
+                self._aj_config = None
+
+
+_current:ContextVar[Optional[InteractionContext]] = ContextVar('ajbot_interaction_context', default=None)
+
+
+def enter(interaction: Interaction) -> InteractionContext:
+    """ return context of the interaction, creating it if needed
+    """
+    context = _current.get()
+    if context is None or context.interaction_id != interaction.id:
+        context = InteractionContext(interaction)
+        _current.set(context)
+    return context
+
+
+def current() -> Optional[InteractionContext]:
+    """ return context of the interaction being handled, None outside any interaction
+    """
+    return _current.get()
+
+
+@contextmanager
+def aj_config():
+    """ config of current interaction, or a freshly loaded one outside any interaction
+    """
+    context = _current.get()
+    if context is not None:
+        yield context.aj_config
+    else:
+        with AjConfig() as config:
+            yield config
+
+
+@asynccontextmanager
+async def aj_db(read_only:bool=True):
+    """ db session of current interaction, or a standalone one if no managed interaction context is active.
+        write sessions use interaction user as modifier
+    """
+    context = _current.get()
+    if context is not None and context.managed:
+        yield await context.aj_db(read_only=read_only)
+    else:
+        async with AjDb(modifier_discord=context.modifier_discord if (context and not read_only) else None,
+                        read_only=read_only) as db:
+            yield db
+
+
+if __name__ == "__main__":
+    raise OtherException('This module is not meant to be executed directly.')
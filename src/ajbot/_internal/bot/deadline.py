@@ -0,0 +1,109 @@
+""" Deadline aware interaction handlers: automatic deferral & acknowledgement delay statistics
+"""
+import asyncio
+import functools
+import sys
+from dataclasses import dataclass
+
+import discord
+from discord import Interaction
+
+from ajbot._internal.bot import context, params, responses
+from ajbot._internal.exceptions import OtherException
+
+
+@dataclass
+class HandlerStats():
+    """ acknowledgement statistics of an interaction handler
+    """
+    calls: int = 0
+    auto_deferred: int = 0
+    total_ack_delay: float = 0.
+    max_ack_delay: float = 0.
+
+    @property
+    def mean_ack_delay(self) -> float:
+        """ mean delay before acknowledgement, in seconds
+        """
+        return self.total_ack_delay / self.calls if self.calls else 0.
+
+    def record(self, ack_delay:float, auto_deferred:bool):
+        """ add one handled interaction
+        """
+        self.calls += 1
+        self.auto_deferred += int(auto_deferred)
+        self.total_ack_delay += ack_delay
+        self.max_ack_delay = max(self.max_ack_delay, ack_delay)
+
+
+_stats:dict[str, HandlerStats] = {}
+
+
+def stats() -> dict[str, HandlerStats]:
+    """ return acknowledgement statistics per handler name
+    """
+    return _stats
+
+
+def record(name:str, ack_delay:float, auto_deferred:bool=False):
+    """ record acknowledgement delay of an interaction handled by handler 'name'
+    """
+    _stats.setdefault(name, HandlerStats()).record(ack_delay=ack_delay, auto_deferred=auto_deferred)
+
+
+def report() -> dict[str, list[str]]:
+    """ return acknowledgement statistics as table columns, slowest handlers first
+    """
+    rows = sorted(_stats.items(), key=lambda kv: kv[1].max_ack_delay, reverse=True)
+    return {'Commande': [name for name, _ in rows],
+            'Appels (auto)': [f"{s.calls} ({s.auto_deferred})" for _, s in rows],
+            f'Délai moy. / max (limite {params.RESPONSE_DEADLINE_SEC}s)': [f"{s.mean_ack_delay:.2f}s / {s.max_ack_delay:.2f}s" for _, s in rows],
+           }
+
+
+async def _defer_on_deadline(interaction: Interaction, budget:float, ephemeral:bool):
+    """ defer the interaction if not yet acknowledged once budget is elapsed since its creation
+    """
+    await asyncio.sleep(max(0., budget - responses.interaction_age(interaction)))
+    await responses.defer(interaction, ephemeral=ephemeral, auto=True)
+
+
+def with_deadline(func=None, *, ephemeral:bool=True):
+    """ decorator for interaction handlers (command, context menu, item or modal callbacks).
+        The interaction is automatically deferred if the handler has not acknowledged it within the
+        configured budget, later messages then being sent as followups (see responses),
+        and the delay before acknowledgement is recorded per handler.
+        The handler also manages the interaction context (see context), closing it when done.
+        ephemeral: shall match the handler response, as a deferred response keeps the visibility it is deferred with
+                   (e.g. with_deadline(ephemeral=False) for a public response)
+    """
+    if func is None:
+        return lambda f: with_deadline(f, ephemeral=ephemeral)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        interaction = next(arg for arg in [*args, *kwargs.values()] if isinstance(arg, discord.Interaction))
+        name = interaction.command.qualified_name if interaction.command else func.__qualname__
+
+        interaction_context = context.enter(interaction)
+        owner = not interaction_context.managed
+        interaction_context.managed = True
+
+        budget = interaction_context.aj_config.discord_defer_budget_sec or params.DEFAULT_DEFER_BUDGET_SEC
+
+        timer = asyncio.create_task(_defer_on_deadline(interaction, budget, ephemeral))
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            timer.cancel()
+            if owner:
+                await interaction_context.close(*sys.exc_info())
+            record(name,
+                   ack_delay=interaction.extras.get(params.EXTRA_ACK_DELAY, responses.interaction_age(interaction)),
+                   auto_deferred=interaction.extras.get(params.EXTRA_AUTO_DEFERRED, False))
+
+    return wrapper
+
+
+if __name__ == "__main__":
+    raise OtherException('This module is not meant to be executed directly.')
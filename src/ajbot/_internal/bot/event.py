@@ -1,6 +1,6 @@
 """ Functions event outputs (Views, buttons, message, ...)
 """
-from contextlib import nullcontext
+import functools
 from datetime import datetime, date
 import dateutil.parser as date_parser
 
@@ -8,8 +8,8 @@ import discord
 from discord import Interaction, ui as dui
 
 from ajbot._internal.config import FormatTypes
-from ajbot._internal.ajdb import AjDb
-from ajbot._internal.bot import checks, params, responses
+from ajbot._internal.bot import checks, context, deadline, params, responses
+from ajbot._internal.bot.pagination import Page, PaginatedView
 from ajbot._internal.exceptions import OtherException
 
 
@@ -18,19 +18,18 @@ from ajbot._internal.exceptions import OtherException
 async def display(interaction: Interaction,
                   season_name:str=None,
                   event_str:str=None,
-                  aj_db_in:AjDb=None,):
+                  ):
     """ Affiche les infos des évènements
     """
     input_event = [x for x in [season_name, event_str] if x is not None]
 
-    async with AjDb() if not aj_db_in else nullcontext(aj_db_in) as aj_db:
+    async with context.aj_db() as aj_db:
         if len(input_event) == 0:
-            eventmodal = await EditEventView.create(aj_db=aj_db)
-            await interaction.response.send_modal(eventmodal)   # ! Cannot send defer before a modal. Hope creating this doesn't last more than 3sec
+            eventmodal = await EditEventView.create()
+            await responses.send_modal(interaction, eventmodal)
             return
 
-        if not interaction.response.type:
-            await interaction.response.defer(ephemeral=True,)
+        await responses.defer(interaction, ephemeral=True)
 
         if len(input_event) > 1:
             input_types="un (et un seul) élément parmi:\r\n* une saison\r\n* un évènement"
@@ -40,17 +39,22 @@ async def display(interaction: Interaction,
                                                   ephemeral=True)
             return
 
-        if event_str:
-            events = await aj_db.query_events(event_str=event_str, lazyload=False, refresh_cache=True)
-        else:
-            events = await aj_db.query_events_per_season(season_name=season_name, lazyload=False)
+        if season_name:
+            _, _, nb_events = await aj_db.query_season_headcount(season_name)
+            view = await PaginatedView.create(fetch_page=functools.partial(_fetch_season_events_page, season_name=season_name),
+                                              title=f"Saison {season_name}",
+                                              summary=f"{nb_events} évènement(s) trouvé(s) :")
+            await responses.send_response_as_view(interaction=interaction, container=view.container, ephemeral=True)
+            return
+
+        events = await aj_db.query_events(event_str=event_str, lazyload=False, refresh_cache=True)
 
         if events:
             format_style = FormatTypes.FULL if checks.is_manager(interaction) else FormatTypes.RESTRICTED
             if len(events) == 1:
                 [event] = events
 
-                view = dui.LayoutView()
+                view = responses.StatelessView()
                 container = dui.Container()
                 view.add_item(container)
 
@@ -58,59 +62,81 @@ async def display(interaction: Interaction,
                 participants.sort(key=lambda x:x.credential)
                 message1 = f"# {event:{format_style}}"
                 message2 = f"## {len(participants)} participant" + ('' if not participants else (('s' if len(participants) > 1 else '') + " :"))
-                edit_event_modal = await EditEventView.create(aj_db=aj_db, db_event=event)
-                container.add_item(dui.Section(dui.TextDisplay(message1), accessory=EditEventButton(modal=edit_event_modal,
-                                                                                                    disabled = not checks.is_manager(interaction))))
-                container.add_item(dui.Section(dui.TextDisplay(message2), accessory=DeleteEventButton(event=event,
-                                                                                                    disabled = True or not checks.is_manager(interaction))))
+                container.add_item(dui.Section(dui.TextDisplay(message1), accessory=EventButton(event_id=event.id,
+                                                                                                action='edit',
+                                                                                                disabled = not checks.is_manager(interaction))))
+                container.add_item(dui.Section(dui.TextDisplay(message2), accessory=EventButton(event_id=event.id,
+                                                                                                action='delete',
+                                                                                                disabled = True or not checks.is_manager(interaction))))
                 if participants:
                     container.add_item(dui.TextDisplay('>>> ' + '\n'.join(f"{m:{format_style}}" for m in participants)))
                 await responses.send_response_as_view(interaction=interaction, container=container, ephemeral=True)
             else:
-                embed = discord.Embed(color=discord.Color.blue())
-                embed.add_field(name = 'date', inline=True,
-                                value = '\n'.join(str(e.date) for e in events)
-                                )
-                embed.add_field(name = 'Nom', inline=True,
-                                value = '\n'.join(e.name if e.name else '-' for e in events)
-                                )
-                embed.add_field(name = 'Présence', inline=True,
-                                value = '\n'.join(str(len(e.members)) for e in events)
-                                )
-
-                await responses.send_response_as_text(interaction, content=f"{len(events)} évènement(s) trouvé(s) :", embed=embed, ephemeral=True)
+                embeds = responses.build_table_embeds({'date': [str(e.date) for e in events],
+                                                       'Nom': [e.name if e.name else '-' for e in events],
+                                                       'Présence': [str(len(e.members)) for e in events],
+                                                      },
+                                                      color=discord.Color.blue())
+
+                await responses.send_response_as_text(interaction, content=f"{len(events)} évènement(s) trouvé(s) :", embeds=embeds, ephemeral=True)
         else:
             await responses.send_response_as_text(interaction=interaction,
                                                 content="Je n'ai trouvé aucun évènement.",
                                                 ephemeral=True)
 
 
+async def _fetch_season_events_page(after, before, season_name:str) -> Page:
+    """ fetch one page of the events of a season
+    """
+    async with context.aj_db() as aj_db:
+        events, has_more = await aj_db.query_events_page(season_name=season_name,
+                                                         after=after,
+                                                         before=before,
+                                                         limit=params.PAGE_SIZE)
+        return Page.from_keyset(lines=[f"{e.date} - {e.name if e.name else '-'} - **{len(e.member_event_associations)}** présence(s)" for e in events],
+                                keys=[e.date for e in events],
+                                has_more=has_more,
+                                after=after,
+                                before=before)
+
+
 # Buttons
 # ========================================================
 
-class EditEventButton(dui.Button):
-    """ Class that creates a edit button
+class EventButton(dui.DynamicItem[dui.Button], template=r'ajbot:event:(?P<event_id>[0-9]+):(?P<action>edit|delete)'):
+    """ Class that creates a persistent edit / delete button
+        Button only carries event id & action in its custom_id, modal is built when clicked
     """
-    def __init__(self, modal, disabled):
-        self._modal = modal
-        super().__init__(style=discord.ButtonStyle.primary,
-                         label='Editer',
-                         disabled = disabled)
+    def __init__(self, event_id:int, action:str, disabled=False):
+        self.event_id = int(event_id)
+        self.action = action
+        super().__init__(dui.Button(style=discord.ButtonStyle.primary if action == 'edit' else discord.ButtonStyle.red,
+                                    label='Editer' if action == 'edit' else 'Supprimer',
+                                    disabled=disabled,
+                                    custom_id=f"ajbot:event:{self.event_id}:{action}"))
 
-    async def callback(self, interaction: discord.Interaction):
-        await interaction.response.send_modal(self._modal)
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: dui.Button, match, /):  #pylint: disable=arguments-differ   #positional only signature from discord.py
+        return cls(event_id=int(match['event_id']), action=match['action'])
 
-class DeleteEventButton(dui.Button):
-    """ Class that creates a edit button
-    """
-    def __init__(self, event, disabled):
-        self._event = event
-        super().__init__(style=discord.ButtonStyle.red,
-                         label='Supprimer',
-                         disabled = disabled)
+    @deadline.with_deadline
+    async def callback(self, interaction: discord.Interaction):    #pylint: disable=arguments-differ   #No sure why this warning is raised
+        if not checks.is_manager(interaction):
+            await responses.send_response_as_text(interaction=interaction, content="Tu n'as pas le droit de modifier cet évènement.", ephemeral=True)
+            return
+
+        if self.action == 'delete':
+            await responses.send_response_as_text(interaction=interaction, content="Pas encore disponible", ephemeral=True)
+            return
+
+        async with context.aj_db() as aj_db:
+            event = await aj_db.query_event(self.event_id)
+            if not event:
+                await responses.send_response_as_text(interaction=interaction, content="Cet évènement n'existe plus.", ephemeral=True)
+                return
+            modal = await EditEventView.create(db_event=event)
 
-    async def callback(self, interaction: discord.Interaction):
-        await responses.send_response_as_text(interaction=interaction, content="Pas encore disponible", ephemeral=True)
+        await responses.send_modal(interaction, modal)
 
 
 # Modals
@@ -128,7 +154,7 @@ class EditEventView(dui.Modal, title='Evènement'):
         super().__init__()
 
     @classmethod
-    async def create(cls, aj_db:AjDb, db_event=None):
+    async def create(cls, db_event=None):
         """ awaitable class factory
         """
         self = cls()
@@ -138,9 +164,8 @@ class EditEventView(dui.Modal, title='Evènement'):
         if db_event:
             self._db_id = db_event.id
 
-            present_members = await aj_db.query_members_per_event_presence(db_event.id)
-            if present_members:
-                present_members.sort(key=lambda x:x.credential)
+            present_members = [m for m in db_event.members if m]
+            present_members.sort(key=lambda x:x.credential)
 
             self.event_date = dui.TextDisplay(str(date(db_event.date.year,
                                                        db_event.date.month,
@@ -183,10 +208,11 @@ class EditEventView(dui.Modal, title='Evènement'):
         self.add_item(self.participants)
         return self
 
+    @deadline.with_deadline
     async def on_submit(self, interaction: discord.Interaction):    #pylint: disable=arguments-differ   #No sure why this warning is raised
         """ Event triggered when clicking on submit button
         """
-        async with AjDb(modifier_discord=interaction.user.name) as aj_db:
+        async with context.aj_db(read_only=False) as aj_db:
 
             # check consistency - date. Can only be edited if new event
             event_date = None
@@ -224,8 +250,7 @@ class EditEventView(dui.Modal, title='Evènement'):
 
 
             await display(interaction=interaction,
-                          event_str=str(event),
-                          aj_db_in=aj_db,)
+                          event_str=str(event))
 
     async def on_error(self, interaction: discord.Interaction, error: Exception):    #pylint: disable=arguments-differ   #No sure why this warning is raised
         """ Event triggered when an error occurs during modal processing
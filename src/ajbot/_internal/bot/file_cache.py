@@ -0,0 +1,73 @@
+""" Content addressed cache of generated files, stored on local disk
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Optional
+
+from ajbot._internal.exceptions import OtherException
+
+
+def digest(inputs:Any) -> str:
+    """ return digest of the inputs a file is generated from (any json serializable data)
+    """
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')).hexdigest()
+
+
+class FileCache():
+    """ Files stored per digest of their inputs in a directory, least recently used ones being evicted
+        once total size exceeds max_bytes.
+        suffix: extension of the stored files
+    """
+    def __init__(self, directory:Path, max_bytes:int, suffix:str=''):
+        self._directory = Path(directory)
+        self._max_bytes = max_bytes
+        self._suffix = suffix
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key:str) -> Path:
+        return self._directory / f"{key}{self._suffix}"
+
+    def get(self, key:str) -> Optional[bytes]:
+        """ return content stored for key, None if not stored
+        """
+        path = self._path(key)
+        try:
+            content = path.read_bytes()
+        except OSError:
+            self.misses += 1
+            return None
+        # access time is tracked with modification time, as atime may be disabled
+        os.utime(path)
+        self.hits += 1
+        return content
+
+    def put(self, key:str, content:bytes):
+        """ store content for key, evicting least recently used files if needed
+            Cache is only an optimization, so a write failure is just reported
+        """
+        try:
+            self._directory.mkdir(parents=True, exist_ok=True)
+            tmp_path = self._path(key).with_name(f"{key}.tmp")
+            tmp_path.write_bytes(content)
+            tmp_path.replace(self._path(key))
+            self._evict()
+        except OSError as e:
+            print(f"Impossible de stocker {key} dans le cache {self._directory}: {e}")
+
+    def _evict(self):
+        """ remove least recently used files until total size is within max_bytes
+        """
+        files = [(p.stat(), p) for p in self._directory.glob(f"*{self._suffix}") if p.is_file()]
+        total = sum(stat.st_size for stat, _ in files)
+        for stat, path in sorted(files, key=lambda f: f[0].st_mtime):
+            if total <= self._max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= stat.st_size
+
+
+if __name__ == "__main__":
+    raise OtherException('This module is not meant to be executed directly.')
@@ -1,27 +1,25 @@
 """ Functions member outputs (Views, buttons, message, ...)
 """
-from contextlib import nullcontext
 import dateutil.parser as date_parser
 
 import discord
 from discord import Interaction, ui as dui
 
 from ajbot._internal.config import FormatTypes
-from ajbot._internal.ajdb import AjDb, tables as db_t
-from ajbot._internal.bot import checks, responses
+from ajbot._internal.ajdb import tables as db_t
+from ajbot._internal.bot import checks, context, deadline, responses
 from ajbot._internal.exceptions import OtherException, AjBotException
 
 async def display(interaction: Interaction,
                   disc_member:discord.Member=None,
                   int_member:int=None,
                   str_member:str=None,
-                  aj_db_in:AjDb=None,):
+                  ):
     """ Affiche les infos des membres
     """
-    if not interaction.response.type:
-        await interaction.response.defer(ephemeral=True,)
+    await responses.defer(interaction, ephemeral=True)
 
-    async with AjDb() if not aj_db_in else nullcontext(aj_db_in) as aj_db:
+    async with context.aj_db() as aj_db:
         input_member = [x for x in [disc_member, str_member, int_member] if x is not None]
         if len(input_member) != 1:
             input_types="un (et un seul) élément parmi:\r\n* un pseudo\r\n* un nom\r\n* un ID"
@@ -44,7 +42,7 @@ async def display(interaction: Interaction,
                 is_self = False if not member.discord else (member.discord == interaction.user.name)
                 editable = is_self or checks.is_manager(interaction)
 
-                view = dui.LayoutView()
+                view = responses.StatelessView()
                 container = dui.Container()
                 view.add_item(container)
 
@@ -62,14 +60,9 @@ async def display(interaction: Interaction,
                     if member.discord:
                         text += '@' + member.discord
                     title = ('Editer' if text else 'Créer') +  ' identité'
-                    discord_members = []
-                    if member.discord:
-                        discord_members = [m for m in interaction.guild.members if m.name == member.discord]
-                        assert len(discord_members) <= 1, f"More than 1 discord user with same name: {member.discord}"
-                    discord_member = discord_members[0] if len(discord_members) > 0 else None
-                    edit_member_creds_modal = await EditMemberViewCreds.create(db_member=member, discord_member=discord_member)
                     container.add_item(dui.Section(dui.TextDisplay(text),
-                                                   accessory=EditMemberButton(modal=edit_member_creds_modal,
+                                                   accessory=EditMemberButton(member_id=member.id,
+                                                                              action='creds',
                                                                               title=title,
                                                                               disable=False)
                                                   ))
@@ -81,9 +74,9 @@ async def display(interaction: Interaction,
                     else:
                         text += "Pas d'adresse"
                         title = 'Créer adresse'
-                    edit_member_principal_address_modal = await EditMemberViewPrincipalAddress.create(db_member=member)
                     container.add_item(dui.Section(dui.TextDisplay(text),
-                                                   accessory=EditMemberButton(modal=edit_member_principal_address_modal,
+                                                   accessory=EditMemberButton(member_id=member.id,
+                                                                              action='address',
                                                                               title=title,)
                                                   ))
 
@@ -94,9 +87,9 @@ async def display(interaction: Interaction,
                     else:
                         text += "Pas d'email"
                         title = 'Créer email'
-                    edit_member_principal_email_modal = await EditMemberViewPrincipalEmail.create(db_member=member)
                     container.add_item(dui.Section(dui.TextDisplay(text),
-                                                   accessory=EditMemberButton(modal=edit_member_principal_email_modal,
+                                                   accessory=EditMemberButton(member_id=member.id,
+                                                                              action='email',
                                                                               title=title,)
                                                   ))
 
@@ -107,9 +100,9 @@ async def display(interaction: Interaction,
                     else:
                         text += "Pas de téléphone"
                         title = 'Créer téléphone'
-                    edit_member_principal_phone_modal = await EditMemberViewPrincipalPhone.create(db_member=member)
                     container.add_item(dui.Section(dui.TextDisplay(text),
-                                                   accessory=EditMemberButton(modal=edit_member_principal_phone_modal,
+                                                   accessory=EditMemberButton(member_id=member.id,
+                                                                              action='phone',
                                                                               title=title,)
                                                   ))
 
@@ -121,40 +114,30 @@ async def display(interaction: Interaction,
                     else:
                         text += "Non cotisant(e) cette saison"
                         title = 'Ajouter cotisation'
-                    edit_member_subscription_modal = await EditMemberViewSubscription.create(db_member=member)
                     container.add_item(dui.Section(dui.TextDisplay(text),
-                                                   accessory=EditMemberButton(modal=edit_member_subscription_modal,
+                                                   accessory=EditMemberButton(member_id=member.id,
+                                                                              action='subscription',
                                                                              title=title,)
                                                   ))
 
+                    # no edit button until a role modal exists
                     text = "### Rôle spécifique\n"
                     if member.manual_asso_roles:
                         text += '\n'.join(f"-  {mar.name}" for mar in member.manual_asso_roles)  #TODO: add is active role
-                        title = 'Editer rôle'
                     else:
                         text += "Pas de rôle"
-                        title = 'Ajouter rôle'
-                    edit_member_role_modal = await EditMemberViewSubscription.create(db_member=member)   #TODO create modal
-                    container.add_item(dui.Section(dui.TextDisplay(text),
-                                                   accessory=EditMemberButton(modal=edit_member_role_modal,
-                                                                              title=title,)
-                                                  ))
+                    container.add_item(dui.TextDisplay(text))
 
                 await responses.send_response_as_view(interaction=interaction, container=container, ephemeral=True)
             else:
-                embed = discord.Embed(color=discord.Color.orange())
                 format_style = FormatTypes.FULL if (checks.is_manager(interaction)) else FormatTypes.RESTRICTED
-                embed.add_field(name = 'Id', inline=True,
-                                value = '\n'.join(str(m.id) for m in members)
-                               )
-                embed.add_field(name = 'Discord', inline=True,
-                                value = '\n'.join(('@' + m.discord) if m.discord else '-' for m in members)
-                               )
-                embed.add_field(name = 'Nom' + (' (% match)' if len(members) > 1 else ''), inline=True,
-                                value = '\n'.join(f"{m.credential:{format_style}}" if m.credential else '-' for m in members)
-                               )
-
-                await responses.send_response_as_text(interaction=interaction, content=f"{len(members)} personne(s) trouvé(e)(s)", embed=embed, ephemeral=True)
+                embeds = responses.build_table_embeds({'Id': [str(m.id) for m in members],
+                                                       'Discord': [('@' + m.discord) if m.discord else '-' for m in members],
+                                                       'Nom' + (' (% match)' if len(members) > 1 else ''): [f"{m.credential:{format_style}}" if m.credential else '-' for m in members],
+                                                      },
+                                                      color=discord.Color.orange())
+
+                await responses.send_response_as_text(interaction=interaction, content=f"{len(members)} personne(s) trouvé(e)(s)", embeds=embeds, ephemeral=True)
         else:
             await responses.send_response_as_text(interaction=interaction,
                                                   content=f"Je ne connais pas ton ou ta {input_member}.",
@@ -164,17 +147,50 @@ async def display(interaction: Interaction,
 
 # Buttons
 # ========================================================
-class EditMemberButton(dui.Button):
-    """ Class that creates a edit button
+class EditMemberButton(dui.DynamicItem[dui.Button], template=r'ajbot:member:(?P<member_id>[0-9]+):(?P<action>[a-z]+)'):
+    """ Class that creates a persistent edit button
+        Button only carries member id & edit action in its custom_id, modal is built when clicked
     """
-    def __init__(self, modal, title, disable=True):
-        self._modal = modal
-        super().__init__(style=discord.ButtonStyle.primary,
-                         disabled=disable,
-                         label=title)
+    def __init__(self, member_id:int, action:str, title:str=None, disable=True):
+        self.member_id = int(member_id)
+        self.action = action
+        super().__init__(dui.Button(style=discord.ButtonStyle.primary,
+                                    disabled=disable,
+                                    label=title,
+                                    custom_id=f"ajbot:member:{self.member_id}:{action}"))
 
-    async def callback(self, interaction: discord.Interaction):
-        await interaction.response.send_modal(self._modal)
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: dui.Button, match, /):  #pylint: disable=arguments-differ   #positional only signature from discord.py
+        return cls(member_id=int(match['member_id']), action=match['action'])
+
+    @deadline.with_deadline
+    async def callback(self, interaction: discord.Interaction):    #pylint: disable=arguments-differ   #No sure why this warning is raised
+        async with context.aj_db() as aj_db:
+            members = await aj_db.query_members(self.member_id)
+            if len(members) != 1:
+                await responses.send_response_as_text(interaction, f"Je ne connais pas le membre {self.member_id}.", ephemeral=True)
+                return
+            [member] = members
+
+            if not ((member.discord and member.discord == interaction.user.name) or checks.is_manager(interaction)):
+                await responses.send_response_as_text(interaction, "Tu n'as pas le droit de modifier ce membre.", ephemeral=True)
+                return
+
+            if self.action == 'creds':
+                discord_members = []
+                if member.discord and interaction.guild:
+                    discord_members = [m for m in interaction.guild.members if m.name == member.discord]
+                    assert len(discord_members) <= 1, f"More than 1 discord user with same name: {member.discord}"
+                discord_member = discord_members[0] if len(discord_members) > 0 else None
+                modal = await EditMemberViewCreds.create(db_member=member, discord_member=discord_member)
+            elif self.action in _EDIT_MODALS:
+                modal = await _EDIT_MODALS[self.action].create(db_member=member)
+            else:
+                # button of a message sent by a previous version of the bot
+                await responses.send_response_as_text(interaction, "Cette action n'est plus disponible.", ephemeral=True)
+                return
+
+        await responses.send_modal(interaction, modal)
 
 
 # Modals
@@ -249,10 +265,11 @@ class EditMemberViewCreds(dui.Modal, title='Identité Membre'):
         """
         await responses.send_response_as_text(interaction, f"Une erreur est survenue : {error}\nEt il faut tout refaire...", ephemeral=True)
 
+    @deadline.with_deadline
     async def on_submit(self, interaction: discord.Interaction):    #pylint: disable=arguments-differ   #No sure why this warning is raised
         """ Event triggered when clicking on submit button
         """
-        async with AjDb(modifier_discord=interaction.user.name) as aj_db:
+        async with context.aj_db(read_only=False) as aj_db:
 
             assert isinstance(self.last_name, dui.Label)
             assert isinstance(self.last_name.component, dui.TextInput)
@@ -302,8 +319,7 @@ class EditMemberViewCreds(dui.Modal, title='Identité Membre'):
                                                    discord_name=discord_name)
 
             await display(interaction=interaction,
-                          int_member=member.id,
-                          aj_db_in=aj_db,)
+                          int_member=member.id)
 
 class EditMemberViewPrincipalAddress(dui.Modal, title='Adresse Principale'):
     """ Modal handling member creation / update - Principal Postal Address
@@ -544,5 +560,13 @@ class EditMemberViewSubscription(dui.Modal, title='Cotisation'):
         """
         await responses.send_response_as_text(interaction, f"Une erreur est survenue : {error}\nEt il faut tout refaire...", ephemeral=True)
 
+_EDIT_MODALS = {
+                'address': EditMemberViewPrincipalAddress,
+                'email': EditMemberViewPrincipalEmail,
+                'phone': EditMemberViewPrincipalPhone,
+                'subscription': EditMemberViewSubscription,
+               }
+
+
 if __name__ == "__main__":
     raise OtherException('This module is not meant to be executed directly.')
@@ -0,0 +1,111 @@
+""" Paginated views, fetching each page on demand (Views, buttons, ...)
+"""
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+import discord
+from discord import ui as dui
+
+from ajbot._internal.bot import deadline, params, responses
+from ajbot._internal.exceptions import OtherException
+
+
+@dataclass
+class Page():
+    """ One page of a listing
+        first_key / last_key are the keyset cursors of the first / last row of the page
+    """
+    lines: list[str]
+    first_key: Any = None
+    last_key: Any = None
+    has_previous: bool = False
+    has_next: bool = False
+
+    @classmethod
+    def from_keyset(cls, lines:list[str], keys:list, has_more:bool, after=None, before=None):
+        """ create a page from the rows fetched with a keyset query
+            lines / keys: displayed line / cursor of each row
+            has_more: True if there are more rows beyond the page, in the fetching direction
+            after / before: cursors used for the fetch
+        """
+        return cls(lines=lines,
+                   first_key=keys[0] if keys else None,
+                   last_key=keys[-1] if keys else None,
+                   has_previous=(before is not None and has_more) or after is not None,
+                   has_next=(before is None and has_more) or before is not None)
+
+
+class PaginatedView(dui.LayoutView):
+    """ Layout view displaying a listing one page at a time, with previous / next buttons.
+        Pages are fetched on demand using keyset pagination, so only the cursors of the displayed page are kept.
+
+        fetch_page: async function (after, before) -> Page
+                    rows following key 'after' or preceding key 'before', first page if both are None
+    """
+    def __init__(self, fetch_page:Callable[..., Awaitable[Page]], title:str=None, summary:str=None):
+        super().__init__(timeout=params.PAGINATION_TIMEOUT_SEC)
+        self._fetch_page = fetch_page
+        self._page:Optional[Page] = None
+        self._page_nbr = 1
+
+        self.container = dui.Container()
+        self.add_item(self.container)
+        if title:
+            self.container.add_item(dui.TextDisplay(f"# __{title}__"))
+        if summary:
+            self.container.add_item(dui.TextDisplay(f"## {summary}"))
+        self._body = dui.TextDisplay('---')
+        self.container.add_item(self._body)
+        self._previous_button = PageButton(forward=False)
+        self._next_button = PageButton(forward=True)
+        self.container.add_item(dui.ActionRow(self._previous_button, self._next_button))
+
+    @classmethod
+    async def create(cls, fetch_page:Callable[..., Awaitable[Page]], title:str=None, summary:str=None):
+        """ awaitable class factory, fetching first page
+        """
+        self = cls(fetch_page=fetch_page, title=title, summary=summary)
+        self._show(await fetch_page(after=None, before=None))
+        return self
+
+    def _show(self, page:Page):
+        """ update view content with page
+        """
+        self._page = page
+        self._body.content = ('>>> ' + '\n'.join(page.lines)) if page.lines else '---'
+        if page.has_previous or page.has_next:
+            self._body.content += f"\n-# Page {self._page_nbr}"
+        self._previous_button.disabled = not page.has_previous
+        self._next_button.disabled = not page.has_next
+
+    async def change_page(self, interaction: discord.Interaction, forward:bool):
+        """ fetch and display next or previous page
+        """
+        await responses.defer(interaction)
+        if forward:
+            page = await self._fetch_page(after=self._page.last_key, before=None)
+            self._page_nbr += 1
+        else:
+            page = await self._fetch_page(after=None, before=self._page.first_key)
+            self._page_nbr -= 1
+        self._show(page)
+        await interaction.edit_original_response(view=self)
+
+
+# Buttons
+# ========================================================
+class PageButton(dui.Button):
+    """ Class that creates a next / previous page button
+    """
+    def __init__(self, forward:bool):
+        self._forward = forward
+        super().__init__(style=discord.ButtonStyle.secondary,
+                         label='Suivant ▶' if forward else '◀ Précédent')
+
+    @deadline.with_deadline
+    async def callback(self, interaction: discord.Interaction):
+        await self.view.change_page(interaction, forward=self._forward)
+
+
+if __name__ == "__main__":
+    raise OtherException('This module is not meant to be executed directly.')
@@ -9,6 +9,25 @@ AUTOCOMPLETE_LIST_SIZE = 25                 # max size of the autocomplete list
 COMPONENT_MAX_NBR = 5                       # max number of component in a view
 COMPONENT_TEXT_SIZE = 4000                  # max size of a text component
 COMPONENT_SELECT_LIST_SIZE = 25             # max size of a select component list
+MESSAGE_COMPONENT_MAX_NBR = 40              # max number of components (all levels included) in a layout view message
+MESSAGE_TEXT_MAX_SIZE = 4000                # max size of all text components of a layout view message
+EMBED_MAX_NBR = 10                          # max number of embeds in a message
+EMBED_FIELD_MAX_NBR = 25                    # max number of fields in an embed
+EMBED_FIELD_VALUE_SIZE = 1024               # max size of an embed field value
+EMBED_TOTAL_SIZE = 6000                     # max size of all embeds of a message
+ATTACHMENT_THRESHOLD_SIZE = 8000            # above this size, content is sent as an attached file instead of messages
+ATTACHMENT_DEFAULT_NAME = 'reponse.txt'     # default name of the attached file
+ATTACHMENT_NOTICE = 'Réponse trop longue, elle est dans le fichier joint.'    # text to indicate that content is attached
+STALE_DATA_NOTICE = "-# ⚠️ Base de données indisponible, les données peuvent ne pas être à jour."  # text to indicate that data comes from cache
+PAGE_SIZE = 20                              # number of rows per page of a paginated view
+PAGINATION_TIMEOUT_SEC = 15 * 60            # time during which a paginated view remains browsable
+RESPONSE_DEADLINE_SEC = 3                   # max delay to acknowledge an interaction
+DEFAULT_DEFER_BUDGET_SEC = 2                # default delay after which an interaction not yet acknowledged is deferred
+EXTRA_ACK_DELAY = 'ajbot_ack_delay'         # interaction extra: delay in seconds before interaction was acknowledged
+EXTRA_AUTO_DEFERRED = 'ajbot_auto_deferred' # interaction extra: True if interaction was automatically deferred
+HEAVY_COMMAND_CONCURRENCY = 1               # max number of computations of a heavy command running at the same time
+JOB_DEFAULT_JITTER_SEC = 60                 # default max random delay added to scheduled time of a background job
+STATS_TOP_SIZE = 10                         # number of members listed in the longest attendance streaks
 
 if __name__ == '__main__':
     raise OtherException('This module is not meant to be executed directly.')
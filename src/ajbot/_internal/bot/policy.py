@@ -0,0 +1,110 @@
+""" Execution policy of heavy commands: request coalescing & concurrency limit
+"""
+import asyncio
+import contextvars
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Hashable
+
+from ajbot._internal.bot import params
+from ajbot._internal.exceptions import OtherException
+
+
+@dataclass
+class PolicyStats():
+    """ execution statistics of a policy
+    """
+    requests: int = 0
+    coalesced: int = 0
+    runs: int = 0
+    queue_depth: int = 0
+    max_queue_depth: int = 0
+    total_wait: float = 0.
+    max_wait: float = 0.
+
+    @property
+    def mean_wait(self) -> float:
+        """ mean time waited for a run slot, in seconds
+        """
+        return self.total_wait / self.runs if self.runs else 0.
+
+
+_policies:dict[str, 'ExecutionPolicy'] = {}
+
+
+def policies() -> dict[str, 'ExecutionPolicy']:
+    """ return all execution policies per name
+    """
+    return _policies
+
+
+def report() -> dict[str, list[str]]:
+    """ return statistics of all policies as table columns
+    """
+    rows = sorted(_policies.items())
+    return {'Commande': [name for name, _ in rows],
+            'Demandes (groupées)': [f"{p.stats.requests} ({p.stats.coalesced})" for _, p in rows],
+            'File actuelle / max': [f"{p.stats.queue_depth} / {p.stats.max_queue_depth}" for _, p in rows],
+            'Attente moy. / max': [f"{p.stats.mean_wait:.2f}s / {p.stats.max_wait:.2f}s" for _, p in rows],
+           }
+
+
+class ExecutionPolicy():
+    """ Execution policy of a command
+        - requests with same key while a computation is in flight share its result instead of computing it again
+        - at most max_concurrency computations run at the same time, others are queued
+        Result of a computation is shared between requests, so it shall not be modified by them.
+    """
+    def __init__(self, name:str, max_concurrency:int=params.HEAVY_COMMAND_CONCURRENCY):
+        assert name not in _policies, f"Execution policy {name} already exists"
+        self.name = name
+        self.stats = PolicyStats()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._in_flight:dict[Hashable, asyncio.Task] = {}
+        _policies[name] = self
+
+    async def _compute(self, key:Hashable, compute:Callable[[], Awaitable[Any]]):
+        """ run computation once a slot is available
+        """
+        self.stats.queue_depth += 1
+        self.stats.max_queue_depth = max(self.stats.max_queue_depth, self.stats.queue_depth)
+        start = time.monotonic()
+        try:
+            try:
+                await self._semaphore.acquire()
+            finally:
+                self.stats.queue_depth -= 1
+            try:
+                wait = time.monotonic() - start
+                self.stats.runs += 1
+                self.stats.total_wait += wait
+                self.stats.max_wait = max(self.stats.max_wait, wait)
+                return await compute()
+            finally:
+                self._semaphore.release()
+        finally:
+            del self._in_flight[key]
+
+    def _report_failure(self, task:asyncio.Task):
+        """ retrieve & report exception of a computation, which is not awaited anymore if all its requests are cancelled
+        """
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Commande '{self.name}' en échec: {task.exception()!r}")
+
+    async def run(self, key:Hashable, compute:Callable[[], Awaitable[Any]]):
+        """ return result of compute(), sharing it with all requests of same key in flight
+        """
+        self.stats.requests += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            # computation is shared between interactions, so it runs outside the context of the requesting one
+            task = self._in_flight[key] = asyncio.create_task(self._compute(key, compute), context=contextvars.Context())
+            task.add_done_callback(self._report_failure)
+        else:
+            self.stats.coalesced += 1
+        # shield the computation so that a cancelled request does not cancel it for the others
+        return await asyncio.shield(task)
+
+
+if __name__ == "__main__":
+    raise OtherException('This module is not meant to be executed directly.')
@@ -1,13 +1,37 @@
 """ List of function to handle app command outputs (Views, buttons, message, ...)
 """
+import io
+import asyncio
+import weakref
 
 import discord
 from discord import Interaction, ui as dui
 
-from ajbot._internal.bot import  params
+from ajbot._internal.bot import  params, context
+from ajbot._internal.ajdb import AjDb
 from ajbot._internal.exceptions import OtherException
 
 
+# per interaction send queue, so that messages of a same interaction keep their order
+_send_locks:weakref.WeakValueDictionary[int, asyncio.Lock] = weakref.WeakValueDictionary()
+
+
+class StatelessView(dui.LayoutView):
+    """ Layout view only holding persistent dynamic items, whose state is carried by their custom_id.
+        It is never stored by the client once sent: clicks are dispatched through the registered dynamic items,
+        so the view keeps working after a bot restart and does not keep any object alive while idle.
+        discord.py has no option to send a view without storing it: it only skips views which are finished
+        (checked with discord.py 2.7, for InteractionResponse.send_message & Webhook.send, see test_responses).
+    """
+    def __init__(self):
+        super().__init__(timeout=None)
+
+    def is_finished(self) -> bool:
+        """ always finished, so that discord.py does not store the view when sending it
+        """
+        return True
+
+
 def split_text(content:str,
                chunk_size=params.CHUNK_MAX_SIZE,
                split_on_eol=True):
@@ -21,7 +45,7 @@ def split_text(content:str,
         yield None
         return
 
-    assert (chunk_size <= params.CHUNK_MAX_SIZE), f"La taille demandée {chunk_size} n'est pas supportée. Max {params.CHUNK_MAX_SIZE}."
+    assert (chunk_size <= params.MESSAGE_TEXT_MAX_SIZE), f"La taille demandée {chunk_size} n'est pas supportée. Max {params.MESSAGE_TEXT_MAX_SIZE}."
 
     first_answer = True
     i = 0
@@ -40,65 +64,239 @@ def split_text(content:str,
         yield chunk
 
 
+def pack_text(sections:list[str],
+              budget:int,
+              first_budget:int=None,
+              max_items:int=params.MESSAGE_COMPONENT_MAX_NBR,
+              overhead:int=0) -> list[list[str]]:
+    """ Pack text sections into as few messages as possible.
+        Each message is a list of sections whose total size (including overhead per section) fits in budget
+        (first_budget for the first message), with at most max_items sections.
+        Sections too long to fit in a single message are split using split_text.
+
+        First message can be empty if first section does not fit in first_budget.
+    """
+    first_budget = budget if first_budget is None else first_budget
+    messages = [[]]
+    sizes = [0]
+    for section in sections:
+        if len(section) + overhead <= budget:
+            pieces = [section]
+        else:
+            pieces = split_text(section, chunk_size=budget - overhead - len(params.CHUNK_CONTINUE))
+
+        for piece in pieces:
+            limit = first_budget if len(messages) == 1 else budget
+            if (sizes[-1] + len(piece) + overhead > limit or len(messages[-1]) >= max_items) and (messages[-1] or len(messages) == 1):
+                messages.append([])
+                sizes.append(0)
+            messages[-1].append(piece)
+            sizes[-1] += len(piece) + overhead
+
+    return messages
+
+
+def build_table_embeds(columns:dict[str, list[str]], color:discord.Color=None) -> list[discord.Embed]:
+    """ Create embeds displaying a table, each column being an inline field.
+        Rows are spread over as many fields & embeds as needed to comply with discord limits.
+    """
+    names = list(columns.keys())
+    rows = list(zip(*columns.values()))
+
+    # group rows in blocks, each block being displayed as one line of fields
+    blocks = [[]]
+    block_sizes = [[0] * len(names)]
+    for row in rows:
+        if blocks[-1] and any(size + len(value) + 1 > params.EMBED_FIELD_VALUE_SIZE for size, value in zip(block_sizes[-1], row)):
+            blocks.append([])
+            block_sizes.append([0] * len(names))
+        blocks[-1].append(row)
+        block_sizes[-1] = [size + len(value) + 1 for size, value in zip(block_sizes[-1], row)]
+
+    embeds = [discord.Embed(color=color)]
+    for block in blocks:
+        values = ['\n'.join(v) or '-' for v in zip(*block)] if block else ['-'] * len(names)
+        block_size = sum(len(n) + len(v) for n, v in zip(names, values))
+        if (    len(embeds[-1].fields) + len(names) > params.EMBED_FIELD_MAX_NBR
+            or  len(embeds[-1]) + block_size > params.EMBED_TOTAL_SIZE):
+            embeds.append(discord.Embed(color=color))
+        for name, value in zip(names, values):
+            embeds[-1].add_field(name=name, value=value, inline=True)
+
+    return embeds
+
+
+def pack_embeds(embeds:list[discord.Embed]) -> list[list[discord.Embed]]:
+    """ Pack embeds into as few messages as possible, complying with discord limits
+    """
+    messages = []
+    for embed in embeds:
+        if (    not messages
+            or  len(messages[-1]) >= params.EMBED_MAX_NBR
+            or  sum(len(e) for e in messages[-1]) + len(embed) > params.EMBED_TOTAL_SIZE):
+            messages.append([])
+        messages[-1].append(embed)
+    return messages
+
+
+def _text_file(content:str, filename:str=None) -> discord.File:
+    """ Create a discord file from a text
+    """
+    return discord.File(fp=io.BytesIO(content.encode('utf-8')), filename=filename or params.ATTACHMENT_DEFAULT_NAME)
+
+
+def _send_lock(interaction: Interaction) -> asyncio.Lock:
+    """ Return the send queue of an interaction
+    """
+    lock = _send_locks.get(interaction.id)
+    if lock is None:
+        lock = _send_locks[interaction.id] = asyncio.Lock()
+    return lock
+
+
+def interaction_age(interaction: Interaction) -> float:
+    """ Return the time in seconds elapsed since the interaction was created
+    """
+    return max(0., (discord.utils.utcnow() - interaction.created_at).total_seconds())
+
+
+def _acknowledged(interaction: Interaction, auto:bool=False):
+    """ Record when (and how) the interaction has been acknowledged
+    """
+    interaction.extras.setdefault(params.EXTRA_ACK_DELAY, interaction_age(interaction))
+    interaction.extras.setdefault(params.EXTRA_AUTO_DEFERRED, auto)
+
+
+async def defer(interaction: Interaction, ephemeral=False, auto:bool=False):
+    """ Acknowledge the interaction if not yet done, so that later messages are sent as followups.
+        auto: True if deferred on behalf of a handler close to the response deadline
+    """
+    async with _send_lock(interaction):
+        if not interaction.response.type:
+            await interaction.response.defer(ephemeral=ephemeral)
+            _acknowledged(interaction, auto=auto)
+
+
+async def send_modal(interaction: Interaction, modal: dui.Modal):
+    """ Send a modal as interaction response.
+        A modal cannot follow a deferral, so if the interaction has been deferred meanwhile, user is asked to retry.
+    """
+    async with _send_lock(interaction):
+        sent = not interaction.response.type
+        if sent:
+            await interaction.response.send_modal(modal)
+            _acknowledged(interaction)
+
+    if not sent:
+        await send_response_as_text(interaction=interaction,
+                                    content="🐌 J'ai mis trop de temps à préparer le formulaire, il faut recommencer.",
+                                    ephemeral=True)
+
+
+async def _dispatch(interaction: Interaction, **kwargs):
+    """ Send one message for an interaction: as its response if not yet done, otherwise as a followup.
+        Messages of a same interaction are queued to keep their order, and resent when rate limited.
+    """
+    async with _send_lock(interaction):
+        while True:
+            if interaction.response.type:
+                message_fct = interaction.followup.send
+            else:
+                message_fct = interaction.response.send_message
+            try:
+                message = await message_fct(**{k:v for k, v in kwargs.items() if v is not None})
+                _acknowledged(interaction)
+                return message
+            except discord.RateLimited as e:
+                await asyncio.sleep(e.retry_after)
+
+
+def _stale_data() -> bool:
+    """ True if data of current interaction may be stale (see context)
+    """
+    interaction_context = context.current()
+    return interaction_context.stale if interaction_context else AjDb.db_unavailable()
+
+
 async def send_response_as_text(interaction: Interaction,
                                 content:str,
                                 embed=None,
                                 ephemeral=False,
-                                file=None):
+                                file=None,
+                                embeds:list[discord.Embed]=None,
+                                attachment_name:str=None):
     """ Send basic command response, handling splitting it if needed based on discord limit.
-        Can also ensure that split is only perform at eol.
+        Split is only performed at eol, and embeds are packed in as few messages as possible.
+        Content longer than attachment threshold is sent as an attached text file instead.
     """
+    if content and len(content) > params.ATTACHMENT_THRESHOLD_SIZE and not file:
+        file = _text_file(content, attachment_name)
+        content = params.ATTACHMENT_NOTICE
+    if content and _stale_data():
+        content = params.STALE_DATA_NOTICE + '\n' + content
 
-    for chunk in split_text(content):
-        if interaction.response.type:
-            message_fct = interaction.followup.send
-        else:
-            message_fct = interaction.response.send_message
-
-        if file:
-            await message_fct(content=chunk, embed=embed, ephemeral=ephemeral, file=file)
-            file = None  # Empty file so it is only send with the first chunk (even though, I doubt we will ever have file with 2000+ content)
-        else:
-            await message_fct(content=chunk, embed=embed, ephemeral=ephemeral)
-        embed = None  # Empty embed so it is only send with the first chunk (even though, I doubt we will ever have embed with 2000+ content)
+    embed_messages = pack_embeds(([embed] if embed else []) + (embeds or []))
+    chunks = list(split_text(content))
+    for i in range(max(len(chunks), len(embed_messages))):
+        await _dispatch(interaction,
+                        content=chunks[i] if i < len(chunks) else None,
+                        embeds=embed_messages[i] if i < len(embed_messages) else None,
+                        file=file,
+                        ephemeral=ephemeral)
+        file = None  # Empty file so it is only send with the first message
 
 
 async def send_response_as_view(interaction: Interaction,
                                 container:dui.Container=None,
-                                title:str=None, summary:str=None, content:str=None,
-                                ephemeral=False,):
-    """ Send command response as a view, splitting content if needed.
+                                title:str=None, summary:str=None, content:str|list[str]=None,
+                                ephemeral=False,
+                                attachment_name:str=None):
+    """ Send command response as a view, packing content in as few messages as possible.
+        Content can be a list of sections, each one being displayed in its own text component.
+        Content longer than attachment threshold is sent as an attached text file instead.
     """
     assert container is not None or title is not None or summary is not None or content is not None, "Il faut fournir soit un container, soit des éléments à ajouter."
     assert not (container is not None and (title is not None or summary is not None or content is not None)), "Soit on fournit un container, soit des éléments à ajouter, mais pas les deux."
 
-    for chunk in split_text(content):
-        if not container:
-            view = dui.LayoutView()
-            container = dui.Container()
-            view.add_item(container)
+    timestamp = discord.utils.format_dt(interaction.created_at, 'F')
+    footer = f"-# Généré par {interaction.user} (ID: {interaction.user.id}) | {timestamp}"
+    if _stale_data():
+        footer = params.STALE_DATA_NOTICE + '\n' + footer
 
-            if title:
-                container.add_item(dui.TextDisplay(f"# __{title}__"))
-            if summary:
-                container.add_item(dui.TextDisplay(f"## {summary}"))
-            if chunk:
-                container.add_item(dui.TextDisplay(f">>> {chunk}"))
+    if container:
+        container.add_item(dui.TextDisplay(footer))
+        await _dispatch(interaction, view=container.view, ephemeral=ephemeral)
+        return
 
-        timestamp = discord.utils.format_dt(interaction.created_at, 'F')
-        footer = dui.TextDisplay(f"-# Généré par {interaction.user} (ID: {interaction.user.id}) | {timestamp}")
+    sections = [content] if isinstance(content, str) else [s for s in (content or []) if s]
+    headers = ([f"# __{title}__"] if title else []) + ([f"## {summary}"] if summary else [])
+    file = None
+    if sum(len(s) for s in sections) > params.ATTACHMENT_THRESHOLD_SIZE:
+        file = _text_file('\n'.join(sections), attachment_name)
+        messages = [[params.ATTACHMENT_NOTICE]]
+    else:
+        quote = '>>> '
+        messages = pack_text(sections,
+                             budget=params.MESSAGE_TEXT_MAX_SIZE - len(footer),
+                             first_budget=params.MESSAGE_TEXT_MAX_SIZE - len(footer) - sum(len(h) for h in headers),
+                             max_items=params.MESSAGE_COMPONENT_MAX_NBR - len(headers) - 2,    # container & footer
+                             overhead=len(quote))
+        messages = [[quote + piece for piece in message] for message in messages]
 
-        container.add_item(footer)
+    for message in messages:
+        view = dui.LayoutView()
+        container = dui.Container()
+        view.add_item(container)
 
-        if interaction.response.type:
-            message_fct = interaction.followup.send
-        else:
-            message_fct = interaction.response.send_message
+        for text in headers + message:
+            container.add_item(dui.TextDisplay(text))
+        if file:
+            container.add_item(dui.File(media=f"attachment://{file.filename}"))
+        container.add_item(dui.TextDisplay(footer))
 
-        await message_fct(view=container.view, ephemeral=ephemeral)
-        container = None
-        title = None        #display title & summary only on first chunk
-        summary = None
+        await _dispatch(interaction, view=view, file=file, ephemeral=ephemeral)
+        headers = []        #display title & summary only on first message
+        file = None
 
 
 # Detail display
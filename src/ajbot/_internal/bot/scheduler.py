@@ -0,0 +1,286 @@
+""" In-process scheduler of background jobs (cache refresh, role check, ...)
+"""
+import asyncio
+import contextvars
+import json
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, date, timedelta, time as dtime
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+from discord import Interaction, app_commands
+
+from ajbot._internal.ajdb import AjDb
+from ajbot._internal.bot import params
+from ajbot._internal.exceptions import OtherException
+
+
+class CronSpec():
+    """ cron like schedule: "minute hour day_of_month month day_of_week"
+        each field being '*', a value or a range 'a-b', optionally with a step '/n', several being comma separated.
+        day of week: 0 or 7 = sunday. As in cron, if both day fields are restricted, a day matching either one is selected.
+    """
+    _RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, spec:str):
+        fields = spec.split()
+        if len(fields) != len(self._RANGES):
+            raise OtherException(f"Planification '{spec}' invalide: 5 champs attendus")
+        self.spec = spec
+        self._minutes, self._hours, self._days, self._months, week_days = \
+            (self._parse_field(field, low, high) for field, (low, high) in zip(fields, self._RANGES))
+        self._week_days = {d % 7 for d in week_days}
+        self._any_day = fields[2] == '*'
+        self._any_week_day = fields[4] == '*'
+
+    def _parse_field(self, field:str, low:int, high:int) -> set[int]:
+        """ return values of a field
+        """
+        values = set()
+        for part in field.split(','):
+            value_range, _, step = part.partition('/')
+            try:
+                if value_range == '*':
+                    start, end = low, high
+                else:
+                    start, _, end = value_range.partition('-')
+                    start = int(start)
+                    end = int(end) if end else (high if step else start)
+                step = int(step) if step else 1
+            except ValueError as e:
+                raise OtherException(f"Planification '{self.spec}' invalide: '{part}' n'est pas numérique") from e
+            if step <= 0:
+                raise OtherException(f"Planification '{self.spec}' invalide: pas de '{part}' nul ou négatif")
+            if not low <= start <= end <= high:
+                raise OtherException(f"Planification '{self.spec}' invalide: '{part}' hors de [{low}-{high}]")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, day:date) -> bool:
+        if day.month not in self._months:
+            return False
+        day_match = day.day in self._days
+        week_day_match = (day.weekday() + 1) % 7 in self._week_days
+        if self._any_day or self._any_week_day:
+            return day_match and week_day_match
+        return day_match or week_day_match
+
+    def next_after(self, after:datetime) -> datetime:
+        """ return first scheduled time strictly after given time
+        """
+        start = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = start.date()
+        for _ in range(5 * 366):        # enough to find a 29th of february
+            if self._day_matches(day):
+                first_minute = start.hour * 60 + start.minute if day == start.date() else 0
+                for hour in sorted(self._hours):
+                    for minute in sorted(self._minutes):
+                        if hour * 60 + minute >= first_minute:
+                            return datetime.combine(day, dtime(hour, minute))
+            day += timedelta(days=1)
+        raise OtherException(f"Planification '{self.spec}' jamais atteinte")
+
+
+@dataclass
+class JobStats():
+    """ execution statistics of a job
+    """
+    runs: int = 0
+    failures: int = 0
+    skipped: int = 0
+    total_duration: float = 0.
+    max_duration: float = 0.
+    last_run: Optional[datetime] = None
+    next_run: Optional[datetime] = None
+
+    @property
+    def mean_duration(self) -> float:
+        """ mean duration of a run, in seconds
+        """
+        return self.total_duration / self.runs if self.runs else 0.
+
+
+class Job():
+    """ background job
+        func: async function to run, without argument
+        cron: schedule, None if job only runs when triggered
+        jitter_sec: random delay added to scheduled time, so that jobs do not all start at once
+        run_missed: if True, a scheduled run missed while bot was stopped is done at startup
+    """
+    def __init__(self, name:str, func:Callable[[], Awaitable]):
+        self.name = name
+        self.func = func
+        self.cron:Optional[CronSpec] = None
+        self.jitter_sec:float = 0.
+        self.run_missed:bool = False
+        self.stats = JobStats()
+        self._lock = asyncio.Lock()
+        self._task:Optional[asyncio.Task] = None
+
+    async def run(self, state_file:Optional[Path]=None) -> str:
+        """ run job unless it is already running, in this bot or in another one sharing the db
+            @return
+                run status, to be displayed
+        """
+        if self._lock.locked():
+            self.stats.skipped += 1
+            return "déjà en cours"
+        async with self._lock:
+            self.stats.last_run = datetime.now()
+            start = time.monotonic()
+            skipped = False
+            try:
+                # session & lock are part of the run: a db outage is a failure, not the end of the scheduling loop
+                async with AjDb(read_only=True) as aj_db, aj_db.named_lock(f"ajbot:job:{self.name}") as acquired:
+                    if not acquired:
+                        skipped = True
+                        self.stats.skipped += 1
+                        return "déjà en cours sur une autre instance"
+                    await self.func()
+            except Exception as e:     #pylint: disable=broad-exception-caught   #a failing job shall not stop the scheduler
+                self.stats.failures += 1
+                print(f"Tâche '{self.name}' en échec: {e!r}")
+                return f"échec: {e}"
+            finally:
+                duration = time.monotonic() - start
+                if not skipped:
+                    self.stats.runs += 1
+                    self.stats.total_duration += duration
+                    self.stats.max_duration = max(self.stats.max_duration, duration)
+                    if state_file is not None:
+                        _save_last_run(state_file, self.name, self.stats.last_run)
+        return f"terminée en {duration:.2f}s"
+
+    async def _loop(self, state_file:Path, missed:bool):
+        """ run job at each scheduled time
+        """
+        if missed:
+            await asyncio.sleep(random.uniform(0, self.jitter_sec))
+            await self.run(state_file)
+        while True:
+            self.stats.next_run = self.cron.next_after(datetime.now())
+            await asyncio.sleep((self.stats.next_run - datetime.now()).total_seconds() + random.uniform(0, self.jitter_sec))
+            await self.run(state_file)
+
+    def start(self, state_file:Path, last_run:Optional[datetime]):
+        """ schedule job
+            last_run: time of last run before bot startup, to detect a missed run
+        """
+        missed = self.run_missed and last_run is not None and self.cron.next_after(last_run) < datetime.now()
+        # job runs outside the context of any interaction
+        self._task = asyncio.create_task(self._loop(state_file, missed), context=contextvars.Context())
+
+    def stop(self):
+        """ unschedule job
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.stats.next_run = None
+
+
+_jobs:dict[str, Job] = {}
+_state_file:Optional[Path] = None
+
+
+def _load_last_runs(state_file:Path) -> dict[str, datetime]:
+    """ return last run time per job, saved by previous bot runs
+    """
+    try:
+        with open(state_file, encoding='utf-8') as f:
+            return {name: datetime.fromisoformat(last_run) for name, last_run in json.load(f).items()}
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_last_run(state_file:Path, name:str, last_run:datetime):
+    """ save last run time of a job
+    """
+    last_runs = _load_last_runs(state_file)
+    last_runs[name] = last_run
+    try:
+        with open(state_file, 'w', encoding='utf-8') as f:
+            json.dump({k: v.isoformat() for k, v in last_runs.items()}, f, indent=4)
+    except OSError as e:
+        print(f"Impossible de sauvegarder l'état des tâches dans {state_file}: {e}")
+
+
+def jobs() -> dict[str, Job]:
+    """ return all jobs per name
+    """
+    return _jobs
+
+
+def register(name:str, func:Callable[[], Awaitable]):
+    """ declare a job, which is only scheduled if configured (see start)
+    """
+    assert name not in _jobs, f"Tâche {name} déjà déclarée"
+    _jobs[name] = Job(name, func)
+
+
+def start(jobs_config:dict[str, dict], state_file:Path):
+    """ schedule configured jobs
+        jobs_config: job name -> {"cron": schedule (see CronSpec), "jitter_sec": max random delay, "run_missed": bool}
+        state_file: file keeping last run time of jobs
+        All job configs are checked before any job is scheduled, so that an invalid config does not leave some jobs running.
+    """
+    global _state_file   #pylint: disable=global-statement   #on purpose, to handle scheduler state
+    crons = {}
+    for name, job_config in jobs_config.items():
+        if name not in _jobs:
+            raise OtherException(f"Tâche '{name}' configurée mais inconnue")
+        if 'cron' not in job_config:
+            raise OtherException(f"Tâche '{name}' configurée sans planification")
+        crons[name] = CronSpec(job_config['cron'])
+
+    _state_file = state_file
+    last_runs = _load_last_runs(state_file)
+    for name, job_config in jobs_config.items():
+        job = _jobs[name]
+        job.cron = crons[name]
+        job.jitter_sec = job_config.get('jitter_sec', params.JOB_DEFAULT_JITTER_SEC)
+        job.run_missed = job_config.get('run_missed', False)
+        job.start(state_file, last_runs.get(name))
+
+
+def stop():
+    """ unschedule all jobs
+    """
+    for job in _jobs.values():
+        job.stop()
+
+
+async def run(name:str) -> str:
+    """ run a job now
+        @return
+            run status, to be displayed
+    """
+    if name not in _jobs:
+        raise OtherException(f"Tâche '{name}' inconnue")
+    return await _jobs[name].run(_state_file)
+
+
+def report() -> dict[str, list[str]]:
+    """ return statistics of all jobs as table columns
+    """
+    rows = sorted(_jobs.items())
+    def when(dt:Optional[datetime]) -> str:
+        return dt.strftime('%d/%m %H:%M') if dt else '-'
+    return {'Tâche': [f"{name} ({job.cron.spec if job.cron else 'manuelle'})" for name, job in rows],
+            'Exécutions (échecs, ignorées)': [f"{j.stats.runs} ({j.stats.failures}, {j.stats.skipped})" for _, j in rows],
+            'Durée moy. / max': [f"{j.stats.mean_duration:.2f}s / {j.stats.max_duration:.2f}s" for _, j in rows],
+            'Dernière / prochaine': [f"{when(j.stats.last_run)} / {when(j.stats.next_run)}" for _, j in rows],
+           }
+
+
+async def autocomplete(_interaction: Interaction, current:str) -> list[app_commands.Choice[str]]:
+    """ AutoComplete function of job names
+    """
+    return [app_commands.Choice(name=name, value=name)
+            for name in sorted(_jobs) if current.lower() in name.lower()][:params.AUTOCOMPLETE_LIST_SIZE]
+
+
+if __name__ == "__main__":
+    raise OtherException('This module is not meant to be executed directly.')
@@ -1,44 +1,71 @@
 """ Function roles outputs (Views, buttons, message, ...)
 """
+import functools
+
 from discord import Interaction
 
 from ajbot._internal.config import FormatTypes
 from ajbot._internal.ajdb import AjDb
-from ajbot._internal.bot import checks, responses
+from ajbot._internal.bot import checks, params, responses
+from ajbot._internal.bot.pagination import Page, PaginatedView
+from ajbot._internal.bot.policy import ExecutionPolicy
+from ajbot._internal.exceptions import OtherException
+
+
+_season_policy = ExecutionPolicy('saison')
+
 
 async def display(interaction: Interaction,
                   season_name:str=None):
     """ Affiche les infos des évènements
     """
-    if not interaction.response.type:
-        await interaction.response.defer(ephemeral=True,)
-
-    async with AjDb() as aj_db:
-        participants = await aj_db.query_members_per_season_presence(season_name)
-        subscribers = await aj_db.query_members_per_season_presence(season_name, subscriber_only=True)
-        format_style = FormatTypes.FULL if checks.is_manager(interaction) else FormatTypes.RESTRICTED
-
-        if participants:
-            summary = f"{len(participants)} personne(s) sont venues"
-
-            reply = ''
-            if len(subscribers) > 0:
-                reply += f"## {len(subscribers)} Cotisant(es):\n- "
-                reply += '\n- '.join(f"{m:{format_style}} - **{m.season_presence_count(season_name)}** participation(s)" for m in subscribers)
-            if len(participants) - len(subscribers) > 0:
-                sep = '\n\n'
-                reply += f"{sep if len(subscribers) else ''}## {len(participants) - len(subscribers)} non Cotisant(es):\n- "
-                reply += '\n- '.join(f"{m:{format_style}} - **{m.season_presence_count(season_name)}** participation(s)" for m in participants if m not in subscribers)
-        else:
-            if subscribers:
-                summary = f"Je ne sais pas combien de personne sont venues, mais {len(subscribers)} ont cotisé :"
-                reply = '- ' + '\n- '.join(f"{m:{format_style}}" for m in subscribers)
-            else:
-                summary = "😱 Mais il n'y a eu personne ! 😱"
-                reply = '---'
-
-    await responses.send_response_as_view(interaction=interaction,
-                                          title=f"Saison {season_name if season_name else 'en cours'}",
-                                          summary=summary,
-                                          content=reply,
-                                          ephemeral=True)
+    await responses.defer(interaction, ephemeral=True)
+
+    format_style = FormatTypes.FULL if checks.is_manager(interaction) else FormatTypes.RESTRICTED
+
+    nb_participants, nb_subscribers, _ = await _season_policy.run(key=('headcount', season_name),
+                                                                  compute=lambda: _query_headcount(season_name))
+
+    if nb_participants:
+        summary = f"{nb_participants} personne(s) sont venues, {nb_subscribers} cotisant(es)"
+    elif nb_subscribers:
+        summary = f"Je ne sais pas combien de personne sont venues, mais {nb_subscribers} ont cotisé :"
+    else:
+        summary = "😱 Mais il n'y a eu personne ! 😱"
+
+    view = await PaginatedView.create(fetch_page=functools.partial(_fetch_members_page, season_name=season_name, format_style=format_style),
+                                      title=f"Saison {season_name if season_name else 'en cours'}",
+                                      summary=summary)
+    await responses.send_response_as_view(interaction=interaction, container=view.container, ephemeral=True)
+
+
+async def _query_headcount(season_name:str) -> tuple[int, int, int]:
+    """ return number of participants, subscribers & events of a season
+    """
+    async with AjDb(read_only=True) as aj_db:
+        return await aj_db.query_season_headcount(season_name)
+
+
+async def _fetch_members_page(after, before, season_name:str, format_style:str) -> Page:
+    """ fetch one page of the members of a season, sharing it with identical requests in flight
+    """
+    async def fetch():
+        async with AjDb(read_only=True) as aj_db:
+            members, has_more = await aj_db.query_members_page(season_name=season_name,
+                                                               after=after,
+                                                               before=before,
+                                                               limit=params.PAGE_SIZE)
+            lines = [f"{m:{format_style}} - **{m.season_presence_count(season_name)}** participation(s)"
+                     + (" - cotisant(e)" if m.is_season_subscriber(season_name) else "")
+                     for m in members]
+            return Page.from_keyset(lines=lines,
+                                    keys=[AjDb.member_page_key(m) for m in members],
+                                    has_more=has_more,
+                                    after=after,
+                                    before=before)
+
+    return await _season_policy.run(key=('page', season_name, format_style, after, before), compute=fetch)
+
+
+if __name__ == "__main__":
+    raise OtherException('This module is not meant to be executed directly.')
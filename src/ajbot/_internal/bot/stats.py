@@ -0,0 +1,177 @@
+""" Attendance statistics outputs
+"""
+import asyncio
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterable, Optional
+
+import discord
+from discord import Interaction, File as Dfile
+
+from ajbot._internal import charts
+from ajbot._internal.config import AjConfig, FormatTypes
+from ajbot._internal.ajdb import tables as db_t
+from ajbot._internal.ajdb.presence import PresenceMatrix
+from ajbot._internal.bot import context, file_cache, params, responses
+from ajbot._internal.bot.policy import ExecutionPolicy
+from ajbot._internal.exceptions import OtherException
+
+
+_chart_policy = ExecutionPolicy('graphique')
+
+_CHART_VERSION = 1      # to be increased when chart layout changes, so that cached ones are not used anymore
+_charts:Optional[file_cache.FileCache] = None
+_renderer:Optional[ProcessPoolExecutor] = None
+
+
+def _season_report(matrix:PresenceMatrix) -> dict[str, list[str]]:
+    """ return attendance per season as table columns
+    """
+    bounds = matrix.season_bounds()
+    counts = matrix.counts_per_season()
+    retention = {season_id: (participants, kept) for season_id, _, participants, kept in matrix.retention()}
+    def retained(season_id:int) -> str:
+        if season_id not in retention:
+            return '-'
+        participants, kept = retention[season_id]
+        return f"{kept} ({kept / participants:.0%})" if participants else '-'
+    return {'Saison': [matrix.season_names[season_id] for season_id, _, _ in bounds],
+            'Évènements / participants': [f"{end - start} / {int((counts[:, i] > 0).sum())}" for i, (_, start, end) in enumerate(bounds)],
+            'Présences (moy.)': [f"{int(counts[:, i].sum())} ({counts[:, i].sum() / (end - start):.1f})" for i, (_, start, end) in enumerate(bounds)],
+            'Revenus la saison suivante': [retained(season_id) for season_id, _, _ in bounds],
+           }
+
+
+async def display(interaction: Interaction, last_events:int, min_presences:int):
+    """ Affiche les statistiques de présence: par saison, membres actifs & plus longues séries
+    """
+    await responses.defer(interaction, ephemeral=True)
+
+    async with context.aj_db() as aj_db:
+        matrix = await aj_db.query_presence_matrix()
+        members = {int(m.id): m for m in await aj_db.query_table_content(db_t.Member)}
+
+    def name(member_id:int) -> str:
+        return f"{members[member_id]:{FormatTypes.FULL}}" if member_id in members else str(member_id)
+
+    active_ids, active_counts = matrix.active_members(last_events=last_events, min_presences=min_presences)
+    active = sorted(zip(active_ids.tolist(), active_counts.tolist()), key=lambda a: (-a[1], a[0]))
+    streaks = matrix.longest_streaks()
+    best = sorted(zip(matrix.member_ids.tolist(), streaks.tolist()), key=lambda s: (-s[1], s[0]))[:params.STATS_TOP_SIZE]
+
+    await responses.send_response_as_text(interaction=interaction,
+                                          content=f"📊 {len(matrix.event_ids)} évènement(s), {len(matrix.member_ids)} participant(s) depuis le début",
+                                          embeds=responses.build_table_embeds(_season_report(matrix), color=discord.Color.blue()),
+                                          ephemeral=True)
+    await responses.send_response_as_text(interaction=interaction,
+                                          content=f"🔥 {len(active)} membre(s) venu(s) au moins {min_presences} fois aux {last_events} derniers évènements:\n"
+                                                  + '\n'.join(f"* {name(member_id)} - **{count}**" for member_id, count in active),
+                                          ephemeral=True)
+    await responses.send_response_as_text(interaction=interaction,
+                                          content="🏅 Plus longues séries d'évènements consécutifs",
+                                          embeds=responses.build_table_embeds({'Membre': [name(member_id) for member_id, _ in best],
+                                                                               'Série': [str(streak) for _, streak in best]},
+                                                                              color=discord.Color.blue()),
+                                          ephemeral=True)
+
+
+async def chart_display(interaction: Interaction, chart_type:str, season_name:Optional[str]=None):
+    """ Affiche un graphique de présence
+    """
+    await responses.defer(interaction, ephemeral=True)
+
+    async with context.aj_db() as aj_db:
+        matrix = await aj_db.query_presence_matrix()
+        subscriptions = []
+        if chart_type == charts.SUBSCRIBERS:
+            subscriptions = [(ms.member_id, ms.season_id) for ms in await aj_db.query_table_content(db_t.Membership)]
+
+    data = _chart_data(chart_type, matrix, season_name=season_name, subscriptions=subscriptions)
+    if data is None:
+        await responses.send_response_as_text(interaction=interaction,
+                                              content=f"Aucun évènement pour la saison {season_name}." if season_name else "Aucun évènement.",
+                                              ephemeral=True)
+        return
+
+    # data is part of the key, so that a chart is rendered again only once its data changes
+    key = file_cache.digest({'version': _CHART_VERSION, 'chart': chart_type, 'data': data})
+    png = await _chart_policy.run(key=key, compute=lambda: _render_chart(key, chart_type, data))
+
+    await responses.send_response_as_text(interaction=interaction,
+                                          content="Graphique:",
+                                          file=Dfile(fp=io.BytesIO(png), filename=f"{chart_type}.png"),
+                                          ephemeral=True)
+
+
+def _chart_data(chart_type:str, matrix:PresenceMatrix, season_name:Optional[str]=None,
+                subscriptions:Iterable[tuple[int, int]]=()) -> Optional[dict]:
+    """ return data of a chart (see charts.render), None if there is none
+        season_name: season of presences chart, latest season having events if not set
+        subscriptions: (member id, season id) of memberships, for subscribers chart
+    """
+    bounds = matrix.season_bounds()
+    if chart_type == charts.PRESENCES:
+        season_ids = [season_id for season_id, _, _ in bounds if season_name in (None, matrix.season_names[season_id])]
+        if not season_ids:
+            return None
+        dates, counts = matrix.presences_per_event(season_ids[-1])
+        return {'season': matrix.season_names[season_ids[-1]],
+                'labels': [d.item().strftime('%d/%m/%y') for d in dates],
+                'values': counts.tolist()}
+
+    if not bounds:
+        return None
+    participants = matrix.participants_per_season(subscriptions)
+    return {'labels': [matrix.season_names[season_id] for season_id, _, _ in participants],
+            'subscribers': [nb_subscribers for _, nb_subscribers, _ in participants],
+            'visitors': [nb_visitors for _, _, nb_visitors in participants]}
+
+
+def _chart_cache(aj_config:AjConfig) -> file_cache.FileCache:
+    """ return cache of rendered charts, created on first use
+    """
+    global _charts      #pylint: disable=global-statement   #on purpose, cache is created once config is available
+    if _charts is None:
+        _charts = file_cache.FileCache(aj_config.chart_cache_dir, max_bytes=aj_config.chart_cache_max_mb * 1024 * 1024, suffix='.png')
+    return _charts
+
+
+def _chart_renderer() -> ProcessPoolExecutor:
+    """ return worker process rendering charts, started on first use
+        worker is spawned rather than forked, so that it does not inherit the state of the running event loop
+    """
+    global _renderer    #pylint: disable=global-statement   #on purpose, worker is started on first use
+    if _renderer is None:
+        _renderer = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+    return _renderer
+
+
+def stop_chart_renderer():
+    """ stop worker process rendering charts, if started
+    """
+    global _renderer    #pylint: disable=global-statement   #on purpose, worker is started on first use
+    if _renderer is not None:
+        _renderer.shutdown(wait=False, cancel_futures=True)
+        _renderer = None
+
+
+async def _render_chart(key:str, chart_type:str, data:dict) -> bytes:
+    """ return PNG content of a chart, from cache or rendered in worker process so that event loop is not blocked
+    """
+    global _renderer    #pylint: disable=global-statement   #on purpose, a dead worker is replaced at next rendering
+    with AjConfig() as aj_config:
+        png = _chart_cache(aj_config).get(key)
+        if png is None:
+            try:
+                png = await asyncio.get_running_loop().run_in_executor(_chart_renderer(), charts.render, chart_type, data)
+            except BrokenProcessPool:
+                _renderer = None
+                raise
+            _chart_cache(aj_config).put(key, png)
+        return png
+
+
+if __name__ == "__main__":
+    raise OtherException('This module is not meant to be executed directly.')
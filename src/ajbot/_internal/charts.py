@@ -0,0 +1,52 @@
+''' Attendance charts, rendered as PNG
+    Rendering only depends on plain chart data, so that it can run in a worker process:
+    this module shall stay light to import (no db, no discord).
+'''
+import io
+
+from matplotlib.figure import Figure
+
+from ajbot._internal.exceptions import OtherException
+
+PRESENCES = 'presences'     # presences per event of a season
+SUBSCRIBERS = 'cotisants'   # subscribers vs visitors per season
+
+_SIZE_INCH = (10, 5)
+_DPI = 100
+
+
+def _presences(fig:Figure, data:dict):
+    ax = fig.subplots()
+    ax.bar(data['labels'], data['values'], color='tab:blue')
+    ax.set_title(f"Présences par évènement - saison {data['season']}")
+    ax.set_ylabel('Présents')
+    ax.tick_params(axis='x', labelrotation=60, labelsize='small')
+
+
+def _subscribers(fig:Figure, data:dict):
+    ax = fig.subplots()
+    ax.bar(data['labels'], data['subscribers'], label='Cotisants', color='tab:green')
+    ax.bar(data['labels'], data['visitors'], bottom=data['subscribers'], label='Visiteurs', color='tab:orange')
+    ax.set_title('Participants par saison')
+    ax.set_ylabel('Participants')
+    ax.legend()
+
+
+_RENDERERS = {PRESENCES: _presences,
+              SUBSCRIBERS: _subscribers,
+             }
+
+
+def render(chart_type:str, data:dict) -> bytes:
+    ''' return PNG content of a chart
+        Figure is created without pyplot, so that no global state is shared between renderings
+    '''
+    fig = Figure(figsize=_SIZE_INCH, dpi=_DPI, layout='tight')
+    _RENDERERS[chart_type](fig, data)
+    with io.BytesIO() as png_file:
+        fig.savefig(png_file, format='png', metadata={'Software': None})
+        return png_file.getvalue()
+
+
+if __name__ == '__main__':
+    raise OtherException('This module is not meant to be executed directly.')
@@ -1,7 +1,7 @@
 ''' contains configuration variables
 '''
 import os
-from typing import Final
+from typing import Final, Optional
 import configparser
 from pathlib import Path
 from urllib.parse import quote_plus
@@ -28,6 +28,8 @@ _KEY_CREDS:Final[str] = "creds"
 
 _KEY_DISCORD:Final[str] = "discord"
 _KEY_GUILD:Final[str] = "guild"
+_KEY_DEFER_BUDGET_SEC:Final[str] = "defer_budget_sec"
+_KEY_REPORT_CHANNEL:Final[str] = "report_channel"
 _KEY_ROLES:Final[str] = "roles"
 _KEY_OWNERS:Final[str] = "owners"
 _KEY_MANAGERS:Final[str] = "managers"
@@ -40,6 +42,10 @@ _KEY_ASSO:Final[str] = "asso"
 _KEY_ROLE_RESET_TIME_DAYS:Final[str] = "role_reset_time_days"
 _KEY_ASSO_FREE_PRESENCE:Final[str] = "free_presence"
 
+_KEY_SCHEDULER:Final[str] = "scheduler"
+_KEY_JOBS:Final[str] = "jobs"
+_KEY_JOBS_STATE_FILE:Final[str] = "state_file"
+
 _KEY_DB:Final[str] = "db"
 _KEY_DB_HOST:Final[str] = "host"
 _KEY_DB_PORT:Final[str] = "port"
@@ -48,6 +54,14 @@ _KEY_DB_CREDS_PWD:Final[str]= "password"
 _KEY_DB_NAME:Final[str] = "db_name"
 _KEY_DB_ECHO:Final[str] = "db_echo"
 _KEY_CACHE_TIME_SEC:Final[str] = "db_cache_time_sec"
+_KEY_DB_CONNECT_TIMEOUT_SEC:Final[str] = "db_connect_timeout_sec"
+_KEY_CACHE_SNAPSHOT_FILE:Final[str] = "db_cache_snapshot_file"
+_KEY_WARM_UP_BUDGET_SEC:Final[str] = "db_warm_up_budget_sec"
+_KEY_SIGN_SHEET_CACHE_DIR:Final[str] = "sign_sheet_cache_dir"
+_KEY_SIGN_SHEET_CACHE_MAX_MB:Final[str] = "sign_sheet_cache_max_mb"
+_KEY_CHART_CACHE_DIR:Final[str] = "chart_cache_dir"
+_KEY_CHART_CACHE_MAX_MB:Final[str] = "chart_cache_max_mb"
+_KEY_CACHE_SNAPSHOT_PERIOD_SEC:Final[str] = "db_cache_snapshot_period_sec"
 
 @dataclass
 class FormatTypes():
@@ -197,6 +211,18 @@ class AjConfig():
         """
         return self._config_dict[_KEY_DISCORD].get(_KEY_GUILD)
 
+    @property
+    def discord_defer_budget_sec(self):
+        """ Returns from config the delay in seconds after which an interaction not yet answered is deferred.
+        """
+        return self._config_dict[_KEY_DISCORD].get(_KEY_DEFER_BUDGET_SEC)
+
+    @property
+    def discord_report_channel(self) -> Optional[int]:
+        """ Returns from config the ID of the channel where background jobs post their reports, None if not set.
+        """
+        return self._config_dict[_KEY_DISCORD].get(_KEY_REPORT_CHANNEL)
+
     @property
     def discord_owners(self):
         """ Returns from config the Discord roles IDs having owner attribute.
@@ -257,6 +283,19 @@ class AjConfig():
         """
         return self._config_dict[_KEY_ASSO][_KEY_ASSO_FREE_PRESENCE]
 
+    @property
+    def scheduler_jobs(self) -> dict[str, dict]:
+        """ Returns from config the schedule of background jobs, per job name.
+        """
+        return self._config_dict.get(_KEY_SCHEDULER, {}).get(_KEY_JOBS, {})
+
+    @property
+    def scheduler_state_file(self) -> Path:
+        """ Returns the path of the file keeping last run of background jobs (next to config file if not set).
+        """
+        file_path = self._config_dict.get(_KEY_SCHEDULER, {}).get(_KEY_JOBS_STATE_FILE)
+        return Path(file_path) if file_path else Path(self._file_path).with_name('ajbot_jobs.json')
+
     @property
     def db_creds(self):
         """ Returns the DB credentials from config as user, password tuple.
@@ -286,6 +325,57 @@ class AjConfig():
         """
         return self._config_dict[_KEY_DB][_KEY_CACHE_TIME_SEC]
 
+    @property
+    def sign_sheet_cache_dir(self) -> Path:
+        """ return the directory of generated sign sheets cache (next to config file if not set)
+        """
+        dir_path = self._config_dict[_KEY_DB].get(_KEY_SIGN_SHEET_CACHE_DIR)
+        return Path(dir_path) if dir_path else Path(self._file_path).with_name('sign_sheets')
+
+    @property
+    def sign_sheet_cache_max_mb(self):
+        """ return the max size in MB of generated sign sheets cache
+        """
+        return self._config_dict[_KEY_DB].get(_KEY_SIGN_SHEET_CACHE_MAX_MB, 50)
+
+    @property
+    def chart_cache_dir(self) -> Path:
+        """ return the directory of rendered charts cache (next to config file if not set)
+        """
+        dir_path = self._config_dict[_KEY_DB].get(_KEY_CHART_CACHE_DIR)
+        return Path(dir_path) if dir_path else Path(self._file_path).with_name('charts')
+
+    @property
+    def chart_cache_max_mb(self):
+        """ return the max size in MB of rendered charts cache
+        """
+        return self._config_dict[_KEY_DB].get(_KEY_CHART_CACHE_MAX_MB, 20)
+
+    @property
+    def db_warm_up_budget_sec(self):
+        """ return the max duration in seconds of cache warm-up
+        """
+        return self._config_dict[_KEY_DB].get(_KEY_WARM_UP_BUDGET_SEC, 30)
+
+    @property
+    def db_cache_snapshot_file(self) -> Path:
+        """ return the path of the cache snapshot file (next to config file if not set)
+        """
+        file_path = self._config_dict[_KEY_DB].get(_KEY_CACHE_SNAPSHOT_FILE)
+        return Path(file_path) if file_path else Path(self._file_path).with_name('ajdb_cache.snapshot')
+
+    @property
+    def db_cache_snapshot_period_sec(self):
+        """ return the period in seconds at which cache snapshot is saved
+        """
+        return self._config_dict[_KEY_DB].get(_KEY_CACHE_SNAPSHOT_PERIOD_SEC, 900)
+
+    @property
+    def db_connect_timeout_sec(self):
+        """ return the timeout in seconds to connect to the database
+        """
+        return self._config_dict[_KEY_DB].get(_KEY_DB_CONNECT_TIMEOUT_SEC, 5)
+
     @property
     def db_echo(self):
         """ return whether to echo the database queries
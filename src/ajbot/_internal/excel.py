@@ -0,0 +1,95 @@
+''' Streaming reader of excel tables
+'''
+import posixpath
+import zipfile
+from pathlib import Path
+from typing import Iterator
+
+from openpyxl import load_workbook
+from openpyxl.utils import range_boundaries
+from openpyxl.worksheet.table import Table
+from openpyxl.xml.functions import fromstring
+from vbrpytools.dicjsontools import merge_dict, create_nested_dict
+
+from ajbot._internal.exceptions import OtherException
+
+_NS_MAIN = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_NS_DOC_REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_NS_PKG_REL = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+_REL_TABLE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/table'
+
+
+class StreamingWorkbook():
+    ''' Excel file opened in read only mode: rows of a table are read one by one instead of loading the whole file,
+        so that memory does not depend on the file size.
+        Rows are the same as the ones of vbrpytools.exceltojson.ExcelWorkbook.dict_from_table.
+
+        Tables are not available in read only mode, so they are located from the file content.
+    '''
+    def __init__(self, filename:Path):
+        self._tables = self._read_tables(filename)
+        self._wb = load_workbook(filename=filename, read_only=True, data_only=True)
+
+    @staticmethod
+    def _read_tables(filename:Path) -> dict[str, tuple[str, Table]]:
+        ''' return sheet name and definition of each table, per table name
+        '''
+        def rels(archive:zipfile.ZipFile, part:str) -> dict[str, tuple[str, str]]:
+            rels_part = posixpath.join(posixpath.dirname(part), '_rels', posixpath.basename(part) + '.rels')
+            if rels_part not in archive.namelist():
+                return {}
+            return {rel.get('Id'): (rel.get('Type'), posixpath.normpath(posixpath.join(posixpath.dirname(part), rel.get('Target'))))
+                    for rel in fromstring(archive.read(rels_part)).iter(f'{_NS_PKG_REL}Relationship')}
+
+        tables = {}
+        with zipfile.ZipFile(filename) as archive:
+            workbook_rels = rels(archive, 'xl/workbook.xml')
+            for sheet in fromstring(archive.read('xl/workbook.xml')).iter(f'{_NS_MAIN}sheet'):
+                _, sheet_part = workbook_rels[sheet.get(f'{_NS_DOC_REL}id')]
+                for rel_type, table_part in rels(archive, sheet_part).values():
+                    if rel_type == _REL_TABLE:
+                        table = Table.from_tree(fromstring(archive.read(table_part)))
+                        tables[table.name] = tables[table.displayName] = (sheet.get('name'), table)
+        return tables
+
+    def location(self, table_name:str) -> tuple[str, int]:
+        ''' return sheet name and sheet row number of the first row of an excel table
+        '''
+        sheet_name, table = self._tables[table_name]
+        _, min_row, _, _ = range_boundaries(table.ref)
+        return sheet_name, min_row + 1
+
+    def iter_table(self, table_name:str, nested:bool=True, with_ignored:bool=False) -> Iterator[dict]:
+        ''' yield a dictionary per row of an excel table, see ExcelWorkbook.dict_from_table
+        '''
+        sheet_name, table = self._tables[table_name]
+        min_col, min_row, max_col, max_row = range_boundaries(table.ref)
+        column_names = [column.name for column in table.tableColumns]
+        #skip first row which is the header
+        for row in self._wb[sheet_name].iter_rows(min_row=min_row + 1, max_row=max_row,
+                                                  min_col=min_col, max_col=max_col, values_only=True):
+            entry = {}
+            for name, cell_value in zip(column_names, row):
+                if cell_value is None or cell_value == '' or (name[0] == '#' and not with_ignored):
+                    continue
+                multivalue = name[0] == '[' and name[-1] == ']'
+                if multivalue:
+                    name = name[1:-1]
+                    cell_value = [cell_value] if str(cell_value).isnumeric() else str(cell_value).split(';')
+                entry = merge_dict(entry, create_nested_dict(name.split('.') if nested else [name], cell_value))
+            yield entry
+
+    def close(self):
+        ''' close the file
+        '''
+        self._wb.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+if __name__ == '__main__':
+    raise OtherException('This module is not meant to be executed directly.')
@@ -16,6 +16,11 @@ class AjDate(datetime.date):
 
         return super().__new__(cls, indate.year, indate.month, indate.day, *args, **kwargs)
 
+    def __reduce__(self):
+        """ pickle support: date default one passes a bytes state to __new__
+        """
+        return (self.__class__, (datetime.date(self.year, self.month, self.day),))
+
     def __str__(self):
         return f"{self}"
 
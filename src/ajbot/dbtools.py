@@ -0,0 +1,251 @@
+""" Dump db content to a file, or restore it from a file
+    Export attendance & membership history for offline analysis
+"""
+import sys
+import asyncio
+import json
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+import sqlalchemy as sa
+
+from ajbot._internal.config import AjConfig
+from ajbot._internal.ajdb import AjDb, tables as db_t
+
+
+async def dump(dump_file:Path, config_file:Optional[Path]=None) -> dict[str, int]:
+    """ save db content in dump_file
+        @return
+            number of rows per table
+    """
+    with AjConfig(file_path=config_file) as aj_config:
+        async with AjDb(aj_config=aj_config, read_only=True) as aj_db:
+            return await aj_db.dump(dump_file)
+
+
+async def restore(dump_file:Path, config_file:Optional[Path]=None) -> dict[str, int]:
+    """ recreate db from dump_file, then update config roles as migration does
+        @return
+            number of rows per table
+    """
+    with AjConfig(file_path=config_file, save_on_exit=True) as aj_config:
+        async with AjDb(aj_config=aj_config) as aj_db:
+            counts = await aj_db.restore(dump_file)
+            await aj_config.udpate_roles(aj_db=aj_db)
+    return counts
+
+
+# History export
+# ==============
+_EXPORT_FORMAT = 1
+_MANIFEST_FILE = 'manifest.json'
+# column type of dictionary encoded strings: codes are stored, labels being in the manifest
+CATEGORY = 'category'
+
+
+@dataclass(frozen=True)
+class _Dataset():
+    """ exported dataset
+        query: query of the dataset columns, ordered by id (first column), given the last id already exported
+        dtypes: numpy type (or CATEGORY) of each column, integer nulls being stored as -1
+        incremental: if True, only rows with an id above the last exported one are appended,
+                     otherwise dataset is rewritten at each export (small dimension tables)
+    """
+    query: Callable[[int], sa.Select]
+    dtypes: dict[str, str]
+    incremental: bool = True
+
+
+_DATASETS = {
+    'seasons': _Dataset(lambda _: sa.select(db_t.Season.id, db_t.Season.name, db_t.Season.start, db_t.Season.end)
+                                    .order_by(db_t.Season.id),
+                        {'id': 'int32', 'name': CATEGORY, 'start': 'datetime64[D]', 'end': 'datetime64[D]'},
+                        incremental=False),
+    # no personal data
+    'members': _Dataset(lambda _: sa.select(db_t.Member.id, db_t.Member.discord.is_not(None))
+                                    .order_by(db_t.Member.id),
+                        {'id': 'int32', 'has_discord': 'bool'},
+                        incremental=False),
+    'events': _Dataset(lambda last_id: sa.select(db_t.Event.id, db_t.Event.date, db_t.Event.season_id, db_t.Event.name)
+                                         .where(db_t.Event.id > last_id).order_by(db_t.Event.id),
+                       {'id': 'int32', 'date': 'datetime64[D]', 'season_id': 'int32', 'name': CATEGORY}),
+    'presences': _Dataset(lambda last_id: sa.select(db_t.MemberEvent.id, db_t.MemberEvent.event_id,
+                                                    db_t.MemberEvent.member_id, db_t.MemberEvent.presence)
+                                            .where(db_t.MemberEvent.id > last_id).order_by(db_t.MemberEvent.id),
+                          {'id': 'int32', 'event_id': 'int32', 'member_id': 'int32', 'presence': 'bool'}),
+    'memberships': _Dataset(lambda last_id: sa.select(db_t.Membership.id, db_t.Membership.member_id, db_t.Membership.season_id,
+                                                      db_t.Membership.date, db_t.ContributionType.name, db_t.KnowFromSource.name)
+                                              .join(db_t.Membership.contribution_type).outerjoin(db_t.Membership.know_from_source)
+                                              .where(db_t.Membership.id > last_id).order_by(db_t.Membership.id),
+                            {'id': 'int32', 'member_id': 'int32', 'season_id': 'int32', 'date': 'datetime64[D]',
+                             'contribution_type': CATEGORY, 'know_from_source': CATEGORY}),
+}
+
+
+def _to_array(values:list, dtype:str, labels:list[str]) -> np.ndarray:
+    """ convert column values to a numpy array
+        labels: known labels of a CATEGORY column, new ones being appended, so that codes are stable between exports
+    """
+    if dtype == CATEGORY:
+        codes = {label: code for code, label in enumerate(labels)}
+        for value in values:
+            if value is not None and value not in codes:
+                codes[value] = len(labels)
+                labels.append(value)
+        return np.array([-1 if value is None else codes[value] for value in values], dtype='int32')
+    if np.dtype(dtype).kind == 'i':
+        return np.array([-1 if value is None else value for value in values], dtype=dtype)
+    return np.array(values, dtype=dtype)
+
+
+def _append_npy(file_path:Path, values:np.ndarray) -> int:
+    """ append values to a 1-D .npy file, created if missing
+        numpy reserves room in the header for the growth of the first axis, so it is rewritten in place.
+        @return
+            number of values in file
+    """
+    if not file_path.exists():
+        np.save(file_path, values)
+        return len(values)
+    with open(file_path, 'r+b') as f:
+        version = np.lib.format.read_magic(f)
+        shape, fortran_order, dtype = (np.lib.format.read_array_header_1_0(f) if version == (1, 0)
+                                       else np.lib.format.read_array_header_2_0(f))
+        header_size = f.tell()
+        assert len(shape) == 1 and not fortran_order and dtype == values.dtype, f"{file_path}: format incompatible"
+        f.seek(0, 2)
+        f.write(values.tobytes())
+        f.seek(0)
+        header = {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': (shape[0] + len(values),)}
+        if version == (1, 0):
+            np.lib.format.write_array_header_1_0(f, header)
+        else:
+            np.lib.format.write_array_header_2_0(f, header)
+        assert f.tell() == header_size, f"{file_path}: header size changed"
+    return shape[0] + len(values)
+
+
+def _read_manifest(directory:Path) -> Optional[dict]:
+    """ return manifest of an export, None if missing or saved by another version / table definition
+    """
+    try:
+        manifest = json.loads((directory / _MANIFEST_FILE).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+    if manifest.get('format') != _EXPORT_FORMAT or manifest.get('schema') != AjDb.schema_digest():
+        return None
+    return manifest
+
+
+async def _is_consistent(aj_db:AjDb, directory:Path, manifest:dict) -> bool:
+    """ True if new rows can be appended to an export: its files match its manifest, no exported id is above
+        the ones in db (which happens if db has been recreated since), and no exported row has been deleted since
+        (e.g. presences of an updated event, which are deleted and inserted again)
+    """
+    for name, dataset in _DATASETS.items():
+        exported = manifest['datasets'].get(name)
+        if exported is None:
+            return False
+        try:
+            if any(len(np.load(directory / f"{name}.{column}.npy", mmap_mode='r')) != exported['rows'] for column in dataset.dtypes):
+                return False
+        except (OSError, ValueError):
+            return False
+        id_column = dataset.query(0).selected_columns[0]
+        max_id = [chunk async for chunk in aj_db.stream_columns(sa.select(sa.func.max(id_column)))][0][0][0]
+        if (max_id or 0) < exported['last_id']:
+            return False
+        if dataset.incremental:
+            exported_rows = dataset.query(0).where(id_column <= exported['last_id']).subquery()
+            count = [chunk async for chunk in aj_db.stream_columns(sa.select(sa.func.count()).select_from(exported_rows))][0][0][0]
+            if count != exported['rows']:
+                return False
+    return True
+
+
+async def export_history(directory:Path, full:bool=False, config_file:Optional[Path]=None) -> dict[str, int]:
+    """ export attendance & membership history as memory mappable numpy arrays, one .npy file per dataset column,
+        described by a manifest (row counts, last exported ids, labels of dictionary encoded columns).
+        Only rows added since previous export are appended, unless full is True or previous export is not consistent
+        with db (other table definitions, db recreated since, exported rows deleted since).
+        Export is read from one consistent snapshot. In place updates of exported rows need a full export.
+        @return
+            number of rows exported per dataset
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    manifest = None if full else _read_manifest(directory)
+    with AjConfig(file_path=config_file) as aj_config:
+        async with AjDb(aj_config=aj_config, read_only=True) as aj_db, aj_db.consistent_snapshot():
+            if manifest is not None and not await _is_consistent(aj_db, directory, manifest):
+                manifest = None
+            if manifest is None:
+                for file_path in directory.glob('*.npy'):
+                    file_path.unlink()
+                manifest = {'format': _EXPORT_FORMAT, 'schema': AjDb.schema_digest(), 'datasets': {}, 'categories': {}}
+
+            counts = {}
+            for name, dataset in _DATASETS.items():
+                exported = manifest['datasets'].setdefault(name, {'rows': 0, 'last_id': 0})
+                if not dataset.incremental:
+                    exported.update(rows=0, last_id=0)
+                    for column in dataset.dtypes:
+                        (directory / f"{name}.{column}.npy").unlink(missing_ok=True)
+                counts[name] = 0
+                async for chunk in aj_db.stream_columns(dataset.query(exported['last_id'])):
+                    for (column, dtype), values in zip(dataset.dtypes.items(), chunk):
+                        labels = manifest['categories'].setdefault(f"{name}.{column}", []) if dtype == CATEGORY else []
+                        rows = _append_npy(directory / f"{name}.{column}.npy", _to_array(values, dtype, labels))
+                    exported.update(rows=rows, last_id=int(chunk[0][-1]))
+                    counts[name] += len(chunk[0])
+                for column, dtype in dataset.dtypes.items():
+                    if not (directory / f"{name}.{column}.npy").exists():
+                        np.save(directory / f"{name}.{column}.npy", _to_array([], dtype, []))
+                exported['columns'] = dataset.dtypes
+
+    # manifest is written last: after an interrupted export, files do not match it, so next export is a full one
+    manifest['exported'] = datetime.now().isoformat()
+    tmp_path = directory / (_MANIFEST_FILE + '.tmp')
+    tmp_path.write_text(json.dumps(manifest, indent=4, ensure_ascii=False), encoding='utf-8')
+    tmp_path.replace(directory / _MANIFEST_FILE)
+    return counts
+
+
+def load_history(directory:Path) -> tuple[dict[str, dict[str, np.ndarray]], dict[str, list[str]]]:
+    """ load an export made by export_history, arrays being memory mapped
+        @return
+            (arrays per column per dataset, labels of dictionary encoded columns per "dataset.column")
+    """
+    manifest = _read_manifest(directory)
+    if manifest is None:
+        raise FileNotFoundError(f"Aucun export valide dans {directory}")
+    datasets = {name: {column: np.load(directory / f"{name}.{column}.npy", mmap_mode='r')[:exported['rows']]
+                       for column in exported['columns']}
+                for name, exported in manifest['datasets'].items()}
+    return datasets, manifest['categories']
+
+
+def _main():
+    # aj_db dump|restore <file>
+    # aj_db export <directory> [--full]
+    if len(sys.argv) < 3 or sys.argv[1] not in ('dump', 'restore', 'export'):
+        print("Usage: aj_db dump|restore <file> | aj_db export <directory> [--full]")
+        return 1
+    command, file_path = sys.argv[1], Path(sys.argv[2])
+    start = time.perf_counter()
+    if command == 'export':
+        counts = asyncio.run(export_history(file_path, full='--full' in sys.argv[3:]))
+    else:
+        counts = asyncio.run(dump(file_path) if command == 'dump' else restore(file_path))
+    duration = time.perf_counter() - start
+    for table, count in counts.items():
+        print(f"  {table:<25}{count:8d} rows")
+    print(f"{command.capitalize()} of {sum(counts.values())} rows done in {duration:.2f}s.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_main())
@@ -2,48 +2,450 @@
 """
 import sys
 import asyncio
-from datetime import datetime
-from typing import cast, Optional
+import threading
+import time
+from bisect import bisect_right
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, date
+from typing import cast, Any, AsyncIterator, Callable, Hashable, Literal, Optional
 from pathlib import Path
 
-from vbrpytools.exceltojson import ExcelWorkbook
+import sqlalchemy as sa
+from sqlalchemy import orm
+from ajbot._internal.excel import StreamingWorkbook
 from ajbot._internal.types import AjDate, AjMemberId, DiscordId
 from ajbot._internal.config import AjConfig
 from ajbot._internal.ajdb import AjDb , tables as db_t
 
+class _SeasonIndex():
+    """ seasons sorted by start date, to find season of a date
+    """
+    def __init__(self, tables:list):
+        self._seasons = sorted((elt for elt in tables if isinstance(elt, db_t.Season)), key=lambda s: s.start)
+        self._starts = [s.start for s in self._seasons]
+
+    def __getitem__(self, day:date) -> db_t.Season:
+        i = bisect_right(self._starts, day) - 1
+        if i < 0 or day > self._seasons[i].end:
+            raise KeyError(f"Aucune saison ne contient le {day}")
+        return self._seasons[i]
+
+
+@contextmanager
+def _timed_phase(timings:dict[str, float], phase:str):
+    """ record duration of a migration phase
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[phase] = time.perf_counter() - start
+
+
+MigrationMode = Literal['bulk', 'orm', 'sync', 'check']
+
+
+@dataclass(frozen=True)
+class _SyncSpec():
+    """ how rows of a table are synchronized with the workbook
+        key: natural key of a row. Foreign keys of workbook rows are db ids (see _Writer), so keys can use them.
+        fields: columns copied from workbook rows
+        refs: relationships to rows created together with the workbook row (see _Writer.add), resolved through their natural key
+        delete: if True, db rows missing from the workbook are deleted when pruning (see _Writer), otherwise they are always kept
+    """
+    table: type
+    key: Callable[[Any], Hashable]
+    fields: tuple[str, ...] = ()
+    refs: tuple[str, ...] = ()
+    delete: bool = False
+
+
+# in dependency order. Roles, phones & addresses are not synchronized: they are managed in the bot once migrated.
+_SYNC_SPECS = (
+    _SyncSpec(db_t.ContributionType, lambda r: r.name),
+    _SyncSpec(db_t.KnowFromSource, lambda r: r.name),
+    _SyncSpec(db_t.AccountType, lambda r: r.name),
+    _SyncSpec(db_t.StreetType, lambda r: r.name),
+    _SyncSpec(db_t.Season, lambda r: r.name, fields=('start', 'end')),
+    _SyncSpec(db_t.Member, lambda r: int(r.id), fields=('id', 'discord')),
+    _SyncSpec(db_t.Credential, lambda r: int(r.member.id) if r.member else None,
+              fields=('first_name', 'last_name', 'birthdate'), refs=('member',)),
+    _SyncSpec(db_t.Email, lambda r: r.address, fields=('address',)),
+    _SyncSpec(db_t.MemberEmail, lambda r: (int(r.member_id), r.email_id),
+              fields=('member_id', 'email_id', 'principal'), delete=True),
+    _SyncSpec(db_t.Event, lambda r: r.date, fields=('date', 'name', 'season_id'), delete=True),
+    _SyncSpec(db_t.Membership, lambda r: (r.season_id, int(r.member_id)),
+              fields=('date', 'statutes_accepted', 'has_civil_insurance', 'picture_authorized',
+                      'season_id', 'member_id', 'contribution_type_id', 'know_from_source_id'), delete=True),
+    _SyncSpec(db_t.MemberEvent, lambda r: (r.event_id, int(r.member_id) if r.member_id is not None else None),
+              fields=('presence', 'comment', 'event_id', 'member_id'), delete=True),
+)
+
+
+class _SyncTable():
+    """ db rows of a synchronized table per natural key, matched with workbook rows as they are read
+    """
+    def __init__(self, spec:_SyncSpec, db_rows:list):
+        self.spec = spec
+        self.changes = {'ajouts': 0, 'modifications': 0, 'suppressions': 0, 'conservés': 0}
+        self._db_per_key:dict[Hashable, list] = {}
+        for row in db_rows:
+            self._db_per_key.setdefault(spec.key(row), []).append(row)
+
+    def match(self, wb_row) -> Optional[Any]:
+        """ return db row having the natural key of a workbook row, None if there is none.
+            Rows sharing a key are matched in order, so that duplicated keys (e.g. presences without member) are counted.
+        """
+        candidates = self._db_per_key.get(self.spec.key(wb_row))
+        return candidates.pop(0) if candidates else None
+
+    def missing(self) -> list:
+        """ return db rows not matched by any workbook row
+        """
+        return [row for rows in self._db_per_key.values() for row in rows]
+
+
+def _field_value(row, field:str):
+    """ return value of a column of a workbook row, column default being used for unset value
+    """
+    value = getattr(row, field)
+    if value is None:
+        default = orm.object_mapper(row).columns[field].default
+        if default is not None and default.is_scalar:
+            value = default.arg
+    return value
+
+
+def _copy_row(spec:_SyncSpec, wb_row, db_row, resolved:dict[int, Any]) -> bool:
+    """ copy fields & relationships of a workbook row to a db row
+        resolved: db row matching each workbook row already synchronized, per id() of the workbook row
+        @return
+            True if db row has been modified
+    """
+    modified = False
+    for field in spec.fields:
+        value = _field_value(wb_row, field)
+        if getattr(db_row, field) != value:
+            setattr(db_row, field, value)
+            modified = True
+    for ref in spec.refs:
+        related = getattr(wb_row, ref)
+        value = None if related is None else resolved[id(related)]
+        if getattr(db_row, ref) is not value:
+            setattr(db_row, ref, value)
+            modified = True
+    return modified
+
+
+_READ_QUEUE_SIZE = 200
+_WRITE_BATCH_SIZE = 500
+_END_OF_TABLE = object()
+
+
+async def _stream_table(ajdb_xls:StreamingWorkbook, table_name:str) -> AsyncIterator[dict]:
+    """ read stage: rows of a table are read in a thread and passed through a bounded queue,
+        so that reading goes on while previous rows are transformed & written, without holding the whole table
+    """
+    loop = asyncio.get_running_loop()
+    rows:asyncio.Queue = asyncio.Queue(maxsize=_READ_QUEUE_SIZE)
+    stop = threading.Event()
+
+    def read():
+        item = _END_OF_TABLE
+        try:
+            for row in ajdb_xls.iter_table(table_name):
+                if stop.is_set():
+                    return
+                asyncio.run_coroutine_threadsafe(rows.put(row), loop).result()
+        except Exception as e:     #pylint: disable=broad-exception-caught   #exception is forwarded to the reading coroutine
+            item = e
+        asyncio.run_coroutine_threadsafe(rows.put(item), loop).result()
+
+    reader = asyncio.ensure_future(asyncio.to_thread(read))
+    try:
+        while (row := await rows.get()) is not _END_OF_TABLE:
+            if isinstance(row, Exception):
+                raise row
+            yield row
+    finally:
+        # unblock reader if rows are no more consumed
+        stop.set()
+        while not reader.done():
+            while not rows.empty():
+                rows.get_nowait()
+            await asyncio.wait([reader], timeout=0.01)
+
+
+class _Writer():
+    """ write stage of a migration phase: rows are written as they are transformed, by batches of _WRITE_BATCH_SIZE,
+        so that db writes overlap with the reading of next rows (see _stream_table) and rows are not kept once written.
+        Primary keys are assigned when a row is added (see AjDb.assign_ids), so next rows reference it by id only,
+        rows being only linked through relationships to rows created with them (e.g. member credential).
+        - bulk mode: batches are inserted with multi-row inserts (see AjDb.bulk_insert), committed with the db session
+        - orm mode: rows are added to the phase session through the ORM unit of work. Phase is committed at the end.
+        - sync mode: each row is applied to the db row having same natural key (see _SYNC_SPECS) in the given session.
+          db rows missing from the workbook are kept and reported, unless pruning, as they may have been recorded in the bot
+    """
+    def __init__(self, aj_db:AjDb, mode:MigrationMode, report:dict, tables:tuple[type, ...]=(), session=None, prune:bool=False):
+        """ @args
+                report: updated with the number of rows written per table, or the changeset in sync mode
+                tables: tables written by the phase, for sync mode
+                session: sync mode session, committed by the caller
+                prune: in sync mode, delete db rows missing from the workbook at the end of the phase (see _SyncSpec.delete)
+        """
+        self._aj_db = aj_db
+        self._mode = mode
+        self._report = report
+        self._tables = tables
+        self._session = session
+        self._prune = prune
+        self._sync_tables:dict[type, _SyncTable] = {}
+        self._batch = []
+
+    async def __aenter__(self):
+        if self._mode == 'orm':
+            self._session = self._aj_db._AsyncSessionMaker()   # pylint: disable=protected-access  # accessing protected member on purpose
+        if self._mode == 'sync':
+            for spec in _SYNC_SPECS:
+                if spec.table in self._tables:
+                    sync_table = self._sync_tables[spec.table] = _SyncTable(spec, (await self._session.scalars(sa.select(spec.table))).all())
+                    self._report[spec.table.__tablename__] = sync_table.changes
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if self._mode != 'orm':
+            if exc_type is None:
+                await self._write_batch()
+                await self._delete_missing()
+            return
+        try:
+            if exc_type is None:
+                await self._write_batch()
+                await self._session.commit()
+            else:
+                await self._session.rollback()
+        finally:
+            await self._session.close()
+
+    async def add(self, row):
+        """ write a row (and rows created with it) once it is complete
+            @return
+                row to be referenced by next rows: the db row matching it in sync mode, the row itself otherwise
+        """
+        if self._mode == 'sync':
+            row = await self._sync_row(row)
+        else:
+            for written in await self._aj_db.assign_ids([row]):
+                table_name = orm.object_mapper(written).local_table.name
+                self._report[table_name] = self._report.get(table_name, 0) + 1
+            if self._mode == 'orm':
+                self._session.add(row)
+            self._batch.append(row)
+        if len(self._batch) >= _WRITE_BATCH_SIZE:
+            await self._write_batch()
+        return row
+
+    async def _sync_row(self, wb_row):
+        """ apply a workbook row (and rows created with it) to the db rows having same natural key
+            @return
+                db row matching the workbook row, or workbook row itself if its table is not synchronized
+        """
+        resolved:dict[int, Any] = {}
+        # rows created with a row reference it (e.g. member credential), so they are synchronized after it
+        for row in AjDb._object_graph([wb_row]):      # pylint: disable=protected-access  # accessing protected member on purpose
+            sync_table = self._sync_tables.get(type(row))
+            if sync_table is None:
+                resolved[id(row)] = row
+                continue
+            db_row = sync_table.match(row)
+            if db_row is None:
+                db_row = sync_table.spec.table()
+                _copy_row(sync_table.spec, row, db_row, resolved)
+                await self._aj_db.assign_ids([db_row])
+                self._session.add(db_row)
+                sync_table.changes['ajouts'] += 1
+            elif _copy_row(sync_table.spec, row, db_row, resolved):
+                sync_table.changes['modifications'] += 1
+            resolved[id(row)] = db_row
+            self._batch.append(db_row)
+        return resolved[id(wb_row)]
+
+    async def _write_batch(self):
+        """ write rows added since previous batch
+        """
+        if self._mode == 'bulk':
+            if self._batch:
+                await self._aj_db.bulk_insert(self._batch)
+        elif self._session is not None:
+            await self._session.flush()
+        self._batch = []
+
+    async def _delete_missing(self):
+        """ delete db rows of synchronized tables missing from the workbook when pruning, children first
+        """
+        for sync_table in reversed(self._sync_tables.values()):
+            missing = sync_table.missing()
+            if not (self._prune and sync_table.spec.delete):
+                sync_table.changes['conservés'] = len(missing)
+                continue
+            for i, db_row in enumerate(missing, start=1):
+                await self._session.delete(db_row)
+                if i % _WRITE_BATCH_SIZE == 0:
+                    await self._session.flush()
+            sync_table.changes['suppressions'] = len(missing)
+            await self._session.flush()
+
+
+def _validate(ajdb_xls:StreamingWorkbook) -> list[str]:
+    """ pre-flight check of the workbook: every reference used by the migration shall resolve,
+        so that migration does not stop half way once the schema has been dropped
+        @return
+            problems found, with sheet & row coordinates, empty if the workbook can be migrated
+    """
+    problems = []
+
+    def rows(table_name:str):
+        sheet_name, first_row = ajdb_xls.location(table_name)
+        for row_num, val in enumerate(ajdb_xls.iter_table(table_name), start=first_row):
+            def problem(message:str, row_num=row_num):
+                problems.append(f"'{sheet_name}'!{row_num} ({table_name}): {message}")
+            yield val, problem
+
+    def names(table_name:str, key:str='val') -> set:
+        values = set()
+        for val, problem in rows(table_name):
+            if val.get(key) is None:
+                problem(f"'{key}' missing")
+            elif val[key] in values:
+                problem(f"'{val[key]}' duplicated")
+            values.add(val.get(key))
+        return values
+
+    seasons = []
+    season_names = set()
+    for val, problem in rows('saisons'):
+        if val.get('nom') is None or val['nom'] in season_names:
+            problem(f"season name '{val.get('nom')}' missing or duplicated")
+        season_names.add(val.get('nom'))
+        if not (isinstance(val.get('debut'), datetime) and isinstance(val.get('fin'), datetime)):
+            problem(f"season '{val.get('nom')}' has no valid start & end dates")
+        elif val['fin'] < val['debut']:
+            problem(f"season '{val.get('nom')}' ends before it starts")
+        else:
+            seasons.append(db_t.Season(name=val['nom'], start=val['debut'].date(), end=val['fin'].date()))
+    season_of_date = _SeasonIndex(seasons)
+    contribution_types = names('contribution')
+    know_from_sources = names('connaissance')
+    names('compte')
+    street_types = names('type_voie')
+    discord_roles = names('discord_role')
+    asso_roles = set()
+    for val, problem in rows('roles'):
+        if val.get('asso') is None or val['asso'] in asso_roles:
+            problem(f"asso role '{val.get('asso')}' missing or duplicated")
+        asso_roles.add(val.get('asso'))
+        for d_role in val['discord'].split(',') if val.get('discord') else []:
+            if d_role not in discord_roles:
+                problem(f"unknown discord role '{d_role}'")
+
+    members = set()
+    for val, problem in rows('annuaire'):
+        if not isinstance(val.get('creation', {}).get('date'), datetime):
+            continue
+        if not isinstance(val.get('id'), int) or val['id'] in members:
+            problem(f"member id '{val.get('id')}' invalid or duplicated")
+        members.add(val.get('id'))
+        if val.get('date_naissance') and not isinstance(val['date_naissance'], datetime):
+            problem(f"invalid birth date '{val['date_naissance']}'")
+        if val.get('telephone') and not isinstance(val['telephone'], int):
+            problem(f"invalid phone number '{val['telephone']}'")
+        if val.get('adresse'):
+            if not val['adresse'].get('ville'):
+                problem("address without city")
+            if val['adresse'].get('type_voie') and val['adresse']['type_voie'] not in street_types:
+                problem(f"unknown street type '{val['adresse']['type_voie']}'")
+
+    active_asso_roles:dict[int, set[str]] = {}
+    for val, problem in rows('suivi'):
+        category = val.get('entree', {}).get('categorie')
+        detail = val.get('entree', {}).get('detail')
+        member = val.get('membre', {})
+        if not isinstance(val.get('date'), datetime):
+            problem(f"invalid date '{val.get('date')}'")
+            continue
+        is_membership = category == 'Cotisation'
+        is_event = category == 'Présence' or (category == 'Evènement' and detail in (None, 'Vote par pouvoir'))
+        is_asso_role = category == 'Info Membre' and member.get('asso_role')
+        if is_membership and not member:
+            problem("membership without member")
+        elif (is_membership or is_event or is_asso_role) and member and member.get('id') not in members:
+            problem(f"unknown member '{member.get('id')}'")
+        if is_membership:
+            if val['entree'].get('nom') not in season_names:
+                problem(f"unknown season '{val['entree'].get('nom')}'")
+            if val.get('cotisation') not in contribution_types:
+                problem(f"unknown contribution type '{val.get('cotisation')}'")
+            if member.get('source_connaissance') and member['source_connaissance'] not in know_from_sources:
+                problem(f"unknown source '{member['source_connaissance']}'")
+        if is_event:
+            try:
+                season_of_date[val['date'].date()]
+            except KeyError:
+                problem(f"no season contains {val['date'].date()}")
+        if is_asso_role:
+            if member['asso_role'] not in asso_roles:
+                problem(f"unknown asso role '{member['asso_role']}'")
+            if detail and not isinstance(detail, datetime):
+                problem(f"invalid asso role end date '{detail}'")
+            # same rule as migration: a member cannot get a new asso role while having several active ones
+            roles = active_asso_roles.setdefault(member.get('id'), set())
+            if len(roles) > 1:
+                problem(f"several active asso roles for member '{member.get('id')}': {', '.join(sorted(roles))}")
+            elif not detail:
+                roles.add(member['asso_role'])
+    return problems
+
+
 async def _create_db_schema(aj_db:AjDb):
     """ Drop and recreate db schema
     """
     await aj_db.drop_create_schema()
 
 
-async def _populate_lut_role_tables(aj_db:AjDb, ajdb_xls:ExcelWorkbook):
+async def _populate_lut_role_tables(writer:_Writer, ajdb_xls:StreamingWorkbook) -> tuple[dict[type, dict[str, Any]], _SeasonIndex]:
     """ Populate lookup & role tables
+        @return
+            id per name of lookup & role table rows, seasons per date
     """
     print(">>  Populating lookup & role tables...")
 
-    lut_role_tables = []
-    for val in ajdb_xls.dict_from_table('saisons'):
-        lut_role_tables.append(db_t.Season(name=val['nom'],
-                                      start=cast(AjDate, val['debut']).date(),
-                                      end=cast(AjDate, val['fin']).date()),
-                                    )
-    for val in ajdb_xls.dict_from_table('contribution'):
-        lut_role_tables.append(db_t.ContributionType(name=val['val']))
-    for val in ajdb_xls.dict_from_table('connaissance'):
-        lut_role_tables.append(db_t.KnowFromSource(name=val['val']))
-    for val in ajdb_xls.dict_from_table('compte'):
-        lut_role_tables.append(db_t.AccountType(name=val['val']))
-    for val in ajdb_xls.dict_from_table('type_voie'):
-        lut_role_tables.append(db_t.StreetType(name=val['val']))
-
-    for val in ajdb_xls.dict_from_table('discord_role'):
-        new_discord_role = db_t.DiscordRole(name=val['val'],
-                                             id=DiscordId(val['id']),)
-        lut_role_tables.append(new_discord_role)
-    for val in ajdb_xls.dict_from_table('roles'):
+    lut_ids:dict[type, dict[str, Any]] = {}
+    async def add_named(row):
+        row = await writer.add(row)
+        lut_ids.setdefault(type(row), {})[row.name] = row.id
+        return row
+
+    seasons = []
+    async for val in _stream_table(ajdb_xls, 'saisons'):
+        seasons.append(await add_named(db_t.Season(name=val['nom'],
+                                                   start=cast(AjDate, val['debut']).date(),
+                                                   end=cast(AjDate, val['fin']).date()),
+                                       ))
+    async for val in _stream_table(ajdb_xls, 'contribution'):
+        await add_named(db_t.ContributionType(name=val['val']))
+    async for val in _stream_table(ajdb_xls, 'connaissance'):
+        await add_named(db_t.KnowFromSource(name=val['val']))
+    async for val in _stream_table(ajdb_xls, 'compte'):
+        await add_named(db_t.AccountType(name=val['val']))
+    async for val in _stream_table(ajdb_xls, 'type_voie'):
+        await add_named(db_t.StreetType(name=val['val']))
+
+    async for val in _stream_table(ajdb_xls, 'discord_role'):
+        await add_named(db_t.DiscordRole(name=val['val'],
+                                         id=DiscordId(val['id']),))
+    async for val in _stream_table(ajdb_xls, 'roles'):
         new_asso_role = db_t.AssoRole(name=val['asso'])
-        lut_role_tables.append(new_asso_role)
 
         if val.get('is_member') is not None:
             new_asso_role.is_member=bool(val.get('is_member'))
@@ -56,41 +458,37 @@ async def _populate_lut_role_tables(aj_db:AjDb, ajdb_xls:ExcelWorkbook):
         if val.get('is_owner') is not None:
             new_asso_role.is_owner=bool(val.get('is_owner'))
 
-    async with aj_db._AsyncSessionMaker() as session:   # pylint: disable=protected-access  # accessing protected member on purpose
-        async with session.begin():
-            session.add_all(lut_role_tables)
+        await add_named(new_asso_role)
 
 
-    role_mapping_tables = []
-    for val in ajdb_xls.dict_from_table('roles'):
-        [asso_role] = [i for i in lut_role_tables
-                        if isinstance(i, db_t.AssoRole) and i.name == val['asso']]
+    asso_roles = lut_ids.get(db_t.AssoRole, {})
+    discord_roles = lut_ids.get(db_t.DiscordRole, {})
+    async for val in _stream_table(ajdb_xls, 'roles'):
         if val.get('discord'):
             for d_role in val['discord'].split(','):
-                [matched_discord_role] = [elt for elt in lut_role_tables
-                                if isinstance(elt, db_t.DiscordRole) and elt.name == d_role]
-                role_mapping_tables.append(db_t.AssoRoleDiscordRole(asso_role_id=asso_role.id,
-                                                                    discord_role_id=matched_discord_role.id,
-                                                                   )
-                                         )
-
-    async with aj_db._AsyncSessionMaker() as session:   # pylint: disable=protected-access  # accessing protected member on purpose
-        async with session.begin():
-            session.add_all(role_mapping_tables)
+                await writer.add(db_t.AssoRoleDiscordRole(asso_role_id=asso_roles[val['asso']],
+                                                          discord_role_id=discord_roles[d_role],
+                                                         )
+                                )
 
-    return lut_role_tables + role_mapping_tables
+    return lut_ids, _SeasonIndex(seasons)
 
 
-async def _populate_member_tables(aj_db:AjDb, ajdb_xls:ExcelWorkbook, lut_tables):
+async def _populate_member_tables(writer:_Writer, ajdb_xls:StreamingWorkbook, lut_ids:dict[type, dict[str, Any]]) -> set[AjMemberId]:
     """ Populate member tables
+        @return
+            ids of members
     """
     print(">>  Populating member tables...")
-    member_tables = []
-    for val in ajdb_xls.dict_from_table('annuaire'):
+    street_types = lut_ids.get(db_t.StreetType, {})
+    emails:dict[str, Any] = {}
+    phones:dict[str, Any] = {}
+    addresses:dict[tuple, Any] = {}
+    member_ids = set()
+    async for val in _stream_table(ajdb_xls, 'annuaire'):
         if not isinstance(val['creation']['date'], datetime):
             continue
         new_member = db_t.Member()
-        member_tables.append(new_member)
 
         new_member.id=AjMemberId(val['id'])
 
@@ -104,114 +502,101 @@ async def _populate_member_tables(aj_db:AjDb, ajdb_xls:ExcelWorkbook, lut_tables
             if val.get('date_naissance'):
                 new_member.credential.birthdate = cast(AjDate, val['date_naissance']).date()
 
+        member_id = (await writer.add(new_member)).id
+        member_ids.add(member_id)
+
         if val.get('emails'):
             principal = True
             for single_rpg in val['emails'].split(';'):
-                matched_rpg = [elt for elt in member_tables
-                            if isinstance(elt, db_t.Email) and elt.address == single_rpg]
-                if matched_rpg:
-                    new_rpg = matched_rpg[0]
-                else:
-                    new_rpg = db_t.Email(address=single_rpg)
-                    member_tables.append(new_rpg)
-                new_jct = db_t.MemberEmail(member=new_member,
-                                              email=new_rpg,
-                                              principal=principal)
+                if single_rpg not in emails:
+                    emails[single_rpg] = (await writer.add(db_t.Email(address=single_rpg))).id
+                await writer.add(db_t.MemberEmail(member_id=member_id,
+                                                  email_id=emails[single_rpg],
+                                                  principal=principal))
                 principal = False
-                member_tables.append(new_jct)
 
         if val.get('telephone'):
             single_rpg = f"(+33){val['telephone']:9d}"
-            matched_rpg = [elt for elt in member_tables
-                            if isinstance(elt, db_t.Phone) and elt.number == single_rpg]
-            if matched_rpg:
-                new_rpg = matched_rpg[0]
-            else:
-                new_rpg = db_t.Phone(number=single_rpg)
-                member_tables.append(new_rpg)
-            new_jct = db_t.MemberPhone(member=new_member,
-                                          phone=new_rpg,
-                                          principal=True)
-            member_tables.append(new_jct)
+            if single_rpg not in phones:
+                phones[single_rpg] = (await writer.add(db_t.Phone(number=single_rpg))).id
+            await writer.add(db_t.MemberPhone(member_id=member_id,
+                                              phone_id=phones[single_rpg],
+                                              principal=True))
 
         if val.get('adresse'):
-            matched_rpg = False
-            matched_rpg = [elt for elt in member_tables
-                            if     isinstance(elt, db_t.PostalAddress)
-                            and elt.street_num == val['adresse'].get('numero')
-                            and elt.street_name == val['adresse'].get('nom_voie')
-                            and (not elt.street_type
-                                 or elt.street_type.name == val['adresse'].get('type_voie')
-                                )
-                            and elt.zip_code == val['adresse'].get('cp')
-                            and elt.city == val['adresse'].get('ville')
-                            ]
-            if matched_rpg:
-                new_rpg = matched_rpg[0]
-            else:
+            # an address without street type matches any street type
+            address_key = (val['adresse'].get('numero'), val['adresse'].get('nom_voie'),
+                           val['adresse'].get('cp'), val['adresse'].get('ville'))
+            street_type_key = address_key + (val['adresse'].get('type_voie'),)
+            if street_type_key not in addresses and address_key + (None,) not in addresses:
                 new_rpg = db_t.PostalAddress()
                 new_rpg.city=val['adresse']['ville']
                 if val['adresse'].get('numero'):
                     new_rpg.street_num = val['adresse']['numero']
                 if val['adresse'].get('type_voie'):
-                    matched_type_voie = [elt for elt in lut_tables
-                                    if isinstance(elt, db_t.StreetType) and elt.name == val['adresse']['type_voie']]
-                    new_rpg.street_type = matched_type_voie[0]
+                    new_rpg.street_type_id = street_types[val['adresse']['type_voie']]
                 if val['adresse'].get('autre'):
                     new_rpg.extra = val['adresse']['autre']
                 if val['adresse'].get('nom_voie'):
                     new_rpg.street_name = val['adresse']['nom_voie']
                 if val['adresse'].get('cp'):
                     new_rpg.zip_code = val['adresse']['cp']
-                member_tables.append(new_rpg)
-
-            new_jct = db_t.MemberAddress(member=new_member,
-                                            address=new_rpg,
-                                            principal=True)
-            member_tables.append(new_jct)
+                addresses[street_type_key] = (await writer.add(new_rpg)).id
 
-    async with aj_db._AsyncSessionMaker() as session:  # pylint: disable=protected-access  # accessing protected member on purpose
-        async with session.begin():
-            session.add_all(member_tables)
+            await writer.add(db_t.MemberAddress(member_id=member_id,
+                                                address_id=addresses.get(street_type_key, addresses.get(address_key + (None,))),
+                                                principal=True))
 
-    return member_tables
+    return member_ids
 
-async def _populate_events_memberships_tables(aj_db:AjDb, ajdb_xls:ExcelWorkbook, lut_tables, member_tables):
+async def _populate_events_memberships_tables(writer:_Writer, ajdb_xls:StreamingWorkbook, lut_ids:dict[type, dict[str, Any]], season_of_date:_SeasonIndex):
     """ Populate all event related tables
     """
     print(">>  Populating event & membership tables...")
 
-    membership_tables = []
-    event_tables = []
+    seasons = lut_ids.get(db_t.Season, {})
+    contribution_types = lut_ids.get(db_t.ContributionType, {})
+    know_from_sources = lut_ids.get(db_t.KnowFromSource, {})
+    asso_roles = lut_ids.get(db_t.AssoRole, {})
+    events:dict[date, db_t.Event] = {}
+    active_member_asso_roles:dict[int, list[str]] = {}
+
+    # an event may be reached through a presence row before its own row: names are collected first,
+    # so that events are written once complete (and not seen as modified in sync mode)
+    event_names:dict[date, str] = {}
+    async for val in _stream_table(ajdb_xls, 'suivi'):
+        if val['entree']['categorie'] == 'Evènement' and not val['entree'].get('detail'):
+            event_names[cast(AjDate, val['date']).date()] = val['entree']['nom']
+
+    async def add_event(day:date) -> db_t.Event:
+        new_event = db_t.Event()
+        new_event.date   = day
+        new_event.season_id = season_of_date[day].id
+        new_event.name   = event_names.get(day)
+        events[day] = await writer.add(new_event)
+        return events[day]
 
-    for val in ajdb_xls.dict_from_table('suivi'):
+    async for val in _stream_table(ajdb_xls, 'suivi'):
         # Membership
         if val['entree']['categorie'] == 'Cotisation':
             new_membership = db_t.Membership()
-            membership_tables.append(new_membership)
             new_membership.date = cast(AjDate, val['date']).date()
-            new_membership.season            = [elt for elt in lut_tables    if isinstance(elt, db_t.Season         ) and elt.name == val['entree']['nom']][0]
-            new_membership.member            = [elt for elt in member_tables if isinstance(elt, db_t.Member         ) and elt.id   == val['membre']['id']][0]
-            new_membership.contribution_type = [elt for elt in lut_tables    if isinstance(elt, db_t.ContributionType) and elt.name == val['cotisation']][0]
+            new_membership.season_id            = seasons[val['entree']['nom']]
+            new_membership.member_id            = val['membre']['id']
+            new_membership.contribution_type_id = contribution_types[val['cotisation']]
             if val['membre'].get('prive'):
                 new_membership.statutes_accepted   = val['membre']['prive'].get('approbation_statuts', '').lower() == 'oui'
                 new_membership.has_civil_insurance = val['membre']['prive'].get('assurance_resp_civile', '').lower() == 'oui'
                 new_membership.picture_authorized  = val['membre']['prive'].get('utilisation_image', '').lower() == 'oui'
             if val['membre'].get('source_connaissance'):
-                new_membership.know_from_source = [elt for elt in lut_tables if isinstance(elt, db_t.KnowFromSource) and elt.name == val['membre']['source_connaissance']][0]
+                new_membership.know_from_source_id = know_from_sources[val['membre']['source_connaissance']]
+            await writer.add(new_membership)
 
         # Event
         if val['entree']['categorie'] == 'Evènement' and not val['entree'].get('detail'):
-            matched_event = [elt for elt in event_tables if isinstance(elt, db_t.Event) and elt.date == cast(AjDate, val['date']).date()]
-            if matched_event:
-                matched_event[0].name = val['entree']['nom']
-            else:
-                new_event = db_t.Event()
-                event_tables.append(new_event)
-                new_event.date   = cast(AjDate, val['date']).date()
-                new_event.season = [elt for elt in lut_tables if isinstance(elt, db_t.Season) and new_event.date >= elt.start
-                                                                                                and new_event.date <= elt.end][0]
-                new_event.name   = val['entree']['nom']
+            # event may already be created by a presence or another event row
+            if cast(AjDate, val['date']).date() not in events:
+                await add_event(cast(AjDate, val['date']).date())
 
         # Event - Member
         if (   (    val['entree']['categorie'] == 'Evènement'
@@ -219,24 +604,18 @@ async def _populate_events_memberships_tables(aj_db:AjDb, ajdb_xls:ExcelWorkbook
             or (val['entree']['categorie'] == 'Présence')):
 
             new_memberevent = db_t.MemberEvent()
-            event_tables.append(new_memberevent)
             new_memberevent.presence = val['entree']['categorie'] == 'Présence'
-            matched_event = [elt for elt in event_tables if isinstance(elt, db_t.Event) and elt.date == cast(AjDate, val['date']).date()]
-            if matched_event:
-                new_memberevent.event = matched_event[0]
-            else:
-                new_event = db_t.Event()
-                event_tables.append(new_event)
-                new_event.date = cast(AjDate, val['date']).date()
-                new_event.season = [elt for elt in lut_tables if isinstance(elt, db_t.Season) and new_event.date >= elt.start
-                                                                                                and new_event.date <= elt.end][0]
-                new_memberevent.event = new_event
+            matched_event = events.get(cast(AjDate, val['date']).date())
+            if not matched_event:
+                matched_event = await add_event(cast(AjDate, val['date']).date())
+            new_memberevent.event_id = matched_event.id
 
             if val.get('membre'):
-                new_memberevent.member = [elt for elt in member_tables if isinstance(elt, db_t.Member) and elt.id == val['membre']['id']][0]
+                new_memberevent.member_id = val['membre']['id']
 
             if val.get('commentaire_old'):
                 new_memberevent.comment = val['commentaire_old']
+            await writer.add(new_memberevent)
 
         # Member - Asso role
         if val['entree']['categorie'] == 'Info Membre' and val.get('membre') and val['membre'].get('asso_role'):
@@ -246,75 +625,128 @@ async def _populate_events_memberships_tables(aj_db:AjDb, ajdb_xls:ExcelWorkbook
             if val['entree'].get('detail'):
                 end = cast(AjDate, val['entree']['detail']).date()
             member_id = val['membre']['id']
-            [matched_role] = [elt for elt in lut_tables if isinstance(elt, db_t.AssoRole) and elt.name == val['membre']['asso_role']]
-            previous_member_asso_roles = [elt for elt in event_tables if isinstance(elt, db_t.MemberAssoRole) and elt.member_id == member_id and not elt.end]
-
-            assert len(previous_member_asso_roles) <= 1, f"Erreur dans la DB: Plusieurs rôles asso actifs pour le membre {member_id} !:\n{', '.join(m.member.name for m in previous_member_asso_roles)}"
-            if len([elt for elt in previous_member_asso_roles if elt.asso_role == matched_role]) == 0:
-                new_memberassorole = db_t.MemberAssoRole(member_id = member_id,
-                                                  asso_role = matched_role,
-                                                  start = start,
-                                                  end = end,)
-                event_tables.append(new_memberassorole)
+            matched_role = val['membre']['asso_role']
+            previous_member_asso_roles = active_member_asso_roles.get(member_id, [])
 
-    async with aj_db._AsyncSessionMaker() as session:  # pylint: disable=protected-access  # accessing protected member on purpose
-        async with session.begin():
-            session.add_all(membership_tables + event_tables)
+            assert len(previous_member_asso_roles) <= 1, f"Erreur dans la DB: Plusieurs rôles asso actifs pour le membre {member_id} !:\n{', '.join(previous_member_asso_roles)}"
+            if matched_role not in previous_member_asso_roles:
+                await writer.add(db_t.MemberAssoRole(member_id = member_id,
+                                                     asso_role_id = asso_roles[matched_role],
+                                                     start = start,
+                                                     end = end,))
+                if not end:
+                    active_member_asso_roles.setdefault(member_id, []).append(matched_role)
 
-    return event_tables + membership_tables
 
 
 
 
-
-async def migrate(ajdb_xls_file:Path, config_file:Optional[Path]=None):
+async def migrate(ajdb_xls_file:Path, config_file:Optional[Path]=None, mode:MigrationMode='bulk', prune:bool=False):
     """ main function
+        mode: - bulk: schema is recreated, rows are inserted by batches of multi-row inserts while the workbook is read (see _Writer)
+              - orm: schema is recreated, rows are inserted through the ORM unit of work while the workbook is read, phase per phase
+              - sync: schema is kept, only differences with the workbook are applied in one transaction (see _Writer),
+                      so that bot can keep running. db rows missing from the workbook are kept, unless prune is True
+              - check: workbook is only validated
+              In all modes, db is only modified if the workbook is valid (see _validate)
+        @return
+            number of rows written per table, or the changeset in sync mode, or 1 if the workbook is invalid
     """
-    all_tables = []
-    lut_role_tables = []
-    member_tables = []
-    event_membership_tables = []
+    lut_ids = {}
+    member_ids = set()
+    report = {}
+    timings:dict[str, float] = {}
     with AjConfig(file_path=config_file, save_on_exit=True) as aj_config:
         async with AjDb(aj_config=aj_config) as aj_db:
             try:
-                ajdb_xls = ExcelWorkbook(ajdb_xls_file)
-                print(f"Loaded Excel file '{ajdb_xls_file}'.")
+                with _timed_phase(timings, 'excel'):
+                    ajdb_xls = StreamingWorkbook(ajdb_xls_file)
+                print(f"Opened Excel file '{ajdb_xls_file}'.")
             except FileNotFoundError:
                 print(f"Excel file '{ajdb_xls_file}' not found.")
                 return 1
 
-            # create all tables
-            # -----------------
-            print("Creating DB schema...")
-            await _create_db_schema(aj_db=aj_db)
+            # validate workbook before touching db
+            # -------------------------------------
+            print("Validating Excel file...")
+            with _timed_phase(timings, 'validation'):
+                problems = _validate(ajdb_xls)
+            if problems or mode == 'check':
+                ajdb_xls.close()
+                print(f"{len(problems)} problem(s) found{', DB left untouched' if problems else ''}.")
+                for problem in problems:
+                    print(f"  {problem}")
+                return 1 if problems else 0
+
+            if mode != 'sync':
+                # create all tables
+                # -----------------
+                print("Creating DB schema...")
+                with _timed_phase(timings, 'schema'):
+                    await _create_db_schema(aj_db=aj_db)
 
             # Populate all tables
             # -------------------
+            # each phase streams the workbook rows (read), builds the db rows (transform) and writes them (see _Writer).
+            # Next phases only get ids of written rows per natural key.
             print("Populating DB...")
-
-            # lookup tables
-            lut_role_tables = await _populate_lut_role_tables(aj_db=aj_db, ajdb_xls=ajdb_xls)
-            all_tables.extend(lut_role_tables)
-            if lut_role_tables:
-                # member tables
-                member_tables = await _populate_member_tables(aj_db=aj_db, ajdb_xls=ajdb_xls, lut_tables=lut_role_tables)
-                all_tables.extend(member_tables)
-                if member_tables:
-                    # membership & event tables
-                    event_membership_tables = await _populate_events_memberships_tables(aj_db=aj_db, ajdb_xls=ajdb_xls, lut_tables=lut_role_tables, member_tables=member_tables)
-                    all_tables.extend(event_membership_tables)
-
+            # sync mode session spans all phases, so that bot never sees a partially synchronized db
+            session = aj_db._AsyncSessionMaker() if mode == 'sync' else None     # pylint: disable=protected-access  # accessing protected member on purpose
+            try:
+                with ajdb_xls:
+                    # lookup tables
+                    with _timed_phase(timings, 'lookup & roles'):
+                        async with _Writer(aj_db, mode, report, session=session, prune=prune,
+                                           tables=(db_t.Season, db_t.ContributionType, db_t.KnowFromSource, db_t.AccountType, db_t.StreetType,
+                                                   db_t.DiscordRole, db_t.AssoRole, db_t.AssoRoleDiscordRole)) as writer:
+                            lut_ids, season_of_date = await _populate_lut_role_tables(writer=writer, ajdb_xls=ajdb_xls)
+                    if lut_ids:
+                        # member tables
+                        with _timed_phase(timings, 'members'):
+                            async with _Writer(aj_db, mode, report, session=session, prune=prune,
+                                               tables=(db_t.Member, db_t.Credential, db_t.Email, db_t.MemberEmail, db_t.Phone, db_t.MemberPhone,
+                                                       db_t.PostalAddress, db_t.MemberAddress)) as writer:
+                                member_ids = await _populate_member_tables(writer=writer, ajdb_xls=ajdb_xls, lut_ids=lut_ids)
+                        if member_ids:
+                            # membership & event tables
+                            with _timed_phase(timings, 'events & memberships'):
+                                async with _Writer(aj_db, mode, report, session=session, prune=prune,
+                                                   tables=(db_t.Membership, db_t.Event, db_t.MemberEvent, db_t.MemberAssoRole)) as writer:
+                                    await _populate_events_memberships_tables(writer=writer, ajdb_xls=ajdb_xls, lut_ids=lut_ids, season_of_date=season_of_date)
+                if session is not None:
+                    print("Changeset:")
+                    for table, changes in report.items():
+                        if any(changes.values()):
+                            print(f"  {table:<25}" + ", ".join(f"{n} {kind}" for kind, n in changes.items() if n))
+                    await session.commit()
+            finally:
+                if session is not None:
+                    await session.close()
+
+            if member_ids:
+                # derived tables
+                print("Computing attendance statistics...")
+                with _timed_phase(timings, 'statistics'):
+                    await aj_db.rebuild_member_season_stats()
 
             print("Update config file...")
-            await aj_config.udpate_roles(aj_db=aj_db)
+            with _timed_phase(timings, 'config'):
+                await aj_config.udpate_roles(aj_db=aj_db)
 
     print("Migration done.")
-    return all_tables
+    for phase, duration in timings.items():
+        print(f"  {phase:<25}{duration:8.2f}s")
+    return report
 
 def _main():
     ajdb_xls_file = Path(sys.argv[1])
-    asyncio.run(migrate(ajdb_xls_file=ajdb_xls_file))
-    return 0
+    # --orm: insert through ORM unit of work instead of bulk inserts
+    # --sync: only apply differences with current db instead of recreating it
+    # --check: only validate the workbook
+    # --prune: with --sync, delete db rows missing from the workbook instead of keeping them
+    mode = next((m for m in ('check', 'sync', 'orm') if f'--{m}' in sys.argv[2:]), 'bulk')
+    result = asyncio.run(migrate(ajdb_xls_file=ajdb_xls_file, mode=mode, prune='--prune' in sys.argv[2:]))
+    return result if isinstance(result, int) else 0
 
 
 if __name__ == "__main__":
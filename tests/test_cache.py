@@ -0,0 +1,177 @@
+"""
+approval tests - db cache fallback when db is unavailable
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+import approvaltests
+import sqlalchemy as sa
+
+from ajbot._internal.ajdb import api as ajdb_api
+from ajbot._internal.exceptions import AjDbException
+
+from tests.support import REPORT_EOL
+
+
+class _FlakyDb():
+    """ stand-in for AjDb, whose query fails while db is down
+    """
+    def __init__(self):
+        self._aj_config = SimpleNamespace(db_cache_time_sec=3600)
+        self.stale = False
+        self.down = False
+        self.queries = 0
+        self.broken = False
+        self.gate = None
+
+    @ajdb_api._async_cached(fallback_only=True)     #pylint: disable=protected-access   #testing internal cache
+    async def query_value(self, value):
+        """ return value, failing if db is down
+        """
+        self.queries += 1
+        if self.down:
+            raise sa.exc.OperationalError('select', {}, ConnectionRefusedError())
+        return value
+
+    @ajdb_api._async_cached(fallback_only=True, uncached_args=('after',))     #pylint: disable=protected-access   #testing internal cache
+    async def query_page(self, after=None):
+        """ return page following cursor, failing if db is down
+        """
+        if self.down:
+            raise sa.exc.OperationalError('select', {}, ConnectionRefusedError())
+        return f"page after {after}"
+
+    @ajdb_api._async_cached     #pylint: disable=protected-access   #testing internal cache
+    async def query_version(self, value):
+        """ return value with the number of queries, failing if db is broken, waiting for gate if set
+        """
+        self.queries += 1
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.broken:
+            raise ValueError('broken query')
+        return f"{value} #{self.queries}"
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_cache_fallback():
+    """
+    Unit test for cached queries: last known value is served when db is unavailable, and circuit breaker
+    stops querying db after repeated failures
+    """
+    ajdb_api._clear_cache()                                                             #pylint: disable=protected-access   #testing internal cache
+    ajdb_api._breaker = ajdb_api._CircuitBreaker(failure_threshold=2, reset_sec=60)     #pylint: disable=protected-access   #testing internal cache
+    db = _FlakyDb()
+    report = []
+
+    report.append(f"db up: {await db.query_value('a', keep_detached=True)}, stale: {db.stale}")
+    db.down = True
+    for i in range(3):
+        report.append(f"db down #{i}: {await db.query_value('a', keep_detached=True)}, stale: {db.stale}"
+                      f", queries: {db.queries}, db unavailable: {ajdb_api.AjDb.db_unavailable()}")
+    try:
+        await db.query_value('b', keep_detached=True)
+    except AjDbException as e:
+        report.append(f"not cached: {e}")
+
+    ajdb_api._breaker = ajdb_api._CircuitBreaker()                                      #pylint: disable=protected-access   #testing internal cache
+    ajdb_api._clear_cache()                                                             #pylint: disable=protected-access   #testing internal cache
+    approvaltests.verify(REPORT_EOL.join(report))
+
+
+@pytest.mark.asyncio
+async def test_cache_pages():
+    """
+    Unit test for cached pages: only the first page is cached, pages after a cursor are not
+    """
+    ajdb_api._clear_cache()                                                             #pylint: disable=protected-access   #testing internal cache
+    db = _FlakyDb()
+    report = []
+
+    for after in [None, 1, 2]:
+        report.append(f"db up, after {after}: {await db.query_page(after=after, keep_detached=True)}")
+    report.append(f"cached pages: {sorted(str(kwargs) for name, _, kwargs in ajdb_api.cache_data if name == 'query_page')}")
+    db.down = True
+    report.append(f"db down, first page: {await db.query_page(after=None, keep_detached=True)}, stale: {db.stale}")
+    try:
+        await db.query_page(after=1, keep_detached=True)
+    except AjDbException as e:
+        report.append(f"db down, after 1: {e}")
+
+    ajdb_api._breaker = ajdb_api._CircuitBreaker()                                      #pylint: disable=protected-access   #testing internal cache
+    ajdb_api._clear_cache()                                                             #pylint: disable=protected-access   #testing internal cache
+    approvaltests.verify(REPORT_EOL.join(report))
+
+
+@pytest.mark.asyncio
+async def test_cache_refresh(monkeypatch, capsys):
+    """
+    Unit test for expired data: flagged as stale if it cannot be refreshed, refresh failures are reported,
+    and a refresh finishing after cache has been cleared is dropped
+    """
+    ajdb_api._clear_cache()                                                             #pylint: disable=protected-access   #testing internal cache
+    refresh_db = _FlakyDb()
+    monkeypatch.setattr(ajdb_api, 'AjDb', lambda **_: refresh_db)
+    db = _FlakyDb()
+    db._aj_config.db_cache_time_sec = 0                                                 #pylint: disable=protected-access   #every entry is expired
+    report = []
+
+    async def query_and_refresh():
+        value = await db.query_version('a', keep_detached=True)
+        await asyncio.gather(*ajdb_api._refresh_tasks.values())                         #pylint: disable=protected-access   #testing internal cache
+        return value
+
+    report.append(f"first query: {await query_and_refresh()}, stale: {db.stale}")
+    ajdb_api._breaker = ajdb_api._CircuitBreaker(failure_threshold=1, reset_sec=60)     #pylint: disable=protected-access   #testing internal cache
+    ajdb_api._breaker.failure()                                                         #pylint: disable=protected-access   #testing internal cache
+    report.append(f"expired, db unavailable: {await query_and_refresh()}, stale: {db.stale}, refreshes: {refresh_db.queries}")
+
+    ajdb_api._breaker = ajdb_api._CircuitBreaker()                                      #pylint: disable=protected-access   #testing internal cache
+    db.stale = False
+    refresh_db.broken = True
+    report.append(f"expired, refresh failing: {await query_and_refresh()}, stale: {db.stale}, refreshes: {refresh_db.queries}")
+    report.append(f"reported: {capsys.readouterr().out.strip()}")
+
+    refresh_db.broken = False
+    report.append(f"expired, refreshed: {await query_and_refresh()}, then {await query_and_refresh()}")
+
+    refresh_db.gate = asyncio.Event()
+    await db.query_version('a', keep_detached=True)
+    refreshing = list(ajdb_api._refresh_tasks.values())                                 #pylint: disable=protected-access   #testing internal cache
+    ajdb_api._clear_cache()                                                             #pylint: disable=protected-access   #testing internal cache
+    refresh_db.gate.set()
+    await asyncio.gather(*refreshing)
+    report.append(f"refreshed after cache cleared, cached: {bool(ajdb_api.cache_data)}")
+
+    ajdb_api._clear_cache()                                                             #pylint: disable=protected-access   #testing internal cache
+    approvaltests.verify(REPORT_EOL.join(report))
+
+
+@pytest.mark.asyncio
+async def test_warm_up(monkeypatch, capsys):
+    """
+    Unit test for cache warm-up: any failing item is reported without stopping the others
+    """
+    @asynccontextmanager
+    async def sibling(_):
+        yield None
+    monkeypatch.setattr(ajdb_api.AjDb, '_sibling', sibling)
+    aj_db = ajdb_api.AjDb(aj_config=SimpleNamespace())
+
+    async def broken(_):
+        raise ValueError('broken item')
+    async def done(_):
+        await asyncio.sleep(0)
+
+    timings = await aj_db.warm_up({'broken': broken, 'done': done}, budget_sec=1)
+    report = [f"{name}: {'failed' if timing is None else 'done'}" for name, timing in timings.items()]
+    report.append(f"reported: {capsys.readouterr().out.strip()}")
+    approvaltests.verify(REPORT_EOL.join(report))
@@ -0,0 +1,44 @@
+"""
+approval tests - attendance charts
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import approvaltests
+
+from ajbot._internal import charts
+from ajbot._internal.ajdb.presence import PresenceMatrix
+from ajbot._internal.bot import stats
+
+from tests.support import REPORT_EOL
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def test_charts():
+    """
+    Unit test for charts: data extracted from attendance matrix, rendered as PNG in a worker process
+    """
+    rows = [(1, date(2023, 9, 15), 10, '2023-2024', 1), (1, date(2023, 9, 15), 10, '2023-2024', 2),
+            (2, date(2023, 9, 22), 10, '2023-2024', 1),
+            (3, date(2024, 9, 13), 11, '2024-2025', 1), (3, date(2024, 9, 13), 11, '2024-2025', 3),
+            (4, date(2024, 9, 20), 11, '2024-2025', None)]
+    matrix = PresenceMatrix.from_rows(rows)
+    # member 2 subscribed to both seasons, member 4 never came, season 12 has no event
+    subscriptions = [(2, 10), (2, 11), (1, 11), (4, 10), (3, 12)]
+
+    datas = {'presences, latest season': (charts.PRESENCES, stats._chart_data(charts.PRESENCES, matrix)),  #pylint: disable=protected-access   #test of internal function
+             'presences, 2023-2024': (charts.PRESENCES, stats._chart_data(charts.PRESENCES, matrix, season_name='2023-2024')),    #pylint: disable=protected-access   #test of internal function
+             'cotisants': (charts.SUBSCRIBERS, stats._chart_data(charts.SUBSCRIBERS, matrix, subscriptions=subscriptions)),      #pylint: disable=protected-access   #test of internal function
+            }
+    report = [f"{name}: {data}" for name, (_, data) in datas.items()]
+    report.append(f"presences, unknown season: {stats._chart_data(charts.PRESENCES, matrix, season_name='1999-2000')}")   #pylint: disable=protected-access   #test of internal function
+    report.append(f"cotisants, no event: {stats._chart_data(charts.SUBSCRIBERS, PresenceMatrix.from_rows([]))}")         #pylint: disable=protected-access   #test of internal function
+
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as renderer:
+        pngs = {name: renderer.submit(charts.render, chart_type, data) for name, (chart_type, data) in datas.items()}
+        for name, png in pngs.items():
+            report.append(f"{name} rendered as PNG: {png.result().startswith(_PNG_SIGNATURE)}")
+
+    approvaltests.verify(REPORT_EOL.join(report))
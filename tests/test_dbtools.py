@@ -0,0 +1,63 @@
+"""
+approval tests - history export files
+"""
+import gzip
+import pickle
+from datetime import date
+
+import numpy as np
+import approvaltests
+
+from ajbot.dbtools import CATEGORY, _append_npy, _to_array   # pylint: disable=protected-access  # testing internals on purpose
+from ajbot._internal.ajdb import api as ajdb_api
+from ajbot._internal.exceptions import AjDbException
+
+from tests.support import REPORT_EOL
+
+
+def test_export_arrays(tmp_path):
+    """
+    Unit test for history export: columns are appended in place to memory mappable files, categories keeping their codes
+    """
+    labels = ['AG']
+    report = []
+    for values, dates in [(['Sortie', None, 'AG'], [date(2024, 1, 5), date(2024, 1, 12), None]),
+                          (['Forum', 'Sortie'], [date(2024, 9, 1), date(2024, 9, 8)])]:
+        codes_count = _append_npy(tmp_path / 'events.name.npy', _to_array(values, CATEGORY, labels))
+        dates_count = _append_npy(tmp_path / 'events.date.npy', _to_array(dates, 'datetime64[D]', []))
+        report.append(f"rows: {codes_count} / {dates_count}, labels: {labels}")
+
+    codes = np.load(tmp_path / 'events.name.npy', mmap_mode='r')
+    dates = np.load(tmp_path / 'events.date.npy', mmap_mode='r')
+    report.append(f"memory mapped: {isinstance(codes, np.memmap)}, codes: {codes.tolist()}")
+    report.append(f"dates: {[str(d) for d in dates]}")
+    report.append(f"member ids with null: {_to_array([3, None], 'int32', []).tolist()}")
+
+    approvaltests.verify(REPORT_EOL.join(report))
+
+
+def test_read_dump(tmp_path):
+    """
+    Unit test for dump reading: whole file is checked before restore drops anything
+    """
+    records = [{'format': ajdb_api._DUMP_FORMAT, 'schema': ajdb_api._schema_digest()},   # pylint: disable=protected-access  # testing internals on purpose
+               ('seasons', ('id', 'name'), ((1, 2), ('2023-2024', '2024-2025'))),
+               ('events', ('id', 'date'), ((1,), (date(2023, 9, 15),))),
+               None]
+    content = b''.join(pickle.dumps(record) for record in records)
+    files = {'complete': gzip.compress(content),
+             'truncated': gzip.compress(content)[:-20],
+             'without end marker': gzip.compress(content[:-len(pickle.dumps(None))]),
+             'unknown table': gzip.compress(content.replace(b'events', b'evenzs')),
+             'corrupted': gzip.compress(content)[:30] + b'garbage',
+            }
+    report = []
+    for name, data in files.items():
+        (tmp_path / 'dump.gz').write_bytes(data)
+        try:
+            chunks = list(ajdb_api._read_dump(tmp_path / 'dump.gz'))   # pylint: disable=protected-access  # testing internals on purpose
+            report.append(f"{name}: {[(table, len(values[0])) for table, _, values in chunks]}")
+        except AjDbException as e:
+            report.append(f"{name}: error {str(e).replace(str(tmp_path), '<tmp>').split(':')[0]}")
+
+    approvaltests.verify(REPORT_EOL.join(report))
@@ -0,0 +1,54 @@
+"""
+approval tests - interaction deadline statistics
+"""
+from types import SimpleNamespace
+
+import pytest
+import approvaltests
+import discord
+
+from ajbot._internal.bot import deadline, params
+
+from tests.support import REPORT_EOL
+
+
+def test_deadline_report():
+    """
+    Unit test for deadline.record & deadline.report
+    """
+    deadline.stats().clear()
+    deadline.record('membre', ack_delay=0.4)
+    deadline.record('membre', ack_delay=2.3, auto_deferred=True)
+    deadline.record('saison', ack_delay=1.1)
+    deadline.record('EditMemberButton.callback', ack_delay=2.9)
+
+    report = deadline.report()
+    approvaltests.verify(REPORT_EOL.join(' | '.join(row) for row in zip(*([k] + v for k, v in report.items()))))
+
+
+class _FakeResponse():
+    """ stand-in for interaction response, recording deferrals
+    """
+    def __init__(self):
+        self.type = None
+        self.deferrals = []
+
+    async def defer(self, ephemeral=False):
+        """ record deferral
+        """
+        self.type = discord.InteractionResponseType.deferred_channel_message
+        self.deferrals.append(f"ephemeral={ephemeral}")
+
+
+@pytest.mark.asyncio
+async def test_defer_on_deadline():
+    """
+    Unit test for deadline._defer_on_deadline: automatic deferral keeps the visibility of the handler response
+    """
+    report = []
+    for interaction_id, ephemeral in enumerate([True, False]):
+        interaction = SimpleNamespace(id=interaction_id, created_at=discord.utils.utcnow(), extras={}, response=_FakeResponse())
+        await deadline._defer_on_deadline(interaction, budget=0, ephemeral=ephemeral)     #pylint: disable=protected-access   #testing internal function
+        report.append(f"handler ephemeral={ephemeral}: deferred {interaction.response.deferrals}, auto: {interaction.extras.get(params.EXTRA_AUTO_DEFERRED)}")
+
+    approvaltests.verify(REPORT_EOL.join(report))
@@ -0,0 +1,32 @@
+"""
+approval tests - content addressed file cache
+"""
+import os
+
+import approvaltests
+
+from ajbot._internal.bot.file_cache import FileCache, digest
+
+from tests.support import REPORT_EOL
+
+
+def test_file_cache(tmp_path):
+    """
+    Unit test for FileCache: files are served per digest of their inputs, least recently used ones being evicted
+    """
+    cache = FileCache(tmp_path, max_bytes=25, suffix='.pdf')
+    keys = {name: digest({'rows': [[name, 1], [name, 2]]}) for name in ['a', 'b', 'c']}
+    report = [f"same inputs, same digest: {digest({'rows': [['a', 1], ['a', 2]]}) == keys['a']}, different inputs: {len(set(keys.values()))}"]
+
+    for i, name in enumerate(['a', 'b']):
+        cache.put(keys[name], name.encode() * 10)
+        os.utime(tmp_path / f"{keys[name]}.pdf", (i, i))
+    cache.get(keys['a'])        # 'a' becomes more recently used than 'b'
+    cache.put(keys['c'], b'c' * 10)
+
+    for name in ['a', 'b', 'c']:
+        content = cache.get(keys[name])
+        report.append(f"{name}: {content.decode() if content else None}")
+    report.append(f"hits: {cache.hits}, misses: {cache.misses}, files: {len(list(tmp_path.iterdir()))}")
+
+    approvaltests.verify(REPORT_EOL.join(report))
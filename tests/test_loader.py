@@ -0,0 +1,48 @@
+"""
+approval tests - batch loading of db rows by key
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+import approvaltests
+
+from ajbot._internal.ajdb import tables as db_t
+from ajbot._internal.ajdb.loader import BatchLoader
+
+from tests.support import REPORT_EOL
+
+
+class _FakeSession():
+    """ stand-in for a db session, matching discord names case insensitively as MariaDB collation does
+    """
+    def __init__(self, members:list):
+        self._members = members
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        pass
+
+    async def scalars(self, query):
+        """ return members whose discord name is in the lookup values of query
+        """
+        names = {value.casefold() for value in query.whereclause.right.value}
+        return SimpleNamespace(all=lambda: [m for m in self._members if m.discord.casefold() in names])
+
+
+@pytest.mark.asyncio
+async def test_batch_loader_case():
+    """
+    Unit test for BatchLoader: rows stored with another case than the lookup are dispatched to it
+    """
+    members = [db_t.Member(id=1, discord='Alice'), db_t.Member(id=2, discord='bob')]
+    loader = BatchLoader(db_t.Member, db_t.Member.discord, key_getter=lambda m: m.discord, case_insensitive=True)
+    lookups = ['alice', 'Alice', 'BOB', 'carol']
+    found = await asyncio.gather(*(loader.load(lambda: _FakeSession(members), name) for name in lookups))
+
+    report = [f"{name} -> {member.id if member else None}, cached match: {[m.id for m in members if loader.matches(m, name)]}"
+              for name, member in zip(lookups, found)]
+    report.append(f"lookups: {loader.lookups}, batches: {loader.batches}")
+    approvaltests.verify(REPORT_EOL.join(report))
@@ -1,6 +1,7 @@
 """
 approval tests - migrate
 """
+from datetime import date, datetime
 from pathlib import Path
 
 import pytest
@@ -8,15 +9,98 @@ import approvaltests
 
 from tests.support import TEST_PATH, TEST_MIGRATE_FILE, REPORT_EOL
 
-from ajbot.migrate import migrate
+from vbrpytools.exceltojson import ExcelWorkbook
+
+from ajbot._internal.ajdb import tables as db_t
+from ajbot._internal.excel import StreamingWorkbook
+from ajbot.migrate import migrate, _SyncTable, _copy_row, _validate, _SYNC_SPECS   # pylint: disable=protected-access  # testing internals on purpose
 
 @pytest.mark.asyncio
 async def test_migrate():
     """
     Unit test for migrating a db
     """
-    result = ''
-    items = await migrate(ajdb_xls_file=Path(TEST_PATH) / TEST_MIGRATE_FILE)
-    result = REPORT_EOL.join(f"{type(i)} {i.id}" for i in items)
+    written = await migrate(ajdb_xls_file=Path(TEST_PATH) / TEST_MIGRATE_FILE)
+    result = REPORT_EOL.join(f"{table}: {count}" for table, count in sorted(written.items()))
 
     approvaltests.verify(result)
+
+
+def test_streaming_workbook():
+    """
+    Unit test for StreamingWorkbook: rows read in streaming mode are the same as the ones of a fully loaded workbook
+    """
+    xls_file = Path(TEST_PATH) / TEST_MIGRATE_FILE
+    loaded_xls = ExcelWorkbook(xls_file)
+    report = []
+    with StreamingWorkbook(xls_file) as streamed_xls:
+        for table_name in ['saisons', 'contribution', 'connaissance', 'compte', 'type_voie', 'discord_role', 'roles', 'annuaire', 'suivi']:
+            rows = list(streamed_xls.iter_table(table_name))
+            report.append(f"{table_name}: {len(rows)} rows, same as loaded workbook: {rows == loaded_xls.dict_from_table(table_name)}")
+
+    approvaltests.verify(REPORT_EOL.join(report))
+
+
+class _BrokenWorkbook(StreamingWorkbook):
+    """ test workbook with invalid rows appended to some tables
+    """
+    _BROKEN_ROWS = {'annuaire': [{'id': 1, 'creation': {'date': datetime(2024, 1, 1)},
+                                  'adresse': {'ville': 'Paris', 'type_voie': 'Chemin creux'}}],
+                    'suivi': [{'date': datetime(2024, 1, 1), 'entree': {'categorie': 'Cotisation', 'nom': '1999-2000'},
+                               'membre': {'id': 99999}, 'cotisation': 'Inconnue'},
+                              {'date': datetime(1990, 1, 1), 'entree': {'categorie': 'Présence'}},
+                              {'date': 'hier', 'entree': {'categorie': 'Présence'}}],
+                   }
+
+    def iter_table(self, table_name, nested=True, with_ignored=False):
+        yield from super().iter_table(table_name, nested, with_ignored)
+        yield from self._BROKEN_ROWS.get(table_name, [])
+
+
+def test_validate():
+    """
+    Unit test for workbook validation: all problems are reported with their coordinates
+    """
+    xls_file = Path(TEST_PATH) / TEST_MIGRATE_FILE
+    with StreamingWorkbook(xls_file) as valid_xls:
+        report = [f"valid workbook: {_validate(valid_xls)}"]
+    with _BrokenWorkbook(xls_file) as broken_xls:
+        report.extend(_validate(broken_xls))
+
+    approvaltests.verify(REPORT_EOL.join(report))
+
+
+def test_sync_diff():
+    """
+    Unit test for sync mode: workbook rows are matched with db rows by natural key, only differences being applied
+    """
+    specs = {spec.table: spec for spec in _SYNC_SPECS}
+    def event(event_id, day, name=None):
+        return db_t.Event(id=event_id, date=date(2024, 1, day), name=name, season_id=1)
+    def presence(event_id, member_id, presence=True):
+        return db_t.MemberEvent(event_id=event_id, member_id=member_id, presence=presence)
+
+    # foreign keys of workbook rows are db ids, workbook events get the id of the db event they match
+    db_events = [event(1, 1, 'AG'), event(2, 2), event(3, 3)]
+    wb_events = [event(1, 1, 'AG'), event(2, 2, 'Sortie'), event(4, 4)]
+    db_presences = [presence(1, 1), presence(1, None), presence(2, 2)]
+    wb_presences = [presence(1, 1, presence=False), presence(1, None), presence(1, None)]
+
+    report = []
+    for spec, wb_rows, db_rows in [(specs[db_t.Event], wb_events, db_events),
+                                   (specs[db_t.MemberEvent], wb_presences, db_presences)]:
+        sync_table = _SyncTable(spec, db_rows)
+        matched, modified, inserted = 0, [], []
+        for wb_row in wb_rows:
+            db_row = sync_table.match(wb_row)
+            if db_row is None:
+                inserted.append(spec.key(wb_row))
+                continue
+            matched += 1
+            if _copy_row(spec, wb_row, db_row, {}):
+                modified.append(spec.key(db_row))
+        report.append(f"{spec.table.__tablename__}: matched {matched}, modified {modified}, "
+                      f"inserted {inserted}, missing {[spec.key(r) for r in sync_table.missing()]}")
+    report.append(f"db event 2 renamed: {db_events[1].name}")
+
+    approvaltests.verify(REPORT_EOL.join(report))
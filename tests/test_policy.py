@@ -0,0 +1,61 @@
+"""
+approval tests - execution policy of heavy commands
+"""
+import asyncio
+
+import pytest
+import approvaltests
+
+from ajbot._internal.bot.policy import ExecutionPolicy
+
+from tests.support import REPORT_EOL
+
+
+@pytest.mark.asyncio
+async def test_execution_policy():
+    """
+    Unit test for ExecutionPolicy: coalescing of identical requests & concurrency limit
+    """
+    policy = ExecutionPolicy('test_policy', max_concurrency=1)
+    log = []
+
+    async def compute(key):
+        log.append(f"start {key}")
+        await asyncio.sleep(0.01)
+        log.append(f"end {key}")
+        return f"result {key}"
+
+    keys = ['a', 'a', 'b', 'a', 'b', 'c']
+    results = await asyncio.gather(*(policy.run(key=k, compute=lambda k=k: compute(k)) for k in keys))
+
+    report = log + [f"{k} -> {r}" for k, r in zip(keys, results)]
+    report.append(f"requests: {policy.stats.requests}, coalesced: {policy.stats.coalesced}, runs: {policy.stats.runs}"
+                  f", max queue depth: {policy.stats.max_queue_depth}, queue depth: {policy.stats.queue_depth}")
+    approvaltests.verify(REPORT_EOL.join(report))
+
+
+@pytest.mark.asyncio
+async def test_failure_without_request(capsys):
+    """
+    Unit test for ExecutionPolicy: failure of a computation whose requests have all been cancelled is reported
+    """
+    policy = ExecutionPolicy('test_policy_failure')
+    started = asyncio.Event()
+    failing = asyncio.Event()
+
+    async def compute():
+        started.set()
+        await failing.wait()
+        raise ValueError('computation failed')
+
+    request = asyncio.create_task(policy.run(key='a', compute=compute))
+    await started.wait()
+    request.cancel()
+    computation = policy._in_flight['a']        #pylint: disable=protected-access   #computation is not awaited anymore
+    failing.set()
+    await asyncio.wait([computation])
+    await asyncio.sleep(0)      # let done callbacks run
+
+    report = [f"request cancelled: {request.cancelled()}",
+              f"reported: {capsys.readouterr().out.strip()}"]
+    approvaltests.verify(REPORT_EOL.join(report))
@@ -0,0 +1,42 @@
+"""
+approval tests - attendance matrix
+"""
+from datetime import date
+
+import approvaltests
+
+from ajbot._internal.ajdb.presence import PresenceMatrix
+
+from tests.support import REPORT_EOL
+
+
+def test_presence_matrix():
+    """
+    Unit test for PresenceMatrix: vectorized attendance queries, and incremental update on event edits
+    """
+    # events 1-4 in season 10, 5-6 in season 11 (event 6 without presence), listed out of date order
+    rows = [(2, date(2023, 9, 22), 10, '2023-2024', 1), (2, date(2023, 9, 22), 10, '2023-2024', 2),
+            (1, date(2023, 9, 15), 10, '2023-2024', 1),
+            (3, date(2023, 9, 29), 10, '2023-2024', 1), (3, date(2023, 9, 29), 10, '2023-2024', 3),
+            (4, date(2023, 10, 6), 10, '2023-2024', 2),
+            (5, date(2024, 9, 13), 11, '2024-2025', 1), (5, date(2024, 9, 13), 11, '2024-2025', 3),
+            (6, date(2024, 9, 20), 11, '2024-2025', None)]
+    matrix = PresenceMatrix.from_rows(rows)
+
+    def describe(title):
+        active_ids, active_counts = matrix.active_members(last_events=3, min_presences=2)
+        return [f"{title}:",
+                f"  events by date: {matrix.event_ids.tolist()}, members: {matrix.member_ids.tolist()}",
+                f"  seasons: {matrix.season_bounds()}",
+                f"  counts per season: {matrix.counts_per_season().tolist()}",
+                f"  at least 2 of last 3 events: {dict(zip(active_ids.tolist(), active_counts.tolist()))}",
+                f"  longest streaks: {dict(zip(matrix.member_ids.tolist(), matrix.longest_streaks().tolist()))}",
+                f"  retention: {matrix.retention()}"]
+
+    report = describe("built")
+    matrix.set_event(6, date(2024, 9, 20), 11, '2024-2025', [3, 4])
+    matrix.set_event(7, date(2024, 9, 17), 11, '2024-2025', [1, 3])
+    matrix.set_event(2, date(2023, 9, 22), 10, '2023-2024', [2])
+    report.extend(describe("after edits (event 6 updated, event 7 added between 5 & 6, event 2 without member 1)"))
+
+    approvaltests.verify(REPORT_EOL.join(report))
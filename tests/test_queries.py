@@ -1,6 +1,7 @@
 """
 approval tests - queries
 """
+import asyncio
 from typing import Optional
 import tempfile
 from datetime import date, timedelta
@@ -13,6 +14,7 @@ from sqlalchemy import orm
 
 from ajbot._internal.ajdb import AjDb, tables as db_t
 from ajbot._internal.config import AjConfig, FormatTypes
+from ajbot._internal.exceptions import AjDbException
 
 from tests.support import async_verify_all_combinations_with_labeled_input, get_printable_ajdb_objects, ExpectedExceptionDuringTest
 
@@ -347,3 +349,46 @@ async def test_query_member_emails():
     last_participation_durations = [None, 0, 10, 99, 9999]
     await async_verify_all_combinations_with_labeled_input(_do_query_member_emails,
                                                            last_participation_duration = last_participation_durations)
+
+
+##########################
+@pytest.mark.asyncio
+async def test_read_only_session():
+    """
+    Unit test for read only AjDb: any write attempt shall raise
+    """
+    async with AjDb(read_only=True) as aj_db:
+        with pytest.raises(AjDbException):
+            aj_db.add(db_t.Season(name='test'))
+        aj_db._aio_session.add(db_t.Season(name='test'))        # pylint: disable=protected-access  # bypass AjDb guard on purpose
+        with pytest.raises(AjDbException):
+            await aj_db._aio_session.flush()                    # pylint: disable=protected-access  # bypass AjDb guard on purpose
+        with pytest.raises(AjDbException):
+            await aj_db._aio_session.execute(sa.delete(db_t.Season))   # pylint: disable=protected-access  # bypass AjDb guard on purpose
+        aj_db._aio_session.expunge_all()                         # pylint: disable=protected-access  # bypass AjDb guard on purpose
+
+
+##########################
+@pytest.mark.asyncio
+async def test_warm_up():
+    """
+    Unit test for AjDb warm-up: items run concurrently in their own session, within budget
+    """
+    sessions = set()
+
+    def item(duration, fail=False):
+        async def run(aj_db):
+            sessions.add(id(aj_db._aio_session))                 # pylint: disable=protected-access  # check sessions are distinct
+            await asyncio.sleep(duration)
+            if fail:
+                raise AjDbException("échec")
+        return run
+
+    async with AjDb(read_only=True) as aj_db:
+        timings = await aj_db.warm_up({'rapide': item(0.01), 'lent': item(0.02), 'en échec': item(0.01, fail=True), 'hors budget': item(10)},
+                                      budget_sec=0.5)
+
+    assert len(sessions) == 4
+    assert timings['rapide'] is not None and timings['lent'] is not None
+    assert timings['en échec'] is None and timings['hors budget'] is None
+    assert list(timings) == ['rapide', 'lent', 'en échec', 'hors budget']
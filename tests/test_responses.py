@@ -0,0 +1,75 @@
+"""
+approval tests - bot responses
+"""
+import inspect
+import re
+
+import discord
+import approvaltests
+
+from ajbot._internal.bot import responses, params
+
+from tests.support import REPORT_EOL
+
+
+_SECTIONS = {
+             'empty': [],
+             'few small': ['a' * 10] * 10,
+             'many medium': ['a' * 500] * 20,
+             'one long': ['\n'.join(['b' * 79] * 500)],
+             'mixed': ['a' * 10, '\n'.join(['b' * 79] * 100), 'c' * 10],
+            }
+
+def _do_pack_text(sections, budget, first_budget, max_items):
+    messages = responses.pack_text(_SECTIONS[sections], budget=budget, first_budget=first_budget, max_items=max_items, overhead=4)
+    return REPORT_EOL.join(f"{len(m)} section(s), {sum(len(s) + 4 for s in m)} char(s)" for m in messages)
+
+def test_pack_text():
+    """
+    Unit test for responses.pack_text
+    """
+    sections = list(_SECTIONS.keys())
+    budgets = [params.MESSAGE_TEXT_MAX_SIZE, 1000]
+    first_budgets = [None, 300]
+    max_items = [params.MESSAGE_COMPONENT_MAX_NBR, 3]
+
+    approvaltests.verify_all_combinations_with_labeled_input(_do_pack_text,
+                                                             sections=sections,
+                                                             budget=budgets,
+                                                             first_budget=first_budgets,
+                                                             max_items=max_items)
+
+
+def _do_build_table_embeds(nb_rows, value_size):
+    embeds = responses.build_table_embeds({'Id': [str(i) for i in range(nb_rows)],
+                                           'Nom': ['n' * value_size] * nb_rows,
+                                          })
+    messages = responses.pack_embeds(embeds)
+    return REPORT_EOL.join(f"{len(m)} embed(s): " + ', '.join(f"{len(e.fields)} field(s) / {len(e)} char(s)" for e in m) for m in messages)
+
+def test_build_table_embeds():
+    """
+    Unit test for responses.build_table_embeds & responses.pack_embeds
+    """
+    approvaltests.verify_all_combinations_with_labeled_input(_do_build_table_embeds,
+                                                             nb_rows=[0, 1, 30, 500],
+                                                             value_size=[5, 100])
+
+
+def test_stateless_view():
+    """
+    Unit test for responses.StatelessView: finished, and discord.py send paths used by responses only store unfinished views
+    """
+    report = [f"stateless view finished: {responses.StatelessView().is_finished()}"]
+    for send in [discord.InteractionResponse.send_message, discord.Webhook.send]:
+        # condition of the innermost if block calling store_view
+        guards = []
+        lines = inspect.getsource(send).splitlines()
+        for i, line in enumerate(lines):
+            if 'store_view(' in line:
+                indent = len(line) - len(line.lstrip())
+                guards.extend(next(re.findall(r'^\s*if (.*):$', prev) for prev in reversed(lines[:i])
+                                   if prev.strip() and len(prev) - len(prev.lstrip()) < indent))
+        report.append(f"{send.__qualname__}: store_view guarded by {guards}")
+
+    approvaltests.verify(REPORT_EOL.join(report))
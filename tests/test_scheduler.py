@@ -0,0 +1,86 @@
+"""
+approval tests - background jobs scheduler
+"""
+from datetime import datetime
+
+import pytest
+import approvaltests
+
+from ajbot._internal.bot import scheduler
+from ajbot._internal.bot.scheduler import CronSpec
+from ajbot._internal.exceptions import OtherException
+
+from tests.support import REPORT_EOL
+
+
+def test_cron_spec():
+    """
+    Unit test for CronSpec: next scheduled times
+    """
+    start = datetime(2025, 12, 30, 22, 47, 30)      # tuesday
+    specs = ['* * * * *', '*/15 * * * *', '30 3 * * *', '0 9 * * 1', '0 16 * * 5',
+             '0 8-18/5 * * 1-5', '0 0 1 * *', '0 0 13 * 5', '0 12 29 2 *', '0 0 * * 7']
+
+    report = []
+    for spec in specs:
+        cron = CronSpec(spec)
+        times = [start]
+        for _ in range(3):
+            times.append(cron.next_after(times[-1]))
+        report.append(f"{spec:<20} -> " + ', '.join(t.strftime('%a %d/%m/%Y %H:%M') for t in times[1:]))
+
+    for spec in ['* * *', '60 * * * *', '0 0 * 13 *', 'a * * * *', '*/0 * * * *', '0 1-x * * *']:
+        with pytest.raises(OtherException) as e:
+            CronSpec(spec)
+        report.append(f"{spec:<20} -> {e.value}")
+
+    approvaltests.verify(REPORT_EOL.join(report))
+
+
+class _UnavailableDb():
+    """ AjDb of a db which cannot be reached
+    """
+    def __init__(self, **_kwargs):
+        pass
+
+    async def __aenter__(self):
+        raise ConnectionRefusedError("db unreachable")
+
+    async def __aexit__(self, *_args):
+        return False
+
+
+@pytest.mark.asyncio
+async def test_job_db_unavailable(monkeypatch):
+    """
+    Unit test for Job.run: a db outage is counted as a failure, and does not stop the job
+    """
+    monkeypatch.setattr(scheduler, 'AjDb', _UnavailableDb)
+    calls = []
+    async def func():
+        calls.append(1)
+    job = scheduler.Job('test', func)
+
+    report = [f"run {i}: {await job.run()}" for i in range(2)]
+    report.append(f"job called: {len(calls)}, runs: {job.stats.runs}, failures: {job.stats.failures}, skipped: {job.stats.skipped}")
+
+    approvaltests.verify(REPORT_EOL.join(report))
+
+
+def test_start_invalid_config(monkeypatch, tmp_path):
+    """
+    Unit test for scheduler.start: an invalid job config is reported before any job is scheduled
+    """
+    async def func():
+        pass
+    monkeypatch.setattr(scheduler, '_jobs', {name: scheduler.Job(name, func) for name in ['a', 'b']})
+
+    report = []
+    for jobs_config in [{'a': {'cron': '0 3 * * *'}, 'b': {'cron': '0 3 * * 8'}},
+                        {'a': {'cron': '0 3 * * *'}, 'b': {}},
+                        {'a': {'cron': '0 3 * * *'}, 'c': {'cron': '0 3 * * *'}}]:
+        with pytest.raises(OtherException) as e:
+            scheduler.start(jobs_config, tmp_path / 'jobs.json')
+        report.append(f"{e.value} - scheduled: {[name for name, job in scheduler.jobs().items() if job.cron is not None]}")
+
+    approvaltests.verify(REPORT_EOL.join(report))
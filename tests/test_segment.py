@@ -0,0 +1,63 @@
+"""
+approval tests - member segments
+"""
+from datetime import date, timedelta
+
+import approvaltests
+
+from ajbot._internal.ajdb.presence import PresenceMatrix
+from ajbot._internal.ajdb.segment import MemberSegments
+from ajbot._internal.exceptions import AjDbException
+
+from tests.support import REPORT_EOL
+
+
+def test_member_segments():
+    """
+    Unit test for MemberSegments: predicates combined with set operators, and syntax errors
+    """
+    today = date.today()
+    matrix = PresenceMatrix.from_rows([(1, today - timedelta(weeks=60), 10, '2023-2024', 1), (1, today - timedelta(weeks=60), 10, '2023-2024', 4),
+                                       (2, today - timedelta(weeks=30), 11, '2024-2025', 2),
+                                       (3, today - timedelta(weeks=2), 11, '2024-2025', 1)])
+    segments = MemberSegments(member_ids=[1, 2, 3, 4, 5],
+                              flags={'cotisant': [1, 2], 'ancien_cotisant': [3], 'email': [1, 3, 4, 5], 'telephone': [2]},
+                              season_subscribers={'2023-2024': [1, 3], '2024-2025': [1, 2], '2025-2026': []},
+                              roles={'Membre du bureau': [1], 'cotisant': [2]},
+                              matrix=matrix)
+
+    expressions = ['tous',
+                   'cotisant',
+                   'cotisant:2023-2024',
+                   'cotisant:2025-2026',
+                   'cotisant ou present:52',
+                   '(cotisant OU present:52) ET email',
+                   'cotisant ou present:52 et email',
+                   'email sauf cotisant sauf ancien_cotisant',
+                   'non email',
+                   'non (cotisant ou telephone)',
+                   'role:"membre du bureau" ou role:cotisant',
+                   'evenement:1 ou evenement:2',
+                   'present:1 ou present:100',
+                   # errors
+                   '',
+                   'cotisant et',
+                   '(cotisant ou email',
+                   'cotisant email',
+                   'et email',
+                   'inconnu',
+                   'present:abc',
+                   'cotisant:1999-2000',
+                   'role:tresorier',
+                   'evenement:99',
+                   'role:"bureau',
+                  ]
+    report = []
+    for expression in expressions:
+        try:
+            report.append(f"'{expression}': {sorted(segments.evaluate(expression))}")
+        except AjDbException as e:
+            report.append(f"'{expression}': error {e}")
+    report.append(f"present since 30 weeks ago: {sorted(segments.present_since(today - timedelta(weeks=30)))}")
+
+    approvaltests.verify(REPORT_EOL.join(report))
@@ -0,0 +1,47 @@
+"""
+approval tests - db cache snapshot
+"""
+import datetime
+
+import approvaltests
+
+from ajbot._internal.ajdb import api as ajdb_api, AjDb, tables as db_t
+from ajbot._internal.config import FormatTypes
+from ajbot._internal.types import AjDate
+
+from tests.support import REPORT_EOL
+
+
+def test_cache_snapshot(tmp_path):
+    """
+    Unit test for cache snapshot: cached db objects are restored with their cache time, and a snapshot
+    created with other table definitions is ignored
+    """
+    snapshot_file = tmp_path / 'ajdb_cache.snapshot'
+    cached_time = datetime.datetime(2025, 9, 1, 12, 30)
+    stats = [db_t.MemberSeasonStat(id=i, member_id=10 + i, season_id=2, presence_count=i,
+                                   last_presence=AjDate(datetime.date(2025, 6, i)), is_subscriber=bool(i % 2))
+             for i in range(1, 4)]
+
+    ajdb_api._clear_cache()                                                 #pylint: disable=protected-access   #testing internal cache
+    ajdb_api.cache_data[('query_stats', (), ())] = stats
+    ajdb_api.cache_time[('query_stats', (), ())] = cached_time
+    ajdb_api.cache_data[('query_unpicklable', (), ())] = lambda: None
+    ajdb_api.cache_time[('query_unpicklable', (), ())] = cached_time
+    AjDb.save_cache_snapshot(snapshot_file)
+    ajdb_api._clear_cache()                                                 #pylint: disable=protected-access   #testing internal cache
+
+    report = [f"restored: {AjDb.load_cache_snapshot(snapshot_file)}, keys: {sorted(k[0] for k in ajdb_api.cache_data)}"]
+    report += [f"{s:{FormatTypes.DEBUG}}" for s in ajdb_api.cache_data[('query_stats', (), ())]]
+    report.append(f"cache time: {ajdb_api.cache_time[('query_stats', (), ())]}")
+
+    ajdb_api._clear_cache()                                                 #pylint: disable=protected-access   #testing internal cache
+    schema_digest = ajdb_api._schema_digest                                 #pylint: disable=protected-access   #testing internal cache
+    ajdb_api._schema_digest = lambda: 'other tables'                        #pylint: disable=protected-access   #testing internal cache
+    try:
+        report.append(f"restored with other tables: {AjDb.load_cache_snapshot(snapshot_file)}, keys: {len(ajdb_api.cache_data)}")
+    finally:
+        ajdb_api._schema_digest = schema_digest                             #pylint: disable=protected-access   #testing internal cache
+    report.append(f"restored missing file: {AjDb.load_cache_snapshot(tmp_path / 'missing')}")
+
+    approvaltests.verify(REPORT_EOL.join(report))